@@ -1,10 +1,15 @@
+import os
 from logging.config import fileConfig
 
+from dotenv import load_dotenv
+
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
-from models.base import Base
+from database.base import Base
+from database.schema import stamp_baseline
+import models.analytics, models.backfill, models.change_feed, models.idempotency, models.job, models.label, models.project, models.task, models.user  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -15,6 +20,11 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Migrate the database the application uses when URL_DATABASE is set.
+load_dotenv()
+if os.getenv("URL_DATABASE"):
+    config.set_main_option("sqlalchemy.url", os.environ["URL_DATABASE"])
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -65,6 +75,9 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Databases from before migrations were tracked start at the baseline.
+        with connection.begin():
+            stamp_baseline(connection)
         context.configure(
             connection=connection, target_metadata=target_metadata
         )
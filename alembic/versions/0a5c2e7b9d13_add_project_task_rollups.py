@@ -0,0 +1,51 @@
+"""add project task rollups
+
+Revision ID: 0a5c2e7b9d13
+Revises: f19a6d3c8e25
+Create Date: 2026-10-19 17:05:12.640981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a5c2e7b9d13'
+down_revision: Union[str, None] = 'f19a6d3c8e25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'project_task_rollups',
+        sa.Column('project_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('granularity', sa.String(length=4), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('created_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('completed_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('reopened_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('open_delta', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('cycle_time_seconds', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('cycle_time_count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.project_id'], ),
+        sa.PrimaryKeyConstraint('project_id', 'granularity', 'bucket_start')
+    )
+    op.create_table(
+        'rollup_checkpoints',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('last_month', sa.String(length=6), nullable=True),
+        sa.Column('last_id', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('end_id', sa.Integer(), nullable=True),
+        sa.Column('cutoff_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_checkpoints')
+    op.drop_table('project_task_rollups')
@@ -0,0 +1,30 @@
+"""add task query indexes
+
+Revision ID: 1b7e4f9a2c60
+Revises: 0a5c2e7b9d13
+Create Date: 2026-10-19 17:48:26.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7e4f9a2c60'
+down_revision: Union[str, None] = '0a5c2e7b9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_INDEXED_COLUMNS = ('project_id', 'task_name', 'created_at', 'updated_at')
+
+
+def upgrade() -> None:
+    for column in _INDEXED_COLUMNS:
+        op.create_index(op.f(f'ix_tasks_{column}'), 'tasks', [column], unique=False)
+
+
+def downgrade() -> None:
+    for column in reversed(_INDEXED_COLUMNS):
+        op.drop_index(op.f(f'ix_tasks_{column}'), table_name='tasks')
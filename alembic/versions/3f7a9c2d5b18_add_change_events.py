@@ -0,0 +1,39 @@
+"""add change events
+
+Revision ID: 3f7a9c2d5b18
+Revises: b6e1d8f3a2c9
+Create Date: 2026-10-20 10:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7a9c2d5b18'
+down_revision: Union[str, None] = 'b6e1d8f3a2c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'change_events',
+        sa.Column('change_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=20), nullable=False),
+        sa.Column('op', sa.String(length=10), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=True),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('change_id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_change_events_created_at', 'change_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_change_events_created_at', table_name='change_events')
+    op.drop_table('change_events')
@@ -0,0 +1,27 @@
+"""add task version
+
+Revision ID: 7b1d2f4a9c30
+Revises: 4ecac3d5988a
+Create Date: 2026-10-19 14:31:08.412377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1d2f4a9c30'
+down_revision: Union[str, None] = '4ecac3d5988a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('version')
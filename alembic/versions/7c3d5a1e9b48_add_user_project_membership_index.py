@@ -0,0 +1,26 @@
+"""add user project membership index
+
+Revision ID: 7c3d5a1e9b48
+Revises: 1b7e4f9a2c60
+Create Date: 2026-10-19 18:32:04.514207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3d5a1e9b48'
+down_revision: Union[str, None] = '1b7e4f9a2c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_projects_user_id_project_id', 'user_projects', ['user_id', 'project_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_projects_user_id_project_id', table_name='user_projects')
@@ -0,0 +1,36 @@
+"""rebuild projects with autoincrement
+
+Revision ID: 8a2c6e4f1d37
+Revises: 3f7a9c2d5b18
+Create Date: 2026-10-20 11:02:57.618340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a2c6e4f1d37'
+down_revision: Union[str, None] = '3f7a9c2d5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        # Rebuild with AUTOINCREMENT so project ids follow the sqlite_sequence
+        # seeded per shard, as the model declares.
+        with op.batch_alter_table('projects', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        # Continue after the highest project id, as the rowid did before.
+        op.execute(sa.text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'projects', (SELECT COALESCE(MAX(project_id), 0) FROM projects) "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'projects')"
+        ))
+
+
+def downgrade() -> None:
+    # AUTOINCREMENT does not change the columns the previous revision expects.
+    pass
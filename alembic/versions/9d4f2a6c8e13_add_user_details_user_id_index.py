@@ -0,0 +1,26 @@
+"""add user details user id index
+
+Revision ID: 9d4f2a6c8e13
+Revises: 5e8a3c1f7d20
+Create Date: 2026-10-19 20:14:36.902155
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f2a6c8e13'
+down_revision: Union[str, None] = '5e8a3c1f7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_details_user_id_id', 'user_details', ['user_id', sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_details_user_id_id', table_name='user_details')
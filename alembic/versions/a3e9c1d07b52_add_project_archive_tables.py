@@ -0,0 +1,68 @@
+"""add project archive tables
+
+Revision ID: a3e9c1d07b52
+Revises: 7b1d2f4a9c30
+Create Date: 2026-10-19 14:38:52.106214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e9c1d07b52'
+down_revision: Union[str, None] = '7b1d2f4a9c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('projects', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'tasks_archive',
+        sa.Column('task_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('task_name', sa.String(length=255), nullable=True),
+        sa.Column('task_description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('status_id', sa.Integer(), nullable=True),
+        sa.Column('task_owner_id', sa.Integer(), nullable=True),
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.project_id']),
+        sa.ForeignKeyConstraint(['status_id'], ['task_status.task_status_id']),
+        sa.ForeignKeyConstraint(['task_owner_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index(op.f('ix_tasks_archive_project_id'), 'tasks_archive', ['project_id'], unique=False)
+    op.create_table(
+        'user_projects_archive',
+        sa.Column('user_project_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('joined_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.project_id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_project_id')
+    )
+    op.create_index(op.f('ix_user_projects_archive_project_id'), 'user_projects_archive', ['project_id'], unique=False)
+    op.create_index(op.f('ix_user_projects_archive_user_id'), 'user_projects_archive', ['user_id'], unique=False)
+    if op.get_bind().dialect.name == 'sqlite':
+        # Rebuild with AUTOINCREMENT so ids of archived rows are never reused.
+        for table in ('tasks', 'user_projects'):
+            with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+                pass
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_projects_archive_user_id'), table_name='user_projects_archive')
+    op.drop_index(op.f('ix_user_projects_archive_project_id'), table_name='user_projects_archive')
+    op.drop_table('user_projects_archive')
+    op.drop_index(op.f('ix_tasks_archive_project_id'), table_name='tasks_archive')
+    op.drop_table('tasks_archive')
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('archived_at')
@@ -0,0 +1,36 @@
+"""add backfill checkpoints
+
+Revision ID: b6e1d8f3a2c9
+Revises: 9d4f2a6c8e13
+Create Date: 2026-10-19 21:03:18.447610
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d8f3a2c9'
+down_revision: Union[str, None] = '9d4f2a6c8e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'backfill_checkpoints',
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('table_name', sa.String(length=255), nullable=False),
+        sa.Column('last_key', sa.Integer(), nullable=True),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('backfill_checkpoints')
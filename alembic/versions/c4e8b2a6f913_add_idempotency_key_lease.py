@@ -0,0 +1,29 @@
+"""add idempotency key lease
+
+Revision ID: c4e8b2a6f913
+Revises: 8a2c6e4f1d37
+Create Date: 2026-10-20 14:37:12.480915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8b2a6f913'
+down_revision: Union[str, None] = '8a2c6e4f1d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keys claimed before the upgrade have no lease and may be taken over.
+    with op.batch_alter_table('idempotency_keys') as batch_op:
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('idempotency_keys') as batch_op:
+        batch_op.drop_column('lease_expires_at')
@@ -0,0 +1,40 @@
+"""add project task stats
+
+Revision ID: c52f8e6d1a94
+Revises: a3e9c1d07b52
+Create Date: 2026-10-19 14:47:20.583019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52f8e6d1a94'
+down_revision: Union[str, None] = 'a3e9c1d07b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'project_task_stats',
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('status_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('task_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.project_id']),
+        sa.PrimaryKeyConstraint('project_id', 'status_id')
+    )
+    # Seed the counters from the existing tasks.
+    op.execute(
+        "INSERT INTO project_task_stats (project_id, status_id, task_count) "
+        "SELECT project_id, COALESCE(status_id, 0), COUNT(*) FROM ("
+        "SELECT project_id, status_id FROM tasks UNION ALL SELECT project_id, status_id FROM tasks_archive"
+        ") WHERE project_id IS NOT NULL GROUP BY project_id, COALESCE(status_id, 0)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('project_task_stats')
@@ -0,0 +1,50 @@
+"""add task hierarchy
+
+Revision ID: d8f3a62b4e17
+Revises: c52f8e6d1a94
+Create Date: 2026-10-19 14:58:41.275903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3a62b4e17'
+down_revision: Union[str, None] = 'c52f8e6d1a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('tasks', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.add_column(sa.Column('parent_task_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_tasks_parent_task_id_tasks', 'tasks', ['parent_task_id'], ['task_id'])
+        batch_op.create_index(batch_op.f('ix_tasks_parent_task_id'), ['parent_task_id'], unique=False)
+    op.add_column('tasks_archive', sa.Column('parent_task_id', sa.Integer(), nullable=True))
+    op.create_table(
+        'task_closure',
+        sa.Column('ancestor_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('descendant_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_task_closure_descendant_id_depth', 'task_closure', ['descendant_id', 'depth'], unique=False)
+    # Every existing task is a root: it is only its own ancestor.
+    op.execute(
+        "INSERT INTO task_closure (ancestor_id, descendant_id, depth) "
+        "SELECT task_id, task_id, 0 FROM tasks UNION ALL SELECT task_id, task_id, 0 FROM tasks_archive"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_task_closure_descendant_id_depth', table_name='task_closure')
+    op.drop_table('task_closure')
+    with op.batch_alter_table('tasks_archive') as batch_op:
+        batch_op.drop_column('parent_task_id')
+    with op.batch_alter_table('tasks', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tasks_parent_task_id'))
+        batch_op.drop_constraint('fk_tasks_parent_task_id_tasks', type_='foreignkey')
+        batch_op.drop_column('parent_task_id')
@@ -0,0 +1,43 @@
+"""add task due_at and priority
+
+Revision ID: e4b7c9d21f06
+Revises: d8f3a62b4e17
+Create Date: 2026-10-19 15:42:07.513820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7c9d21f06'
+down_revision: Union[str, None] = 'd8f3a62b4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ('tasks', 'tasks_archive'):
+        op.add_column(table, sa.Column('due_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('is_overdue', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index(
+        'ix_tasks_owner_due_at_priority_status', 'tasks',
+        ['task_owner_id', 'due_at', sa.text('priority DESC'), 'status_id'], unique=False
+    )
+    op.create_index('ix_tasks_is_overdue_due_at', 'tasks', ['is_overdue', 'due_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_is_overdue_due_at', table_name='tasks')
+    op.drop_index('ix_tasks_owner_due_at_priority_status', table_name='tasks')
+    with op.batch_alter_table('tasks_archive') as batch_op:
+        batch_op.drop_column('is_overdue')
+        batch_op.drop_column('priority')
+        batch_op.drop_column('due_at')
+    with op.batch_alter_table('tasks', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('is_overdue')
+        batch_op.drop_column('priority')
+        batch_op.drop_column('due_at')
@@ -0,0 +1,46 @@
+"""add task labels
+
+Revision ID: f19a6d3c8e25
+Revises: e4b7c9d21f06
+Create Date: 2026-10-19 16:20:33.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19a6d3c8e25'
+down_revision: Union[str, None] = 'e4b7c9d21f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'labels',
+        sa.Column('label_id', sa.Integer(), nullable=False),
+        sa.Column('label_name', sa.String(length=100), nullable=False),
+        sa.Column('postings_version', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('label_id'),
+        sa.UniqueConstraint('label_name')
+    )
+    op.create_index(op.f('ix_labels_label_id'), 'labels', ['label_id'], unique=False)
+    op.create_table(
+        'task_labels',
+        sa.Column('label_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('task_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.ForeignKeyConstraint(['label_id'], ['labels.label_id'], ),
+        sa.PrimaryKeyConstraint('label_id', 'task_id')
+    )
+    op.create_index('ix_task_labels_task_id', 'task_labels', ['task_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_task_labels_task_id', table_name='task_labels')
+    op.drop_table('task_labels')
+    op.drop_index(op.f('ix_labels_label_id'), table_name='labels')
+    op.drop_table('labels')
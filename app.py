@@ -1,30 +1,96 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import JSONResponse
 
-from routers import auth, project, task, user
-from database.session import engine
-from database.base import Base
 
-app = FastAPI()
+def create_app() -> FastAPI:
+    """
+    Builds the application.
 
-templates = Jinja2Templates(directory="templates")
+    Nothing touches the database until startup, where the schema is checked
+    against the migration head, the connection pools, templates and
+    reference catalogs are warmed up and the background jobs are started.
+    /ready answers 503 until all of that is done.
 
-# Include routers
-app.include_router(auth.router)
-app.include_router(project.router)
-app.include_router(task.router)
-app.include_router(user.router)
+    Returns:
+        FastAPI application.
+    """
+    from routers import api_v1, auth, batch, feed, job, label, project, task, user
+    from database.base import Base
+    # Only used by database.backfill, but new databases are built with it.
+    import models.backfill  # noqa: F401
+    from database.schema import prepare_schema
+    import time
+    from database.session import SessionLocal, engine, create_shard_schemas, warm_up_engines
+    from routers.logger import logger
+    from services.catalog import catalog
+    from services.job import start_job_runner, stop_job_runner
+    from services.task_activity import activity_buffer
+    from utils.templates import templates, compile_templates
+    from middleware.coalescing import CoalescingMiddleware
+    from middleware.concurrency import ConcurrencyLimitMiddleware
+    from middleware.idempotency import IdempotencyMiddleware
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    app = FastAPI()
+    app.state.ready = False
+    app.add_middleware(IdempotencyMiddleware)
+    # Sheds load before any other work, except for coalesced reads, which
+    # wait for a request that already holds a slot.
+    app.add_middleware(ConcurrencyLimitMiddleware)
+    app.add_middleware(CoalescingMiddleware)
 
-Base.metadata.create_all(bind=engine)
+    # Include routers
+    app.include_router(auth.router)
+    app.include_router(project.router)
+    app.include_router(task.router)
+    app.include_router(user.router)
+    app.include_router(job.router)
+    app.include_router(feed.router)
+    app.include_router(label.router)
+    app.include_router(api_v1.router)
+    app.include_router(batch.router)
 
-@app.get("/")
-def landing_page(request: Request):
-    return templates.TemplateResponse("login.html", context={"request": request})
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
-@app.on_event("startup")
-def startup_event():
-    return RedirectResponse(url="/")
+    @app.get("/")
+    def landing_page(request: Request):
+        return templates.TemplateResponse("login.html", context={"request": request})
+
+    @app.get("/ready", include_in_schema=False)
+    def readiness():
+        """
+        Reports whether startup has finished, for load balancers to gate traffic on.
+        """
+        if not app.state.ready:
+            return JSONResponse({"status": "starting"}, status_code=503)
+        return {"status": "ready"}
+
+    @app.on_event("startup")
+    def prepare_database():
+        prepare_schema(engine, Base.metadata)
+        create_shard_schemas(Base.metadata)
+
+    @app.on_event("startup")
+    def warm_up():
+        started = time.monotonic()
+        warm_up_engines()
+        compiled = compile_templates()
+        with SessionLocal() as db:
+            catalog.load(db)
+        logger.info(f"Warmed up connection pools, {compiled} templates and reference catalogs in {time.monotonic() - started:.3f}s")
+
+    @app.on_event("startup")
+    def start_background_jobs():
+        start_job_runner()
+        app.state.ready = True
+
+    @app.on_event("shutdown")
+    def stop_background_jobs():
+        app.state.ready = False
+        stop_job_runner()
+        activity_buffer.flush()
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,108 @@
+"""
+Compares the ORM and the slim read path of the project task list.
+
+Builds a throwaway SQLite database with one project of --rows tasks and
+reports, per 10k rows, the time and the peak Python memory of:
+
+- orm: Task entities plus a status lookup per task, as the task list used to do
+- orm_join: Task entities with the status name from one joined query
+- slim: services.read_model.list_project_tasks
+
+Usage:
+    python -m benchmarks.read_path --rows 10000 --repeat 5
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+_database_dir = tempfile.mkdtemp()
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(_database_dir, 'bench.db')}"
+os.environ.pop("URL_DATABASE_SHARDS", None)
+
+from datetime import datetime  # noqa: E402
+
+from database.base import Base  # noqa: E402
+from database.session import SessionLocal, engine  # noqa: E402
+import models.analytics, models.job, models.label, models.user  # noqa: E402,F401
+from models.project import Project  # noqa: E402
+from models.task import Task, TaskStatus  # noqa: E402
+from services.read_model import list_project_tasks  # noqa: E402
+
+
+def _populate(rows: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(TaskStatus.__table__.insert(), [
+            {"task_status_id": status_id, "task_status_name": name} for status_id, name in enumerate(("todo", "doing", "done"), 1)
+        ])
+        project_id = connection.execute(Project.__table__.insert().values(project_name="bench")).inserted_primary_key[0]
+        now = datetime.utcnow()
+        connection.execute(Task.__table__.insert(), [
+            {
+                "project_id": project_id, "task_name": f"task {index}", "task_description": "description " * 8,
+                "status_id": index % 3 + 1, "priority": 0, "created_at": now, "updated_at": now,
+            }
+            for index in range(rows)
+        ])
+    return project_id
+
+
+def _orm(project_id: int, db):
+    tasks = db.query(Task).filter(Task.project_id == project_id).all()
+    for task in tasks:
+        task.status_name = db.query(TaskStatus.task_status_name).filter(
+            TaskStatus.task_status_id == task.status_id
+        ).scalar()
+    return tasks
+
+
+def _orm_join(project_id: int, db):
+    tasks = []
+    for task, status_name in db.query(Task, TaskStatus.task_status_name).outerjoin(
+        TaskStatus, TaskStatus.task_status_id == Task.status_id
+    ).filter(Task.project_id == project_id):
+        task.status_name = status_name
+        tasks.append(task)
+    return tasks
+
+
+def _slim(project_id: int, db):
+    return list_project_tasks(project_id, False, db)
+
+
+def _measure(read, project_id: int, repeat: int):
+    seconds, peaks = [], []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = read(project_id, db)
+            seconds.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            del rows
+    return min(seconds), min(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-orm", action="store_true", help="Skip the per-task status lookups, slow for many rows.")
+    args = parser.parse_args()
+
+    project_id = _populate(args.rows)
+    scale = 10000 / args.rows
+    print(f"{'path':<10}{'ms/10k rows':>14}{'peak KiB/10k rows':>20}")
+    paths = (("orm", _orm), ("orm_join", _orm_join), ("slim", _slim))
+    for name, read in paths:
+        if name == "orm" and args.skip_orm:
+            continue
+        seconds, peak = _measure(read, project_id, args.repeat)
+        print(f"{name:<10}{seconds * 1000 * scale:>14.1f}{peak / 1024 * scale:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures cold start to first response of the application.
+
+Each run starts a fresh interpreter on a throwaway SQLite database that
+was built and stamped beforehand, and reports in milliseconds:
+
+- interpreter: from spawning the process until the test client is imported
+- import: importing app, which calls create_app()
+- startup: the startup handlers, including the schema check
+- first_response: the first request, GET /users/login/
+- total: import + startup + first_response
+
+The median over the runs is printed. With --record the medians are appended
+as one JSON line to a file, with the git revision, to track them over time.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --record startup.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_PHASES = ("interpreter", "import", "startup", "first_response", "total")
+
+
+def _child():
+    from fastapi.testclient import TestClient
+    marks = {"ready": time.time()}
+    import app
+    marks["import"] = time.time()
+    with TestClient(app.app) as client:
+        marks["startup"] = time.time()
+        response = client.get("/users/login/")
+        marks["first_response"] = time.time()
+    if response.status_code != 200:
+        raise SystemExit(f"First response failed with status {response.status_code}")
+    print(json.dumps(marks))
+
+
+def _run_once(environment: dict) -> dict:
+    spawned = time.time()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        env=environment, check=True, capture_output=True, text=True,
+    ).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    phases = {
+        "interpreter": marks["ready"] - spawned,
+        "import": marks["import"] - marks["ready"],
+        "startup": marks["startup"] - marks["import"],
+        "first_response": marks["first_response"] - marks["startup"],
+    }
+    phases["total"] = marks["first_response"] - marks["ready"]
+    return {phase: seconds * 1000 for phase, seconds in phases.items()}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--record", help="JSON lines file the medians are appended to.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child()
+        return
+
+    database_dir = tempfile.mkdtemp()
+    environment = dict(os.environ, URL_DATABASE=f"sqlite:///{os.path.join(database_dir, 'bench.db')}")
+    environment.pop("URL_DATABASE_SHARDS", None)
+    # The first start builds the empty database; only starts on a ready database are measured.
+    _run_once(environment)
+    runs = [_run_once(environment) for _ in range(args.runs)]
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in _PHASES}
+
+    print(f"{'phase':<16}{'median ms':>12}{'min ms':>10}")
+    for phase in _PHASES:
+        print(f"{phase:<16}{medians[phase]:>12.1f}{min(run[phase] for run in runs):>10.1f}")
+    if args.record:
+        with open(args.record, "a") as record:
+            record.write(json.dumps({
+                "measured_at": datetime.utcnow().isoformat(timespec="seconds"), "revision": _git_revision(),
+                "runs": args.runs, **{f"{phase}_ms": round(medians[phase], 1) for phase in _PHASES},
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
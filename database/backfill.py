@@ -0,0 +1,337 @@
+"""
+Online backfills and table rebuilds for large tables.
+
+A backfill walks a table in primary key order and applies a change to one
+chunk of keys per short transaction. The position is checkpointed in the
+backfill_checkpoints table in the same transaction, so an interrupted
+backfill resumes where it stopped when run again under the same name. The
+chunk size adapts so each transaction holds the SQLite write lock for about
+BACKFILL_CHUNK_SECONDS, and the backfill pauses between chunks so the
+application's writes get through.
+
+rebuild_table is the online counterpart of Alembic's batch mode on SQLite:
+the new table is filled by a backfill while triggers mirror concurrent
+writes into it, and only the final swap takes an exclusive lock.
+
+From a migration, leave the migration's transaction first:
+
+    with op.get_context().autocommit_block():
+        run_update(op.get_bind().engine, "tasks_priority", "tasks", "priority = 0", "priority IS NULL")
+
+From the command line, against every shard:
+
+    python -m database.backfill update tasks --set "priority = 0" --where "priority IS NULL"
+    python -m database.backfill rebuild tasks
+    python -m database.backfill status
+"""
+import os
+import time
+import hashlib
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import MetaData, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from models.backfill import BackfillCheckpoint
+from routers.logger import logger
+
+# Rows per chunk to start with, and the bounds the chunk size adapts within.
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "1000"))
+BACKFILL_MIN_CHUNK_SIZE = 50
+BACKFILL_MAX_CHUNK_SIZE = int(os.getenv("BACKFILL_MAX_CHUNK_SIZE", "20000"))
+# Seconds each chunk's transaction should take; the chunk size follows it.
+BACKFILL_CHUNK_SECONDS = float(os.getenv("BACKFILL_CHUNK_SECONDS", "0.2"))
+# Seconds to sleep between chunks, so application writes are not starved.
+BACKFILL_PAUSE_SECONDS = float(os.getenv("BACKFILL_PAUSE_SECONDS", "0.05"))
+# Times a chunk is retried, halving its size each time, while the database is locked.
+BACKFILL_MAX_RETRIES = 5
+# Seconds between progress log lines.
+BACKFILL_LOG_SECONDS = 10
+
+_checkpoints = BackfillCheckpoint.__table__
+
+
+def _load_checkpoint(connection: Connection, name: str):
+    return connection.execute(select(_checkpoints).where(_checkpoints.c.name == name)).first()
+
+
+def _save_checkpoint(connection: Connection, name: str, table_name: str, last_key, rows_done: int, completed: bool = False):
+    now = datetime.utcnow()
+    values = {"last_key": last_key, "rows_done": rows_done, "updated_at": now, "completed_at": now if completed else None}
+    if connection.execute(_checkpoints.update().where(_checkpoints.c.name == name).values(**values)).rowcount == 0:
+        connection.execute(_checkpoints.insert().values(name=name, table_name=table_name, started_at=now, **values))
+
+
+@contextmanager
+def _write_transaction(engine: Engine):
+    """
+    Yields a connection inside a transaction that holds the write lock from
+    its start, so it never fails halfway on a lock it cannot upgrade.
+    """
+    with engine.connect() as connection:
+        if engine.dialect.name != "sqlite":
+            with connection.begin():
+                yield connection
+            return
+        # pysqlite would only begin the transaction at the first write.
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        with connection.begin():
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            yield connection
+
+
+def run_backfill(engine: Engine, name: str, table_name: str, key: str, apply: Callable[[Connection, int, int], int],
+        chunk_size: int = BACKFILL_CHUNK_SIZE, pause: float = BACKFILL_PAUSE_SECONDS) -> int:
+    """
+    Applies a change to a table in primary key ordered chunks, one short
+    transaction each, resuming from the checkpoint saved under name.
+
+    Rows inserted while the backfill runs are included if their keys come
+    after the current position, so apply must be idempotent and new rows
+    should be written correctly by the application already.
+
+    Args:
+        engine(Engine): Database holding the table and the checkpoint.
+        name(str): Name the progress is checkpointed under.
+        table_name(str): Table to walk.
+        key(str): Integer primary key column to walk the table by.
+        apply: Called as apply(connection, first_key, last_key) for each
+            chunk, inclusive, inside the chunk's transaction; returns the
+            number of rows changed.
+        chunk_size(int): Rows in the first chunk.
+        pause(float): Seconds to sleep between chunks.
+
+    Returns:
+        int: Rows changed by this and earlier runs under the same name.
+    """
+    # Tables referred to may live on another shard.
+    table = Table(table_name, MetaData(), autoload_with=engine, resolve_fks=False)
+    key_column = table.c[key]
+    with engine.connect() as connection:
+        checkpoint = _load_checkpoint(connection, name)
+    if checkpoint is not None and checkpoint.completed_at is not None:
+        logger.info(f"Backfill {name} already completed with {checkpoint.rows_done} rows")
+        return checkpoint.rows_done
+    last_key = checkpoint.last_key if checkpoint is not None else None
+    rows_done = checkpoint.rows_done if checkpoint is not None else 0
+    logger.info(f"Backfill {name} on {table_name} starting after key {last_key}")
+
+    retries = 0
+    last_log = time.monotonic()
+    while True:
+        started = time.monotonic()
+        try:
+            with _write_transaction(engine) as connection:
+                keys = select(key_column).order_by(key_column).limit(chunk_size)
+                if last_key is not None:
+                    keys = keys.where(key_column > last_key)
+                keys = connection.execute(keys).scalars().all()
+                changed = apply(connection, keys[0], keys[-1]) if keys else 0
+                _save_checkpoint(connection, name, table_name, keys[-1] if keys else last_key,
+                                 rows_done + changed, completed=not keys)
+        except OperationalError as error:
+            retries += 1
+            if retries > BACKFILL_MAX_RETRIES or "locked" not in str(error.orig):
+                raise
+            chunk_size = max(BACKFILL_MIN_CHUNK_SIZE, chunk_size // 2)
+            logger.warning(f"Backfill {name} chunk failed ({error.orig}), retrying with {chunk_size} rows")
+            time.sleep(pause * 2 ** retries)
+            continue
+        retries = 0
+        if not keys:
+            break
+        last_key = keys[-1]
+        rows_done += changed
+        elapsed = max(time.monotonic() - started, 1e-3)
+        chunk_size = int(min(BACKFILL_MAX_CHUNK_SIZE, max(BACKFILL_MIN_CHUNK_SIZE,
+                                                         chunk_size * min(2.0, BACKFILL_CHUNK_SECONDS / elapsed))))
+        if time.monotonic() - last_log > BACKFILL_LOG_SECONDS:
+            logger.info(f"Backfill {name}: {rows_done} rows, at key {last_key}, chunks of {chunk_size}")
+            last_log = time.monotonic()
+        time.sleep(pause)
+    logger.info(f"Backfill {name} completed with {rows_done} rows")
+    return rows_done
+
+
+def run_update(engine: Engine, name: str, table_name: str, assignments: str, where: Optional[str] = None,
+        key: Optional[str] = None, **kwargs) -> int:
+    """
+    Runs "UPDATE table SET assignments WHERE where" as a backfill.
+
+    Args:
+        assignments(str): SQL SET clause, e.g. "priority = 0".
+        where(str): Optional SQL condition limiting the rows to change.
+        key(str): Primary key column, found from the table by default.
+    """
+    key = key or _primary_key(engine, table_name)
+    condition = f" AND ({where})" if where else ""
+    statement = text(f'UPDATE "{table_name}" SET {assignments} WHERE "{key}" BETWEEN :first AND :last{condition}')
+
+    def apply(connection, first, last):
+        return connection.execute(statement, {"first": first, "last": last}).rowcount
+
+    return run_backfill(engine, name, table_name, key, apply, **kwargs)
+
+
+def _primary_key(engine: Engine, table_name: str) -> str:
+    columns = inspect(engine).get_pk_constraint(table_name)["constrained_columns"]
+    if len(columns) != 1:
+        raise ValueError(f"Table {table_name} needs a single column primary key to be backfilled")
+    return columns[0]
+
+
+def rebuild_table(engine: Engine, table: Table, column_expressions: Optional[Dict[str, str]] = None,
+        name: Optional[str] = None, **kwargs) -> int:
+    """
+    Rebuilds a SQLite table to the definition of table without locking it for the copy.
+
+    The new table is created under a temporary name and filled in chunks
+    by run_backfill, while triggers on the old table copy every row that
+    is written meanwhile. The swap then drops the old table and renames
+    the new one in a single short transaction, and the indexes are built
+    afterwards, one transaction each. An interrupted rebuild resumes with
+    its checkpoint.
+
+    Args:
+        engine(Engine): SQLite database holding the table.
+        table(Table): New definition of the table, with its indexes. Its
+            MetaData must hold the tables its foreign keys refer to.
+        column_expressions(dict): SQL expressions over the old columns for
+            new or changed columns, e.g. {"priority": "CAST(priority AS INTEGER)"}.
+            Other columns are copied by name if the old table has them.
+        name(str): Checkpoint name, "rebuild_<table>" by default; use a new
+            one to rebuild the same table again.
+
+    Returns:
+        int: Rows copied.
+    """
+    if engine.dialect.name != "sqlite":
+        raise ValueError("rebuild_table only rebuilds SQLite tables; other databases alter them in place")
+    name = name or f"rebuild_{table.name}"
+    new_name = f"_rebuild_{table.name}"
+    key = _primary_key(engine, table.name)
+    old_columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    column_expressions = column_expressions or {}
+    columns = [column.name for column in table.columns if column.name in column_expressions or column.name in old_columns]
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    expression_list = ", ".join(column_expressions.get(column, f'"{column}"') for column in columns)
+    copy_rows = f'INSERT OR REPLACE INTO "{new_name}" ({column_list}) SELECT {expression_list} FROM "{table.name}"'
+
+    with engine.connect() as connection:
+        checkpoint = _load_checkpoint(connection, name)
+        copied = inspect(connection).has_table(new_name)
+    if checkpoint is not None and checkpoint.completed_at is not None and not copied:
+        logger.info(f"Rebuild {name} of {table.name} already completed")
+        return checkpoint.rows_done
+    if checkpoint is None:
+        # Another table's metadata may hold the tables its foreign keys refer to.
+        metadata = MetaData()
+        for other in table.metadata.sorted_tables:
+            other.to_metadata(metadata)
+        with _write_transaction(engine) as connection:
+            _drop_rebuild_triggers(connection, table.name)
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{new_name}"')
+            connection.execute(CreateTable(table.to_metadata(metadata, name=new_name)))
+            for event in ("INSERT", "UPDATE"):
+                connection.exec_driver_sql(
+                    f'CREATE TRIGGER "{new_name}_{event.lower()}" AFTER {event} ON "{table.name}" BEGIN '
+                    + (f'DELETE FROM "{new_name}" WHERE "{key}" = OLD."{key}"; ' if event == "UPDATE" else "")
+                    + f'{copy_rows} WHERE "{key}" = NEW."{key}"; END'
+                )
+            connection.exec_driver_sql(
+                f'CREATE TRIGGER "{new_name}_delete" AFTER DELETE ON "{table.name}" BEGIN '
+                f'DELETE FROM "{new_name}" WHERE "{key}" = OLD."{key}"; END'
+            )
+            _save_checkpoint(connection, name, table.name, None, 0)
+
+    statement = text(f'{copy_rows} WHERE "{key}" BETWEEN :first AND :last')
+    rows = run_backfill(
+        engine, name, table.name, key,
+        lambda connection, first, last: connection.execute(statement, {"first": first, "last": last}).rowcount,
+        **kwargs
+    )
+
+    with _write_transaction(engine) as connection:
+        sequence = connection.exec_driver_sql(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)
+        ).scalar() if _has_sequences(connection) else None
+        _drop_rebuild_triggers(connection, table.name)
+        connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+        connection.exec_driver_sql(f'ALTER TABLE "{new_name}" RENAME TO "{table.name}"')
+        if sequence is not None:
+            # Keeps the id range of the table, such as the ids seeded per shard.
+            if connection.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (sequence, table.name)
+            ).rowcount == 0:
+                connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, sequence))
+    logger.info(f"Rebuilt {table.name}; building {len(table.indexes)} indexes")
+    for index in table.indexes:
+        with engine.begin() as connection:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+    return rows
+
+
+def _has_sequences(connection: Connection) -> bool:
+    return connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").first() is not None
+
+
+def _drop_rebuild_triggers(connection: Connection, table_name: str):
+    for event in ("insert", "update", "delete"):
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS "_rebuild_{table_name}_{event}"')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m database.backfill", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    update = commands.add_parser("update", help="update the rows of a table in chunks")
+    update.add_argument("table")
+    update.add_argument("--set", required=True, dest="assignments", help='SQL SET clause, e.g. "priority = 0"')
+    update.add_argument("--where", help="SQL condition limiting the rows to update")
+    update.add_argument("--name", help="checkpoint name; reuse it to resume, by default derived from the arguments")
+    rebuild = commands.add_parser("rebuild", help="rebuild a SQLite table to its model definition")
+    rebuild.add_argument("table")
+    rebuild.add_argument("--column", action="append", default=[], metavar="NAME=SQL",
+                         help="SQL expression over the old columns for a new or changed column")
+    rebuild.add_argument("--name", help='checkpoint name, by default "rebuild_<table>"')
+    for command in (update, rebuild):
+        command.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+        command.add_argument("--pause", type=float, default=BACKFILL_PAUSE_SECONDS, help="seconds between chunks")
+        command.add_argument("--shard", type=int, help="only this shard, all shards by default")
+    commands.add_parser("status", help="list the checkpoints of every shard")
+    args = parser.parse_args(argv)
+
+    import models.analytics, models.idempotency, models.job, models.label, models.project, models.task, models.user  # noqa: F401
+    from database.base import Base
+    from database.session import create_shard_schemas, shard_engines
+    # Shards get the checkpoint table like their other tables.
+    create_shard_schemas(Base.metadata)
+    shard_ids = range(len(shard_engines)) if getattr(args, "shard", None) is None else [args.shard]
+    for shard_id in shard_ids:
+        engine = shard_engines[shard_id]
+        # Tables outside the sharded ones only exist on the catalog, shard 0.
+        if not inspect(engine).has_table(_checkpoints.name if args.command == "status" else args.table):
+            continue
+        if args.command == "status":
+            with engine.connect() as connection:
+                for row in connection.execute(select(_checkpoints).order_by(_checkpoints.c.started_at)):
+                    state = "completed" if row.completed_at else f"at key {row.last_key}"
+                    print(f"shard {shard_id}: {row.name} on {row.table_name}: {row.rows_done} rows, {state}")
+        elif args.command == "update":
+            digest = hashlib.sha256(f"{args.assignments}\0{args.where or ''}".encode("utf-8")).hexdigest()[:8]
+            name = args.name or f"update_{args.table}_{digest}"
+            run_update(engine, name, args.table, args.assignments, args.where,
+                       chunk_size=args.chunk_size, pause=args.pause)
+        else:
+            expressions = dict(column.split("=", 1) for column in args.column)
+            rebuild_table(engine, Base.metadata.tables[args.table], expressions, name=args.name,
+                          chunk_size=args.chunk_size, pause=args.pause)
+
+
+if __name__ == "__main__":
+    main()
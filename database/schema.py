@@ -0,0 +1,102 @@
+import os
+import re
+from glob import glob
+
+from sqlalchemy import inspect, text
+
+# Alembic revision files the database must be migrated to.
+MIGRATIONS_DIR = os.getenv("MIGRATIONS_DIR", os.path.join("alembic", "versions"))
+
+_REVISION = re.compile(r"^revision(?:: str)? = ['\"](\w+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision(?:: [^=]+)? = (.+)$", re.MULTILINE)
+_QUOTED = re.compile(r"['\"](\w+)['\"]")
+
+# Last revision of the schema from before migrations were tracked, and its
+# tables; databases created back then were never stamped.
+BASELINE_REVISION = "286f24867d2e"
+BASELINE_TABLES = frozenset({
+    "projects", "task_status", "tasks", "user_details", "user_projects", "user_roles", "user_technologies", "users",
+})
+
+
+class SchemaOutOfDate(RuntimeError):
+    """
+    Raised at startup when the database is not migrated to the latest revision.
+    """
+
+
+def migration_heads(directory: str = MIGRATIONS_DIR) -> set:
+    """
+    Returns the head revisions of the migration scripts.
+
+    The revision ids are read from the script sources rather than by
+    loading Alembic, which keeps the startup check to a few milliseconds.
+    """
+    revisions, parents = set(), set()
+    for path in glob(os.path.join(directory, "*.py")):
+        with open(path, encoding="utf-8") as script:
+            source = script.read()
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision is not None:
+            parents.update(_QUOTED.findall(down_revision.group(1)))
+    return revisions - parents
+
+
+def database_revisions(connection):
+    """
+    Returns the revisions the database is stamped with, or None if it has never been stamped.
+    """
+    if not inspect(connection).has_table("alembic_version"):
+        return None
+    return {row[0] for row in connection.execute(text("SELECT version_num FROM alembic_version"))}
+
+
+def _stamp(connection, revisions):
+    connection.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL PRIMARY KEY)"))
+    for revision in revisions:
+        connection.execute(text("INSERT INTO alembic_version (version_num) VALUES (:revision)"), {"revision": revision})
+
+
+def stamp_baseline(connection) -> bool:
+    """
+    Stamps a database holding only the tables from before migrations were
+    tracked with the baseline revision, so `alembic upgrade head` migrates
+    it instead of failing on tables that already exist.
+
+    Returns:
+        bool: Whether the database was stamped.
+    """
+    tables = set(inspect(connection).get_table_names())
+    if not tables or "alembic_version" in tables or not tables <= BASELINE_TABLES:
+        return False
+    _stamp(connection, (BASELINE_REVISION,))
+    return True
+
+
+def prepare_schema(engine, metadata):
+    """
+    Checks that the database is migrated to the head revision.
+
+    An empty database is built from the models instead and stamped with the
+    head, as `alembic upgrade head` cannot build the oldest tables.
+
+    Raises:
+        SchemaOutOfDate: If the database holds tables but is not at the head.
+    """
+    heads = migration_heads()
+    with engine.begin() as connection:
+        revisions = database_revisions(connection)
+        if revisions == heads:
+            return
+        if revisions is None and not inspect(connection).get_table_names():
+            metadata.create_all(bind=connection)
+            _stamp(connection, heads)
+            return
+    current = ", ".join(sorted(revisions)) if revisions else "no revision"
+    raise SchemaOutOfDate(
+        f"Database is at {current}, expected {', '.join(sorted(heads))}; run `alembic upgrade head` first"
+    )
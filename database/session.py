@@ -1,7 +1,14 @@
 import os
+import itertools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.util import find_tables
 
 load_dotenv()
 
@@ -9,21 +16,212 @@ load_dotenv()
 # Constructing SQLite database URL
 URL_DATABASE = os.environ["URL_DATABASE"]
 # URL_DATABASE = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+# Comma separated URLs of additional project shards; the catalog database is shard 0.
+URL_DATABASE_SHARDS = [url.strip() for url in os.getenv("URL_DATABASE_SHARDS", "").split(",") if url.strip()]
+SHARD_FAN_OUT_WORKERS = int(os.getenv("SHARD_FAN_OUT_WORKERS", "8"))
+# Connections each engine keeps open between requests; opened at startup.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Connections each engine may open beyond the pool, closed when returned; -1 for no limit.
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "-1"))
+# Set to 1 to run PRAGMA optimize on SQLite databases at startup.
+SQLITE_OPTIMIZE_ON_STARTUP = os.getenv("SQLITE_OPTIMIZE_ON_STARTUP", "0") == "1"
 
-engine = create_engine(URL_DATABASE)
+# Project and task ids of shard n start at n << SHARD_ID_BITS, so an id names its shard.
+SHARD_ID_BITS = 40
+# Tables of projects and their tasks, the change feed of those tables and the
+# checkpoints of backfills run on them; every other table lives on the catalog only.
+SHARDED_TABLES = frozenset({
+    "projects", "user_projects", "user_projects_archive", "project_task_stats", "task_status",
+    "tasks", "tasks_archive", "task_closure", "task_labels", "backfill_checkpoints", "change_events",
+})
+# Sharded tables whose ids are seeded per shard.
+_SHARD_SEQUENCES = ("projects", "tasks", "user_projects")
+_SHARD_KEY = "shard_id"
+# ASGI scope key under which a batch passes its shared session to its requests.
+BATCH_SESSION_SCOPE_KEY = "batch_db"
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _create_engine(url: str):
+    # A session moves between thread pool threads, from its dependency to
+    # the route and across the requests of a batch, but is never used by two
+    # threads at once, so SQLite connections may change threads too.
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    if make_url(url).database in (None, "", ":memory:"):
+        return create_engine(url, connect_args=connect_args)
+    # SQLite file databases default to opening a connection per session.
+    return create_engine(url, connect_args=connect_args, poolclass=QueuePool, pool_size=DB_POOL_SIZE,
+                         max_overflow=DB_POOL_MAX_OVERFLOW)
 
-def get_db():
+
+engine = _create_engine(URL_DATABASE)
+shard_engines = [engine] + [_create_engine(url) for url in URL_DATABASE_SHARDS]
+
+
+class ShardedSession(Session):
+    """
+    Session that sends statements on sharded tables to the shard picked
+    with use_shard and everything else to the catalog.
+
+    Statements touching no table, such as those of session.connection(),
+    follow the shard. Joins between catalog and sharded tables only work
+    on shard 0, which shares the catalog database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard_id = self.info.get(_SHARD_KEY)
+        if not shard_id:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if clause is not None:
+            tables = find_tables(clause, include_crud=True)
+        elif mapper is not None:
+            tables = [inspect(mapper).persist_selectable]
+        else:
+            tables = []
+        if tables and not any(table.name in SHARDED_TABLES for table in tables):
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        return shard_engines[shard_id]
+
+
+SessionLocal = sessionmaker(class_=ShardedSession, autocommit=False, autoflush=False, bind=engine)
+
+_fan_out_executor = ThreadPoolExecutor(max_workers=SHARD_FAN_OUT_WORKERS, thread_name_prefix="shard-fan-out")
+_next_project_shard = itertools.count()
+
+
+def shard_for_id(object_id: int):
+    """
+    Returns the shard of a project or task id, or None if no such shard exists.
+    """
+    shard_id = object_id >> SHARD_ID_BITS
+    return shard_id if 0 <= shard_id < len(shard_engines) else None
+
+
+def group_by_shard(object_ids) -> dict:
+    """
+    Groups project or task ids by shard, dropping ids of unknown shards.
+
+    Returns:
+        dict: Lists of ids per shard id.
+    """
+    shard_ids = defaultdict(list)
+    for object_id in object_ids:
+        shard_id = shard_for_id(object_id)
+        if shard_id is not None:
+            shard_ids[shard_id].append(object_id)
+    return shard_ids
+
+
+def use_shard(db: Session, shard_id):
+    """
+    Routes the sharded tables of a session to a shard; None routes them to the catalog.
+    """
+    db.info[_SHARD_KEY] = shard_id
+
+
+def current_shard(db: Session) -> int:
+    """
+    Returns the shard the sharded tables of a session are routed to.
+    """
+    return db.info.get(_SHARD_KEY) or 0
+
+
+def choose_project_shard() -> int:
+    """
+    Returns the shard of the next new project, spreading projects round-robin.
+    """
+    return next(_next_project_shard) % len(shard_engines)
+
+
+def fan_out(fn, shard_ids=None, db: Session = None) -> list:
+    """
+    Runs fn(shard_id, session) on several shards in parallel.
+
+    Each shard gets its own session. With a single database the caller's
+    session is reused instead.
+
+    Args:
+        fn: Function reading one shard.
+        shard_ids: Shards to read, all of them by default.
+        db(Session): Session of the caller.
+
+    Returns:
+        list: Results of fn in shard order.
+    """
+    if shard_ids is None:
+        shard_ids = range(len(shard_engines))
+    if len(shard_engines) == 1 and db is not None:
+        return [fn(shard_id, db) for shard_id in shard_ids]
+
+    def run(shard_id):
+        with SessionLocal() as session:
+            use_shard(session, shard_id)
+            return fn(shard_id, session)
+
+    return list(_fan_out_executor.map(run, shard_ids))
+
+
+def warm_up_engines():
+    """
+    Fills the connection pool of every engine, so the first requests do not
+    open connections, and on SQLite reads the schema into each connection.
+    """
+    for shard_engine in shard_engines:
+        sqlite = shard_engine.dialect.name == "sqlite"
+        size = shard_engine.pool.size() if isinstance(shard_engine.pool, QueuePool) else 1
+        connections = [shard_engine.connect() for _ in range(size)]
+        try:
+            for connection in connections:
+                connection.execute(text("SELECT count(*) FROM sqlite_master" if sqlite else "SELECT 1"))
+            if sqlite and SQLITE_OPTIMIZE_ON_STARTUP:
+                connections[0].exec_driver_sql("PRAGMA optimize")
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+def create_shard_schemas(metadata):
+    """
+    Creates the sharded tables on every additional shard and seeds their id
+    sequences, so ids of shard n start at n << SHARD_ID_BITS.
+    """
+    tables = [table for table in metadata.sorted_tables if table.name in SHARDED_TABLES]
+    for shard_id, shard_engine in enumerate(shard_engines[1:], start=1):
+        metadata.create_all(bind=shard_engine, tables=tables)
+        with shard_engine.begin() as connection:
+            for table_name in _SHARD_SEQUENCES:
+                if connection.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = :name"), {"name": table_name}).first():
+                    continue
+                connection.execute(
+                    text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                    {"name": table_name, "seq": shard_id << SHARD_ID_BITS}
+                )
+
+
+def _request_shard(request: Request):
+    for name in ("project_id", "task_id"):
+        if name in request.path_params:
+            try:
+                return shard_for_id(int(request.path_params[name]))
+            except ValueError:
+                return None
+    return None
+
+
+def get_db(request: Request):
     """
     Function to yield a database session.
 
+    Requests with a project_id or task_id path parameter get the shard of
+    that project or task. Requests of a batch share the session of the batch.
+
     Yields:
         Session: SQLAlchemy database session.
     """
-    db = SessionLocal()
+    batch_db = request.scope.get(BATCH_SESSION_SCOPE_KEY)
+    db = batch_db if batch_db is not None else SessionLocal()
+    use_shard(db, _request_shard(request))
     try:
         yield db
     finally:
-        db.close()
+        if batch_db is None:
+            db.close()
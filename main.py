@@ -0,0 +1,42 @@
+"""
+Production server entry point.
+
+Binds one socket, imports the application once and forks uvicorn workers
+that share both. Settings are read from server.ini; the options below
+override them.
+
+Usage:
+    python -m main --workers 4 --port 8000
+
+Signals to the supervisor:
+    SIGHUP: re-read the config file, start new workers, stop the old ones gracefully.
+    SIGTERM, SIGINT: stop the workers gracefully and exit.
+"""
+import argparse
+import sys
+
+from server.config import SERVER_CONFIG_FILE
+from server.supervisor import Supervisor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m main", description="Runs the application with several worker processes.")
+    parser.add_argument("--config", default=SERVER_CONFIG_FILE, help="INI config file with a [server] section")
+    parser.add_argument("--app", help="import path of the ASGI application")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=None,
+                        help="import the application before forking the workers")
+    parser.add_argument("--max-requests", type=int, help="replace a worker after this many requests, 0 for never")
+    parser.add_argument("--graceful-timeout", type=int, help="seconds a stopping worker gets before it is killed")
+    args = parser.parse_args(argv)
+    supervisor = Supervisor(
+        args.config, app=args.app, host=args.host, port=args.port, workers=args.workers,
+        preload=args.preload, max_requests=args.max_requests, graceful_timeout=args.graceful_timeout,
+    )
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
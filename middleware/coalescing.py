@@ -0,0 +1,127 @@
+import os
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from middleware.routes import matched_endpoint
+
+# Rendered responses kept by the micro-cache of coalesced routes.
+COALESCED_CACHE_SIZE = int(os.getenv("COALESCED_CACHE_SIZE", "256"))
+# Request headers that decide what a caller may see, and the host rendered into links.
+_KEY_HEADERS = ("authorization", "cookie", "host", "accept")
+
+
+def coalesced(cache_seconds: float = 0):
+    """
+    Marks a GET endpoint whose concurrent identical requests share one execution.
+
+    Args:
+        cache_seconds(float): Also serve its 200 responses from memory for
+            this long; 0 only shares in-flight executions.
+    """
+    def decorator(endpoint):
+        endpoint.coalesce_cache_seconds = cache_seconds
+        return endpoint
+    return decorator
+
+
+class SharedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class MicroCache:
+    """
+    Bounded LRU cache of rendered responses with a per-entry expiry.
+    """
+
+    def __init__(self, max_size: int = COALESCED_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[SharedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, response: SharedResponse, seconds: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class CoalescingMiddleware:
+    """
+    Single-flight for GET endpoints marked with @coalesced.
+
+    Requests with the same path, query and caller headers that arrive while
+    one of them runs wait for it and get a copy of its rendered response,
+    so the queries and the template run once. The key includes the
+    Authorization and Cookie headers, so a caller only shares responses
+    with requests carrying the same credentials.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cache = MicroCache()
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        cache_seconds = getattr(matched_endpoint(scope), "coalesce_cache_seconds", None)
+        if cache_seconds is None:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        key = (scope["path"], scope.get("query_string", b""), *(headers.get(name, "") for name in _KEY_HEADERS))
+        shared = self.cache.get(key) if cache_seconds else None
+        while shared is None and key in self._in_flight:
+            # A None result means the running request failed; the first waiter runs it again.
+            shared = await asyncio.shield(self._in_flight[key])
+        if shared is not None:
+            return await self._send(shared, send)
+        await self._run(key, cache_seconds, scope, receive, send)
+
+    async def _run(self, key: tuple, cache_seconds: float, scope, receive, send):
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        response = {"status": None, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        shared = None
+        try:
+            await self.app(scope, receive, capture)
+            if response["status"] is not None:
+                shared = SharedResponse(response["status"], response["headers"], b"".join(response["body"]))
+                if cache_seconds and shared.status == 200:
+                    self.cache.put(key, shared, cache_seconds)
+        finally:
+            del self._in_flight[key]
+            future.set_result(shared)
+
+    @staticmethod
+    async def _send(shared: SharedResponse, send):
+        await send({"type": "http.response.start", "status": shared.status, "headers": shared.headers})
+        await send({"type": "http.response.body", "body": shared.body})
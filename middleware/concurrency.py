@@ -0,0 +1,165 @@
+import os
+import math
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+# Set to 0 to turn load shedding off.
+CONCURRENCY_LIMITS_ENABLED = os.getenv("CONCURRENCY_LIMITS_ENABLED", "1") == "1"
+# Seconds a request may wait for a slot before it is shed.
+CONCURRENCY_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_SECONDS", "2"))
+# Path prefixes that are never limited: long-lived streams, static files,
+# batches, whose requests are limited one by one, and the readiness probe.
+UNLIMITED_PATH_PREFIXES = ("/static", "/feed", "/batch", "/ready")
+# Routes that hash passwords with bcrypt.
+AUTH_ROUTES = {("POST", "/auth/token"), ("POST", "/users/users/login/"), ("POST", "/users/register/")}
+
+ROUTE_CLASS_LIMITS = {
+    "auth": {"initial_limit": 4, "min_limit": 1, "max_limit": max(os.cpu_count() or 1, 2), "queue_size": 16},
+    "read": {"initial_limit": 20, "min_limit": 4, "max_limit": 200, "queue_size": 100},
+    "write": {"initial_limit": 10, "min_limit": 2, "max_limit": 100, "queue_size": 50},
+}
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Returns the limiter class of a request, or None if it is not limited.
+    """
+    if path.startswith(UNLIMITED_PATH_PREFIXES):
+        return None
+    if (method, path) in AUTH_ROUTES:
+        return "auth"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one route class that adapts to observed latency,
+    with a bounded queue in front of it.
+
+    The limit follows the gradient between the long-term and the recent
+    request latency: while requests get slower than usual the limit shrinks
+    towards min_limit, otherwise it grows by about sqrt(limit) per update up
+    to max_limit. The limit only grows while at least half of it is in use,
+    so an idle service does not drift to max_limit. Requests beyond the
+    limit queue for at most queue_timeout seconds, and beyond queue_size
+    they are refused at once.
+    """
+
+    def __init__(self, name: str, initial_limit: int, min_limit: int, max_limit: int, queue_size: int,
+            queue_timeout: float = CONCURRENCY_QUEUE_TIMEOUT_SECONDS, smoothing: float = 0.2,
+            tolerance: float = 1.5, long_window: int = 600):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.long_window = long_window
+        self.in_flight = 0
+        self.long_latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        """
+        Takes a slot, waiting in the queue if needed.
+
+        Returns:
+            bool: False if the request should be shed.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # Cancelled right after being handed a slot: give it back.
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot()
+            raise
+        finally:
+            if waiter.cancelled() and waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: float):
+        """
+        Frees a slot and adapts the limit to the latency of the finished request.
+        """
+        self._update_limit(latency)
+        self._free_slot()
+
+    def _free_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _update_limit(self, latency: float):
+        latency = max(latency, 1e-6)
+        if self.long_latency is None:
+            self.long_latency = latency
+            return
+        self.long_latency += (latency - self.long_latency) / self.long_window
+        # Let the baseline recover quickly after a long stretch of slow requests.
+        if self.long_latency / latency > 2:
+            self.long_latency *= 0.95
+        if self.in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / latency))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+    def retry_after(self) -> int:
+        """
+        Returns the seconds after which a shed request may retry, estimated from the queue.
+        """
+        latency = self.long_latency or 1.0
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / max(self.limit, 1)))
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Limits in-flight requests per route class (auth, read, write) with an
+    AdaptiveLimiter each, and sheds what does not fit with 503 and Retry-After.
+
+    Shedding early keeps the latency of admitted requests stable instead of
+    letting every request queue in the thread pool until it times out.
+    """
+
+    def __init__(self, app, limits: Dict[str, dict] = None):
+        self.app = app
+        self.limiters = {
+            name: AdaptiveLimiter(name, **settings) for name, settings in (limits or ROUTE_CLASS_LIMITS).items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if not CONCURRENCY_LIMITS_ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            return await self.app(scope, receive, send)
+        limiter = self.limiters[name]
+        if not await limiter.acquire():
+            response = JSONResponse({"detail": "Server is overloaded, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(limiter.retry_after())})
+            return await response(scope, receive, send)
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
@@ -0,0 +1,175 @@
+import os
+import asyncio
+import hashlib
+from typing import Dict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from database.session import SessionLocal
+from middleware.routes import matched_endpoint
+from routers.logger import logger
+from services.idempotency import IDEMPOTENCY_LEASE_SECONDS, StoredResponse, claim_key, complete_key, get_key, release_key, \
+    renew_key, stored_response_cache
+
+# Seconds a duplicate request waits for the first one with its key before giving up with 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Interval at which a duplicate polls for a first request running in another process.
+IDEMPOTENCY_POLL_SECONDS = 0.1
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Request headers that identify the caller, so callers cannot replay each other's responses.
+_CALLER_HEADERS = ("authorization",)
+
+
+def idempotent(endpoint):
+    """
+    Marks a route endpoint as honouring the Idempotency-Key header.
+    """
+    endpoint.idempotent = True
+    return endpoint
+
+
+def _with_session(func, *args):
+    with SessionLocal() as db:
+        return func(*args, db)
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the stored response of a request to an idempotent endpoint
+    whose Idempotency-Key was already used.
+
+    The first request with a key runs and its response (unless a 5xx) is
+    kept for IDEMPOTENCY_KEY_TTL_SECONDS in the idempotency_keys table,
+    with the most recent ones cached in memory. Duplicates arriving while
+    it runs wait for it, in this process on a shared future and across
+    processes by polling the table, and then replay its response. A key
+    reused with a different body is refused with 422. The first request
+    renews its claim while it runs; if its process dies, a duplicate takes
+    the key over once the lease expires.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key or not getattr(matched_endpoint(scope), "idempotent", False):
+            return await self.app(scope, receive, send)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return await JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)(scope, receive, send)
+
+        body = await self._read_body(receive)
+        key_hash = self._hash(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"),
+                              *(headers.get(name, "") for name in _CALLER_HEADERS), key)
+        request_hash = hashlib.sha256(headers.get("content-type", "").encode("latin-1") + b"\0" + body).hexdigest()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            stored = stored_response_cache.get(key_hash)
+            if stored is not None:
+                return await self._replay(stored, request_hash, scope, receive, send)
+            in_flight = self._in_flight.get(key_hash)
+            if in_flight is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(in_flight), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    return await self._conflict(scope, receive, send)
+                continue
+
+            self._in_flight[key_hash] = loop.create_future()
+            try:
+                stored = await run_in_threadpool(_with_session, claim_key, key_hash, request_hash)
+                if stored is None:
+                    return await self._run(key_hash, body, scope, receive, send)
+                while stored is not None and stored.status_code is None and loop.time() < deadline:
+                    await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+                    stored = await run_in_threadpool(_with_session, get_key, key_hash)
+                if stored is None:
+                    # The first request failed and released the key; claim it again.
+                    continue
+                if stored.status_code is None:
+                    return await self._conflict(scope, receive, send)
+                stored_response_cache.put(key_hash, stored)
+                return await self._replay(stored, request_hash, scope, receive, send)
+            finally:
+                self._in_flight.pop(key_hash).set_result(None)
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run(self, key_hash: str, body: bytes, scope, receive, send):
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        renewal = asyncio.create_task(self._renew(key_hash))
+        try:
+            await self.app(scope, receive_body, capture)
+        except BaseException:
+            await run_in_threadpool(_with_session, release_key, key_hash)
+            raise
+        finally:
+            renewal.cancel()
+        if response["status"] is None or response["status"] >= 500:
+            await run_in_threadpool(_with_session, release_key, key_hash)
+            return
+        await run_in_threadpool(_with_session, complete_key, key_hash, response["status"], response["headers"], b"".join(response["body"]))
+
+    @staticmethod
+    async def _renew(key_hash: str):
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+            await run_in_threadpool(_with_session, renew_key, key_hash)
+
+    @staticmethod
+    async def _replay(stored: StoredResponse, request_hash: str, scope, receive, send):
+        if stored.request_hash != request_hash:
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, status_code=422)
+            return await response(scope, receive, send)
+        logger.info(f"Replaying stored response for Idempotency-Key on {scope['path']}")
+        response = Response(stored.body, status_code=stored.status_code)
+        response.raw_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+        response.raw_headers.append((b"idempotent-replayed", b"true"))
+        await response(scope, receive, send)
+
+    @staticmethod
+    async def _conflict(scope, receive, send):
+        response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409,
+                                headers={"Retry-After": "1"})
+        await response(scope, receive, send)
@@ -0,0 +1,12 @@
+from starlette.routing import Match
+
+
+def matched_endpoint(scope):
+    """
+    Returns the endpoint of the route that will handle a request, or None.
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "endpoint", None)
+    return None
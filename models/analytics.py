@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
+from database.base import Base
+from datetime import datetime
+
+
+class ProjectTaskRollup(Base):
+    """
+    Task activity of a project per hour and per day, written by the rollup
+    jobs so charts never read the tasks table.
+
+    open_delta is the change of the number of open tasks within the bucket;
+    the open count at any time is the sum of all earlier deltas.
+    """
+    __tablename__ = 'project_task_rollups'
+
+    project_id = Column(Integer, ForeignKey('projects.project_id'), primary_key=True, autoincrement=False)
+    # "hour" or "day"
+    granularity = Column(String(4), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    created_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    reopened_count = Column(Integer, nullable=False, default=0, server_default="0")
+    open_delta = Column(Integer, nullable=False, default=0, server_default="0")
+    cycle_time_seconds = Column(BigInteger, nullable=False, default=0, server_default="0")
+    cycle_time_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class RollupCheckpoint(Base):
+    """
+    Position reached by a rollup job, committed together with the rollups
+    it produced so an interrupted job resumes without counting twice.
+    """
+    __tablename__ = 'rollup_checkpoints'
+
+    name = Column(String(50), primary_key=True)
+    last_month = Column(String(6))
+    last_id = Column(Integer, nullable=False, default=0, server_default="0")
+    end_id = Column(Integer)
+    cutoff_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from database.base import Base
+from datetime import datetime
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+
+    # Name the backfill is resumed by
+    name = Column(String(255), primary_key=True)
+    table_name = Column(String(255), nullable=False)
+    # Primary key of the last row processed, None before the first chunk
+    last_key = Column(Integer)
+    rows_done = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
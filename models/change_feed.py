@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from database.base import Base
+from datetime import datetime
+
+
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+
+    # Increases in commit order, as SQLite has one writer at a time
+    change_id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    entity = Column(String(20), nullable=False)
+    op = Column(String(10), nullable=False)
+    entity_id = Column(Integer)
+    # JSON object of the changed columns
+    data = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_change_events_created_at", "created_at"),
+        # Keeps change ids of deleted rows from being reused.
+        {"sqlite_autoincrement": True},
+    )
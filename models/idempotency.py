@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, LargeBinary, DateTime, Index
+from database.base import Base
+from datetime import datetime
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the Idempotency-Key header and what identifies the caller and route
+    key_hash = Column(String(64), primary_key=True)
+    # sha256 of the request body, to refuse a key reused for another request
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress")
+    response_status = Column(Integer)
+    response_headers = Column(Text)
+    response_body = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    # Until when the request holding an in_progress key is known to be alive
+    lease_expires_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from database.base import Base
+from datetime import datetime
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(100), nullable=False)
+    payload = Column(Text)
+    status = Column(String(20), nullable=False, default="queued")
+    progress = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    result = Column(Text)
+    last_error = Column(Text)
+    locked_by = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_job_type_status", "job_type", "status"),
+    )
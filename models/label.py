@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from database.base import Base
+from datetime import datetime
+
+
+class Label(Base):
+    """
+    A label that can be put on any number of tasks.
+
+    postings_version is bumped whenever a task gains or loses the label, so
+    cached task id sets of the label can be checked for staleness cheaply.
+    """
+    __tablename__ = 'labels'
+
+    label_id = Column(Integer, primary_key=True, index=True)
+    label_name = Column(String(100), nullable=False, unique=True)
+    postings_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TaskLabel(Base):
+    """
+    Labels of tasks. The (label_id, task_id) primary key is the inverted
+    index: the tasks of a label are one contiguous, task_id ordered range.
+
+    No foreign key to tasks, rows of archived projects stay in place while
+    their tasks live in tasks_archive.
+    """
+    __tablename__ = 'task_labels'
+
+    label_id = Column(Integer, ForeignKey('labels.label_id'), primary_key=True, autoincrement=False)
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+
+    __table_args__ = (
+        Index("ix_task_labels_task_id", "task_id"),
+    )
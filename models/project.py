@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database.base import Base
 from datetime import datetime
@@ -13,9 +13,13 @@ class Project(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by_id = Column(Integer, ForeignKey('users.id'))
+    archived_at = Column(DateTime)
 
     created_by = relationship("User", backref="projects")
 
+    # Lets each shard start its project ids at its own offset.
+    __table_args__ = {"sqlite_autoincrement": True}
+
 
 class UserProject(Base):
     __tablename__ = 'user_projects'
@@ -26,4 +30,35 @@ class UserProject(Base):
     joined_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", backref="user_projects")
-    project = relationship("Project", backref="user_projects")
\ No newline at end of file
+    project = relationship("Project", backref="user_projects")
+
+    __table_args__ = (
+        # Covers the membership set lookup of a user without reading the table.
+        Index('ix_user_projects_user_id_project_id', 'user_id', 'project_id'),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ProjectTaskStat(Base):
+    """
+    Number of tasks of a project per status, kept up to date on every task
+    write. Tasks without a status are counted under status_id 0.
+    """
+    __tablename__ = 'project_task_stats'
+
+    project_id = Column(Integer, ForeignKey('projects.project_id'), primary_key=True)
+    status_id = Column(Integer, primary_key=True, autoincrement=False)
+    task_count = Column(Integer, nullable=False, default=0)
+
+
+class UserProjectArchive(Base):
+    """
+    Memberships of archived projects, moved out of user_projects.
+    """
+    __tablename__ = 'user_projects_archive'
+
+    user_project_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    project_id = Column(Integer, ForeignKey('projects.project_id'), index=True)
+    joined_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
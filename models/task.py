@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, false
 from sqlalchemy.orm import relationship
 from database.base import Base
 from datetime import datetime
@@ -14,13 +14,77 @@ class Task(Base):
     __tablename__ = 'tasks'
 
     task_id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey('projects.project_id'))
-    task_name = Column(String(255))
+    project_id = Column(Integer, ForeignKey('projects.project_id'), index=True)
+    task_name = Column(String(255), index=True)
     task_description = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     status_id = Column(Integer, ForeignKey('task_status.task_status_id'))
     task_owner_id = Column(Integer, ForeignKey('users.id'))
+    parent_task_id = Column(Integer, ForeignKey('tasks.task_id'), index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    due_at = Column(DateTime)
+    # Higher values are more urgent.
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    is_overdue = Column(Boolean, nullable=False, default=False, server_default=false())
 
     project = relationship("Project", backref="tasks")
-    task_owner = relationship("User", foreign_keys=[task_owner_id])
\ No newline at end of file
+    task_owner = relationship("User", foreign_keys=[task_owner_id])
+
+    __table_args__ = (
+        # Serves "next tasks for me" straight from the index order; status_id
+        # is last so open tasks are picked from the index entries themselves.
+        Index("ix_tasks_owner_due_at_priority_status", task_owner_id, due_at, priority.desc(), status_id),
+        # Lets the overdue sweep find newly overdue tasks with a range scan.
+        Index("ix_tasks_is_overdue_due_at", is_overdue, due_at),
+        # AUTOINCREMENT keeps SQLite from reusing ids of archived tasks.
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class TaskArchive(Base):
+    """
+    Tasks of archived projects, moved out of the hot tasks table.
+
+    Mirrors the columns of Task so rows can be moved back on restore.
+    """
+    __tablename__ = 'tasks_archive'
+
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+    project_id = Column(Integer, ForeignKey('projects.project_id'), index=True)
+    task_name = Column(String(255))
+    task_description = Column(Text)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    status_id = Column(Integer, ForeignKey('task_status.task_status_id'))
+    task_owner_id = Column(Integer, ForeignKey('users.id'))
+    parent_task_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    due_at = Column(DateTime)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    is_overdue = Column(Boolean, nullable=False, default=False, server_default=false())
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    project = relationship("Project", backref="archived_tasks")
+    task_owner = relationship("User", foreign_keys=[task_owner_id])
+
+
+class TaskClosure(Base):
+    """
+    Every ancestor/descendant pair of the task hierarchy, including each
+    task paired with itself at depth 0, so subtrees and ancestor chains are
+    read with one indexed query at any depth.
+
+    No foreign keys to tasks: rows of archived projects stay in place while
+    their tasks live in tasks_archive.
+    """
+    __tablename__ = 'task_closure'
+
+    ancestor_id = Column(Integer, primary_key=True, autoincrement=False)
+    descendant_id = Column(Integer, primary_key=True, autoincrement=False)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_closure_descendant_id_depth", "descendant_id", "depth"),
+    )
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, MetaData, Table
+
+# Monthly partitions live in their own metadata: they are created on demand
+# when the first activity of a month is written, not by create_all.
+activity_metadata = MetaData()
+
+TASK_ACTIVITY_PREFIX = "task_activity_"
+
+
+def task_activity_partition_name(month: str) -> str:
+    """
+    Name of the partition table for a month given as "YYYYMM".
+    """
+    return f"{TASK_ACTIVITY_PREFIX}{month}"
+
+
+@lru_cache(maxsize=None)
+def task_activity_table(month: str) -> Table:
+    """
+    Table definition of the task activity partition for a month ("YYYYMM").
+    """
+    name = task_activity_partition_name(month)
+    return Table(
+        name,
+        activity_metadata,
+        Column("activity_id", Integer, primary_key=True),
+        Column("task_id", Integer, nullable=False),
+        Column("project_id", Integer),
+        Column("actor_id", Integer),
+        Column("action", String(20), nullable=False),
+        Column("changes", Text),
+        Column("created_at", DateTime, nullable=False),
+        Index(f"ix_{name}_task_id_activity_id", "task_id", "activity_id"),
+        Index(f"ix_{name}_project_id_activity_id", "project_id", "activity_id"),
+    )
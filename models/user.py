@@ -2,7 +2,7 @@ from database.base import Base
 from datetime import datetime
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Text, Boolean, Index
 
 
 class User(Base):
@@ -36,3 +36,8 @@ class UserDetail(Base):
     user = relationship("User", backref="user_details")
     user_role = relationship("UserRole", backref="user_details")
     user_technology = relationship("UserTechnology", backref="user_details")
+
+    __table_args__ = (
+        # Finds the latest details of a user with one index seek.
+        Index("ix_user_details_user_id_id", user_id, id.desc()),
+    )
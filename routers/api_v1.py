@@ -0,0 +1,497 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing_extensions import List, Optional
+
+from database.session import get_db, fan_out, group_by_shard
+from models.project import Project
+from models.task import Task, TaskArchive, TaskStatus
+from models.user import User
+from routers.auth import get_scope_user
+from routers.logger import logger
+from middleware.idempotency import idempotent
+from schemas.project import ProjectCreate, ProjectResponse, ProjectPage, ProjectMemberCreate, UserProjectResponse
+from schemas.task import TaskCreateRequest, TaskDetailResponse, TaskMove, TaskPage, TaskResponse, TaskStatusCount, TaskUpdate
+from schemas.user import UserPage, UserProfileResponse, UserResponse
+from services.membership import ensure_project_member, is_admin, membership_cache, require_project_member, \
+    require_task_member, restrict_project_ids
+from services.project import get_project, create_new_project, add_user_to_project
+from services.task import create_new_task, delete_task as delete_task_row, parse_if_match, task_etag, \
+    update_task_fields
+from services.task_tree import get_subtree_status_counts, move_task
+from services.task_activity import set_activity_actor
+from services.user import get_details_of_user
+from utils.fields import FieldSelection, model_columns
+from utils.sql import prefix_conditions
+
+router = APIRouter(prefix="/api/v1", tags=['api v1'], default_response_class=ORJSONResponse)
+
+_projects = Project.__table__
+_tasks = Task.__table__
+_tasks_archive = TaskArchive.__table__
+_task_status = TaskStatus.__table__
+_users = User.__table__
+
+PROJECT_FIELDS = model_columns(ProjectResponse, _projects)
+USER_FIELDS = model_columns(UserResponse, _users)
+TASK_FIELDS = {
+    tasks: model_columns(TaskResponse, tasks) for tasks in (_tasks, _tasks_archive)
+}
+TASK_DETAIL_FIELDS = {
+    tasks: model_columns(
+        TaskDetailResponse, tasks, project_name=_projects.c.project_name,
+        project_description=_projects.c.project_description, status_name=_task_status.c.task_status_name
+    )
+    for tasks in (_tasks, _tasks_archive)
+}
+
+FIELDS_QUERY = Query(None, description="Comma separated response fields to return; all by default.")
+
+
+def _merged_page(read_shard, shard_ids, key: str, limit: int, db: Session):
+    """
+    Reads up to limit rows ordered by key from several shards in parallel.
+
+    Returns:
+        tuple: The rows and the key of the last one if more may follow.
+    """
+    rows = list(islice(heapq.merge(*fan_out(read_shard, shard_ids, db), key=attrgetter(key)), limit))
+    return rows, getattr(rows[-1], key) if len(rows) == limit else None
+
+
+def _created(model, obj) -> ORJSONResponse:
+    return ORJSONResponse(model.model_validate(obj, from_attributes=True).model_dump(), status_code=status.HTTP_201_CREATED)
+
+
+@router.get("/projects/", response_model=ProjectPage)
+def list_projects(fields: Optional[str] = FIELDS_QUERY, limit: int = Query(100, ge=1, le=1000),
+        after_project_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves the projects of the current user, all projects for admins.
+
+        Args:
+            fields(str): Response fields to return.
+            limit(int): Maximum number of projects in the page.
+            after_project_id(int): next_after_project_id of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of projects ordered by project ID.
+
+        Raises:
+            HTTPException: If an unknown field is requested.
+    """
+    logger.info("Listing projects through the API")
+    selection = FieldSelection(fields, PROJECT_FIELDS, required=("project_id",))
+    project_ids = restrict_project_ids(current_user, None, db)
+    shard_projects = group_by_shard(project_ids) if project_ids is not None else None
+    statement = select(*selection.columns).order_by(_projects.c.project_id).limit(limit)
+    if after_project_id is not None:
+        statement = statement.where(_projects.c.project_id > after_project_id)
+
+    def read_shard(shard_id, session):
+        shard_statement = statement
+        if shard_projects is not None:
+            shard_statement = statement.where(_projects.c.project_id.in_(shard_projects[shard_id]))
+        return session.execute(shard_statement).all()
+
+    rows, next_after = _merged_page(
+        read_shard, sorted(shard_projects) if shard_projects is not None else None, "project_id", limit, db
+    )
+    return ORJSONResponse({"items": selection.to_dicts(rows), "next_after_project_id": next_after})
+
+
+@router.post("/projects/", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
+@idempotent
+def create_project(project_create: ProjectCreate, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Creates a new project with its creator as the first member.
+
+        Args:
+            project_create(ProjectCreate): Name, description and optional creator, the current user by default;
+            only admins may create projects for other users.
+            db (Session): Database session.
+
+        Returns:
+            Created project.
+
+        Raises:
+            HTTPException: If a non-admin names another creator or the creator does not exist.
+    """
+    logger.info("Creating a new project through the API")
+    created_by_id = project_create.created_by_id or current_user[0].id
+    if created_by_id != current_user[0].id:
+        if not is_admin(current_user):
+            logger.warning(f"User with ID {current_user[0].id} may not create projects for user with ID {created_by_id}")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to create projects for other users")
+        if db.execute(select(_users.c.id).where(_users.c.id == created_by_id)).first() is None:
+            logger.error(f"User with ID {created_by_id} not found")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    project = create_new_project(project_create.project_name, project_create.project_description, created_by_id, db)
+    return _created(ProjectResponse, project)
+
+
+@router.get("/projects/{project_id}/", response_model=ProjectResponse)
+def get_project_fields(project_id: int, fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db),
+        current_user: User = Depends(require_project_member)):
+    """
+        Retrieves a project.
+
+        Args:
+            project_id(int): ID of the project.
+            fields(str): Response fields to return.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: If the project does not exist or an unknown field is requested.
+    """
+    logger.info(f"Retrieving project with ID {project_id} through the API")
+    selection = FieldSelection(fields, PROJECT_FIELDS)
+    row = db.execute(select(*selection.columns).where(_projects.c.project_id == project_id)).first()
+    if row is None:
+        logger.error(f"Project with ID {project_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return ORJSONResponse(selection.to_dict(row))
+
+
+@router.post("/projects/{project_id}/members/", response_model=UserProjectResponse, status_code=status.HTTP_201_CREATED)
+@idempotent
+def add_project_member(project_id: int, member: ProjectMemberCreate, db: Session = Depends(get_db),
+        current_user: User = Depends(require_project_member)):
+    """
+        Adds a user to a project.
+
+        Args:
+            project_id(int): ID of the project.
+            member(ProjectMemberCreate): ID of the user to add.
+            db (Session): Database session.
+
+        Returns:
+            Created membership.
+
+        Raises:
+            HTTPException: If the user or project does not exist, or the project is archived.
+    """
+    logger.info(f"Adding user with ID {member.user_id} to project with ID {project_id} through the API")
+    return _created(UserProjectResponse, add_user_to_project(member.user_id, project_id, db))
+
+
+@router.get("/projects/{project_id}/tasks/", response_model=TaskPage)
+def list_project_tasks(project_id: int, fields: Optional[str] = FIELDS_QUERY, limit: int = Query(100, ge=1, le=1000),
+        after_task_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Retrieves the tasks of a project, archived ones for archived projects.
+
+        Args:
+            project_id(int): ID of the project.
+            fields(str): Response fields to return.
+            limit(int): Maximum number of tasks in the page.
+            after_task_id(int): next_after_task_id of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of tasks ordered by task ID.
+
+        Raises:
+            HTTPException: If the project does not exist or an unknown field is requested.
+    """
+    logger.info(f"Listing tasks of project with ID {project_id} through the API")
+    tasks = _tasks_archive if get_project(project_id, db).archived_at is not None else _tasks
+    selection = FieldSelection(fields, TASK_FIELDS[tasks], required=("task_id",))
+    statement = select(*selection.columns).where(tasks.c.project_id == project_id).order_by(tasks.c.task_id).limit(limit)
+    if after_task_id is not None:
+        statement = statement.where(tasks.c.task_id > after_task_id)
+    rows = db.execute(statement).all()
+    return ORJSONResponse({"items": selection.to_dicts(rows), "next_after_task_id": rows[-1].task_id if len(rows) == limit else None})
+
+
+@router.post("/projects/{project_id}/tasks/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
+@idempotent
+def create_task(project_id: int, task_create: TaskCreateRequest, db: Session = Depends(get_db),
+        current_user: User = Depends(require_project_member)):
+    """
+        Creates a task in a project.
+
+        Args:
+            project_id(int): ID of the project.
+            task_create(TaskCreateRequest): Task details; the owner defaults to the current user.
+            db (Session): Database session.
+
+        Returns:
+            Created task.
+
+        Raises:
+            HTTPException: If the project, owner or parent task is not found, or the project is archived.
+    """
+    logger.info(f"Creating a task in project with ID {project_id} through the API")
+    set_activity_actor(db, current_user[0].id)
+    task = create_new_task(
+        project_id, task_create.task_owner_id or current_user[0].id, task_create.task_name,
+        task_create.task_description, task_create.task_status, task_create.parent_task_id,
+        task_create.due_at, task_create.priority, db
+    )
+    return _created(TaskResponse, task)
+
+
+@router.get("/tasks/mine/", response_model=TaskPage)
+def list_my_tasks(fields: Optional[str] = FIELDS_QUERY, limit: int = Query(100, ge=1, le=1000),
+        after_task_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves the tasks of the projects of the current user, reading their shards in parallel.
+
+        Args:
+            fields(str): Response fields to return.
+            limit(int): Maximum number of tasks in the page.
+            after_task_id(int): next_after_task_id of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of tasks ordered by task ID.
+    """
+    user, _ = current_user
+    logger.info(f"Listing tasks of user with ID {user.id} through the API")
+    selection = FieldSelection(fields, TASK_FIELDS[_tasks], required=("task_id",))
+    shard_projects = group_by_shard(membership_cache.get_project_ids(user.id, db))
+    statement = select(*selection.columns).order_by(_tasks.c.task_id).limit(limit)
+    if after_task_id is not None:
+        statement = statement.where(_tasks.c.task_id > after_task_id)
+
+    def read_shard(shard_id, session):
+        return session.execute(statement.where(_tasks.c.project_id.in_(shard_projects[shard_id]))).all()
+
+    rows, next_after = _merged_page(read_shard, sorted(shard_projects), "task_id", limit, db)
+    return ORJSONResponse({"items": selection.to_dicts(rows), "next_after_task_id": next_after})
+
+
+@router.get("/tasks/{task_id}/", response_model=TaskDetailResponse)
+def get_task_fields(task_id: int, fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db),
+        current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves a task with its project and status names, falling back to the archive.
+
+        Args:
+            task_id(int): ID of the task.
+            fields(str): Response fields to return.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: If the task does not exist, the caller is not a member
+            of its project or an unknown field is requested.
+    """
+    logger.info(f"Retrieving task with ID {task_id} through the API")
+    for tasks in (_tasks, _tasks_archive):
+        selection = FieldSelection(fields, TASK_DETAIL_FIELDS[tasks], required=("project_id",))
+        row = db.execute(select(*selection.columns).select_from(
+            tasks.outerjoin(_projects, _projects.c.project_id == tasks.c.project_id).outerjoin(
+                _task_status, _task_status.c.task_status_id == tasks.c.status_id
+            )
+        ).where(tasks.c.task_id == task_id)).first()
+        if row is not None:
+            ensure_project_member(current_user, row.project_id, db)
+            return ORJSONResponse(selection.to_dict(row))
+    logger.error(f"Task with ID {task_id} not found")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+
+@router.patch("/tasks/{task_id}/", response_model=TaskResponse)
+def update_task(task_id: int, task_update: TaskUpdate, if_match: Optional[str] = Header(None),
+        db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Updates the given fields of a task.
+
+        Send the ETag of the task as If-Match to only update the version you
+        read; the new ETag is returned in the response headers.
+
+        Args:
+            task_id(int): ID of the task.
+            task_update(TaskUpdate): Fields to change.
+            if_match(str): ETag of the task version the change is based on.
+            db (Session): Database session.
+
+        Returns:
+            Updated task.
+
+        Raises:
+            HTTPException: 404 if the task does not exist, 409 if it is archived,
+            412 if it was changed since the If-Match version.
+    """
+    logger.info(f"Updating task with ID {task_id} through the API")
+    expected_version = parse_if_match(if_match)
+    set_activity_actor(db, current_user[0].id)
+    task = update_task_fields(task_id, task_update.model_dump(exclude_unset=True), expected_version, db)
+    return ORJSONResponse(
+        TaskResponse.model_validate(task, from_attributes=True).model_dump(), headers={"ETag": task_etag(task.version)}
+    )
+
+
+@router.delete("/tasks/{task_id}/", status_code=status.HTTP_204_NO_CONTENT)
+def delete_task(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Deletes a task that has no subtasks.
+
+        Args:
+            task_id(int): ID of the task.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: 404 if the task does not exist, 409 if it has subtasks.
+    """
+    logger.info(f"Deleting task with ID {task_id} through the API")
+    set_activity_actor(db, current_user[0].id)
+    delete_task_row(task_id, db)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.put("/tasks/{task_id}/parent/", response_model=TaskResponse)
+def move_task_subtree(task_id: int, task_move: TaskMove, db: Session = Depends(get_db),
+        current_user: User = Depends(require_task_member)):
+    """
+        Moves a task and its whole subtree below another task, or to the top level when parent_task_id is null.
+
+        Args:
+            task_id(int): ID of the task to move.
+            task_move(TaskMove): New parent task.
+            db (Session): Database session.
+
+        Returns:
+            Moved task.
+
+        Raises:
+            HTTPException: If the task or parent does not exist, the parent belongs to another project
+            or lies inside the subtree of the task.
+    """
+    logger.info(f"Moving task with ID {task_id} below task with ID {task_move.parent_task_id} through the API")
+    set_activity_actor(db, current_user[0].id)
+    return ORJSONResponse(TaskResponse.model_validate(move_task(task_id, task_move.parent_task_id, db), from_attributes=True).model_dump())
+
+
+@router.get("/tasks/{task_id}/subtree/status/", response_model=List[TaskStatusCount])
+def get_task_subtree_status(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves the number of tasks per status in the subtree of a task, including the task itself.
+
+        Args:
+            task_id(int): ID of the root task.
+            db (Session): Database session.
+
+        Returns:
+            Task count per status.
+
+        Raises:
+            HTTPException: If the task does not exist.
+    """
+    logger.info(f"Retrieving subtree status counts of task with ID {task_id} through the API")
+    return ORJSONResponse([dict(row._mapping) for row in get_subtree_status_counts(task_id, db)])
+
+
+@router.get("/users/", response_model=UserPage)
+def list_users(q: Optional[str] = None, field: str = Query("username", pattern="^(username|email)$"),
+        fields: Optional[str] = FIELDS_QUERY, limit: int = Query(100, ge=1, le=1000), after: Optional[str] = None,
+        db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves the user directory, optionally only users whose username or email starts with a prefix.
+
+        Args:
+            q(str): Prefix to search for.
+            field(str): "username" or "email", the field searched and sorted by.
+            fields(str): Response fields to return.
+            limit(int): Maximum number of users in the page.
+            after(str): next_after of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of users ordered by the searched field.
+    """
+    logger.info("Listing users through the API")
+    selection = FieldSelection(fields, USER_FIELDS, required=(field,))
+    column = _users.c[field]
+    statement = select(*selection.columns).where(column.isnot(None)).order_by(column).limit(limit)
+    if q:
+        statement = statement.where(*prefix_conditions(column, q))
+    if after is not None:
+        statement = statement.where(column > after)
+    rows = db.execute(statement).all()
+    return ORJSONResponse({"items": selection.to_dicts(rows), "next_after": getattr(rows[-1], field) if len(rows) == limit else None})
+
+
+@router.get("/users/{user_id}/", response_model=UserResponse)
+def get_user_fields(user_id: int, fields: Optional[str] = FIELDS_QUERY, db: Session = Depends(get_db),
+        current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves a user.
+
+        Args:
+            user_id(int): ID of the user.
+            fields(str): Response fields to return.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: If the user does not exist or an unknown field is requested.
+    """
+    logger.info(f"Retrieving user with ID {user_id} through the API")
+    selection = FieldSelection(fields, USER_FIELDS)
+    row = db.execute(select(*selection.columns).where(_users.c.id == user_id)).first()
+    if row is None:
+        logger.error(f"User with ID {user_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return ORJSONResponse(selection.to_dict(row))
+
+
+@router.get("/users/{user_id}/details/", response_model=UserProfileResponse)
+def get_user_profile(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves a user with the role and technology of their latest details.
+
+        Args:
+            user_id(int): ID of the user.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: If the user does not exist.
+    """
+    logger.info(f"Retrieving details of user with ID {user_id} through the API")
+    profile = get_details_of_user(user_id, db)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return ORJSONResponse(profile._asdict())
+
+
+@router.get("/users/{user_id}/projects/", response_model=ProjectPage)
+def list_user_projects(user_id: int, fields: Optional[str] = FIELDS_QUERY, limit: int = Query(100, ge=1, le=1000),
+        after_project_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves the projects of a user; users may list their own projects, admins anyone's.
+
+        Args:
+            user_id(int): ID of the user.
+            fields(str): Response fields to return.
+            limit(int): Maximum number of projects in the page.
+            after_project_id(int): next_after_project_id of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of projects ordered by project ID.
+
+        Raises:
+            HTTPException: If the caller may not list the user's projects or an unknown field is requested.
+    """
+    if not is_admin(current_user) and current_user[0].id != user_id:
+        logger.warning(f"User with ID {current_user[0].id} may not list projects of user with ID {user_id}")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to list these projects")
+    logger.info(f"Listing projects of user with ID {user_id} through the API")
+    selection = FieldSelection(fields, PROJECT_FIELDS, required=("project_id",))
+    shard_projects = group_by_shard(membership_cache.get_project_ids(user_id, db))
+    statement = select(*selection.columns).order_by(_projects.c.project_id).limit(limit)
+    if after_project_id is not None:
+        statement = statement.where(_projects.c.project_id > after_project_id)
+
+    def read_shard(shard_id, session):
+        return session.execute(statement.where(_projects.c.project_id.in_(shard_projects[shard_id]))).all()
+
+    rows, next_after = _merged_page(read_shard, sorted(shard_projects), "project_id", limit, db)
+    return ORJSONResponse({"items": selection.to_dicts(rows), "next_after_project_id": next_after})
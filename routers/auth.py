@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from utils.templates import templates
 from typing_extensions import Annotated
 #TODO typing and some other packages are not refected in requirements.txt
 from sqlalchemy import or_
@@ -22,12 +22,13 @@ from services.user import create_user
 
 router = APIRouter(prefix="/auth", tags=['auth'])
 
-templates = Jinja2Templates(directory="templates")
 
 
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token",
                                      scopes={"admin": "Admin access", "user": "Authenticated user access"})
+# ASGI scope key under which a batch passes its (user, scopes) to its requests.
+BATCH_USER_SCOPE_KEY = "batch_user"
 
 
 #TODO below APIs are using async, is it required?
@@ -80,7 +81,7 @@ def get_current_user(token: str = Depends(oauth2_bearer)):
 
 
 def get_scope_user(
-        security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_bearer)], db: User = Depends(get_db)
+        security_scopes: SecurityScopes, request: Request, token: Annotated[str, Depends(oauth2_bearer)], db: User = Depends(get_db)
 ):
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
@@ -91,23 +92,28 @@ def get_scope_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": authenticate_value},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    # Requests of a batch reuse the user authenticated for the whole batch.
+    batch_user = request.scope.get(BATCH_USER_SCOPE_KEY)
+    if batch_user is not None:
+        user, token_scopes = batch_user
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(scopes=payload.get("scope", []), username=username)
+        except (JWTError, ValidationError):
+            raise credentials_exception
+        user = get_user(db=db, username=token_data.username)
+        if user is None:
             raise credentials_exception
-        token_scopes = payload.get("scope", [])
-        token_data = TokenData(scopes=token_scopes, username=username)
-    except (JWTError, ValidationError):
-        raise credentials_exception
-    user = get_user(db=db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
+        token_scopes = token_data.scopes
     for scope in security_scopes.scopes:
-        if scope not in token_data.scopes:
+        if scope not in token_scopes:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Not enough permissions",
                 headers={"WWW-Authenticate": authenticate_value},
             )
-    return user, token_data.scopes
+    return user, token_scopes
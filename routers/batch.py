@@ -0,0 +1,167 @@
+import os
+import json
+import asyncio
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from models.user import User
+from routers.auth import get_scope_user, BATCH_USER_SCOPE_KEY
+from routers.logger import logger
+from schemas.batch import BatchRequest, BatchResponse, BatchSubRequest, BatchSubResponse
+from database.session import SessionLocal, engine, BATCH_SESSION_SCOPE_KEY
+from middleware.routes import matched_endpoint
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Headers of the batch passed on to its requests unless they set their own.
+INHERITED_HEADERS = ("authorization", "cookie", "accept", "accept-language", "user-agent")
+
+router = APIRouter(prefix="/batch", tags=['batch'])
+
+
+def unbatchable(endpoint):
+    """
+    Marks a route endpoint as not runnable inside a batch, such as streams
+    that never finish and batches themselves.
+    """
+    endpoint.unbatchable = True
+    return endpoint
+
+
+def _sub_request_scope(request: Request, sub_request: BatchSubRequest, headers: dict) -> dict:
+    path, _, query = sub_request.path.partition("?")
+    return {
+        "type": "http",
+        "app": request.app,
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": sub_request.method,
+        "scheme": request.url.scheme,
+        "root_path": request.scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "state": dict(request.scope.get("state", {})),
+    }
+
+
+async def _dispatch(request: Request, sub_request: BatchSubRequest, user_scopes, db) -> BatchSubResponse:
+    """
+    Runs one request of a batch through the application and collects its response.
+    """
+    headers = {name: request.headers[name] for name in INHERITED_HEADERS if name in request.headers}
+    own_headers = {name.lower(): value for name, value in sub_request.headers.items()}
+    headers.update(own_headers)
+    if sub_request.form is not None:
+        body = urlencode(sub_request.form).encode()
+        headers["content-type"] = "application/x-www-form-urlencoded"
+    elif sub_request.body is not None:
+        body = json.dumps(sub_request.body).encode()
+        headers["content-type"] = "application/json"
+    else:
+        body = b""
+    headers["content-length"] = str(len(body))
+
+    scope = _sub_request_scope(request, sub_request, headers)
+    if "authorization" not in own_headers:
+        scope[BATCH_USER_SCOPE_KEY] = user_scopes
+    if db is not None:
+        scope[BATCH_SESSION_SCOPE_KEY] = db
+
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": None, "headers": {}, "body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode("latin-1"): value.decode("latin-1") for name, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        logger.exception(f"Batch request {sub_request.method} {sub_request.path} failed")
+        if response["status"] is None:
+            return BatchSubResponse(status=status.HTTP_500_INTERNAL_SERVER_ERROR, headers={},
+                                    body={"detail": "Internal Server Error"})
+    finally:
+        finished.set()
+        if db is not None:
+            # Every request runs in its own transaction, as it would on its own.
+            await run_in_threadpool(db.rollback)
+
+    content = b"".join(response["body"])
+    if response["headers"].get("content-type", "").startswith("application/json") and content:
+        content = json.loads(content)
+    else:
+        content = content.decode("utf-8", errors="replace")
+    return BatchSubResponse(status=response["status"], headers=response["headers"], body=content)
+
+
+@router.post("/", response_model=BatchResponse)
+@unbatchable
+async def run_batch(batch: BatchRequest, request: Request, current_user: User = Depends(get_scope_user)):
+    """
+        Runs several requests against the API and returns their responses together.
+
+        The batch is authenticated once and its requests reuse that user,
+        unless they send their own Authorization header. With concurrency 1
+        the requests run in order over one database connection and session;
+        otherwise up to concurrency of them run at a time, each with its own
+        session from the pool.
+
+        Args:
+            batch(BatchRequest): Requests to run and how many may run at a time.
+
+        Returns:
+            Responses in request order.
+
+        Raises:
+            HTTPException: If the batch is too large, asks for too much
+            concurrency or contains another batch or a stream.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"A batch holds at most {BATCH_MAX_REQUESTS} requests")
+    if batch.concurrency > BATCH_MAX_CONCURRENCY:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Batch concurrency is at most {BATCH_MAX_CONCURRENCY}")
+    for sub_request in batch.requests:
+        # Check the route the request resolves to, whatever its path spelling.
+        endpoint = matched_endpoint(_sub_request_scope(request, sub_request, {}))
+        if getattr(endpoint, "unbatchable", False):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"{sub_request.method} {sub_request.path} cannot run in a batch")
+    logger.info(f"Running batch of {len(batch.requests)} requests with concurrency {batch.concurrency}")
+
+    if batch.concurrency == 1:
+        connection = await run_in_threadpool(engine.connect)
+        db = SessionLocal(bind=connection)
+        try:
+            responses = [await _dispatch(request, sub_request, current_user, db) for sub_request in batch.requests]
+        finally:
+            await run_in_threadpool(db.close)
+            await run_in_threadpool(connection.close)
+        return BatchResponse(responses=responses)
+
+    semaphore = asyncio.Semaphore(batch.concurrency)
+
+    async def run(sub_request):
+        async with semaphore:
+            return await _dispatch(request, sub_request, current_user, None)
+
+    return BatchResponse(responses=await asyncio.gather(*(run(sub_request) for sub_request in batch.requests)))
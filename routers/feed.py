@@ -0,0 +1,93 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from jose import jwt, JWTError
+from models.user import User
+from routers.logger import logger
+from constants.keys import SECRET_KEY, ALGORITHM
+from database.session import SessionLocal
+from services.membership import require_project_member, ensure_project_member
+from utils.jwt import get_user
+from services.change_feed import change_broadcaster
+from routers.batch import unbatchable
+
+router = APIRouter(prefix="/feed", tags=['feed'])
+
+HEARTBEAT_SECONDS = 15
+
+
+@router.get("/projects/{project_id}/events/")
+@unbatchable
+async def stream_project_changes(request: Request, project_id: int, current_user: User = Depends(require_project_member)):
+    """
+        Streams task and project membership changes of a project as Server-Sent Events.
+
+        Each event is named after the change ("insert", "update", "delete" or
+        "resync") and carries the change as JSON data. A "resync" event means the
+        subscriber fell behind and should reload the project once.
+
+        Args:
+            project_id(int): ID of the project to subscribe to.
+
+        Returns:
+            Event stream response.
+    """
+    async def event_stream():
+        subscription = change_broadcaster.subscribe(project_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=HEARTBEAT_SECONDS)
+                if batch is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                for change in batch:
+                    yield f"event: {change['op']}\ndata: {json.dumps(change)}\n\n"
+        finally:
+            change_broadcaster.unsubscribe(subscription)
+            logger.info(f"Change feed subscriber left project with ID {project_id}")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/projects/{project_id}/ws/")
+async def project_changes_websocket(websocket: WebSocket, project_id: int, token: str):
+    """
+        Sends task and project membership changes of a project over a WebSocket.
+
+        Browsers cannot set an Authorization header on WebSockets, so the access
+        token is passed as the ``token`` query parameter. Changes are sent as JSON
+        arrays, one per coalesced batch.
+
+        Args:
+            project_id(int): ID of the project to subscribe to.
+            token(str): Access token issued by /auth/token; its user must be a member of the project.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if payload.get("sub") is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    with SessionLocal() as db:
+        user = get_user(db=db, username=payload["sub"])
+        try:
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+            ensure_project_member((user, payload.get("scope", [])), project_id, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    await websocket.accept()
+    subscription = change_broadcaster.subscribe(project_id)
+    try:
+        while True:
+            batch = await subscription.next_batch(timeout=HEARTBEAT_SECONDS)
+            await websocket.send_json(batch or [])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        change_broadcaster.unsubscribe(subscription)
+        logger.info(f"Change feed subscriber left project with ID {project_id}")
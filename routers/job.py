@@ -0,0 +1,82 @@
+import json
+from fastapi import APIRouter, Depends, Security
+from sqlalchemy.orm import Session
+from models.user import User
+from routers.auth import get_scope_user
+from routers.logger import logger
+from schemas.job import JobCreate, JobResponse
+from database.session import get_db
+from services.job import enqueue_job, get_job, load_job_handlers
+
+router = APIRouter(prefix="/jobs", tags=['jobs'])
+
+load_job_handlers()
+
+
+def _job_response(job):
+    response = JobResponse.model_validate(job)
+    if job.result is not None:
+        response.result = json.loads(job.result)
+    return response
+
+
+@router.post("/{job_type}/", response_model=JobResponse)
+def create_job(job_type: str, job_create: JobCreate, db: Session = Depends(get_db),
+        current_user: User = Security(get_scope_user, scopes=["admin"])):
+    """
+        Queues a background job of the given type; admins only.
+
+        Jobs run on any project their payload names, so members archive and
+        restore their projects through the project endpoints instead.
+
+        Args:
+            job_type(str): Registered job type to run.
+            job_create(JobCreate): Job payload and optional retry limit.
+            db (Session): Database session.
+
+        Returns:
+            Queued job.
+
+        Raises:
+            HTTPException: If the caller is not an admin or the job type is unknown.
+    """
+    logger.info(f"Queueing job of type {job_type}")
+    job = enqueue_job(job_type, job_create.payload, db, max_attempts=job_create.max_attempts)
+    return _job_response(job)
+
+
+@router.get("/{job_id}/", response_model=JobResponse)
+def get_job_status(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves status, attempts and result of a job.
+
+        Args:
+            job_id(int): ID of the job.
+            db (Session): Database session.
+
+        Returns:
+            Job status.
+
+        Raises:
+            HTTPException: If job with the specified id does not exist.
+    """
+    return _job_response(get_job(job_id, db))
+
+
+@router.get("/{job_id}/progress/")
+def get_job_progress(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves only the status and progress of a job, for polling.
+
+        Args:
+            job_id(int): ID of the job.
+            db (Session): Database session.
+
+        Returns:
+            dict: Job ID, status and progress percentage.
+
+        Raises:
+            HTTPException: If job with the specified id does not exist.
+    """
+    job = get_job(job_id, db)
+    return {"job_id": job.job_id, "status": job.status, "progress": job.progress}
@@ -0,0 +1,126 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing_extensions import List
+from models.label import Label
+from models.user import User
+from routers.auth import get_scope_user
+from routers.logger import logger
+from schemas.label import LabelCreate, LabelResponse, TaskLabels, TaskLabelFilter, TaskLabelFilterPage
+from schemas.task import TaskResponse
+from database.session import get_db
+from services.label import create_label, get_task_labels, add_task_labels, remove_task_label, filter_tasks_by_labels
+from services.task_activity import set_activity_actor
+from services.membership import require_task_member, restrict_project_ids
+
+router = APIRouter(prefix="/labels", tags=['labels'])
+
+
+@router.post("/", response_model=LabelResponse)
+def create_new_label(label_create: LabelCreate, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Creates a new label.
+
+        Args:
+            label_create(LabelCreate): Name of the label.
+            db (Session): Database session.
+
+        Returns:
+            Created label.
+
+        Raises:
+            HTTPException: If a label with the same name exists.
+    """
+    logger.info(f"Creating label {label_create.label_name}")
+    return create_label(label_create.label_name, db)
+
+
+@router.get("/", response_model=List[LabelResponse])
+def get_labels(db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves all labels ordered by name.
+    """
+    logger.info("Retrieving labels")
+    return db.query(Label).order_by(Label.label_name).all()
+
+
+@router.get("/tasks/{task_id}/", response_model=List[LabelResponse])
+def get_labels_of_task(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves the labels of a task.
+
+        Args:
+            task_id(int): ID of the task.
+            db (Session): Database session.
+
+        Returns:
+            Labels of the task ordered by name.
+    """
+    logger.info(f"Retrieving labels of task with ID {task_id}")
+    return get_task_labels(task_id, db)
+
+
+@router.post("/tasks/{task_id}/", response_model=List[LabelResponse])
+def add_labels_to_task(task_id: int, task_labels: TaskLabels, db: Session = Depends(get_db),
+        current_user: User = Depends(require_task_member)):
+    """
+        Puts labels on a task; labels that do not exist yet are created.
+
+        Args:
+            task_id(int): ID of the task.
+            task_labels(TaskLabels): Names of the labels.
+            db (Session): Database session.
+
+        Returns:
+            All labels of the task.
+
+        Raises:
+            HTTPException: If the task does not exist or is archived.
+    """
+    logger.info(f"Adding labels {task_labels.labels} to task with ID {task_id}")
+    set_activity_actor(db, current_user[0].id)
+    return add_task_labels(task_id, task_labels.labels, db)
+
+
+@router.delete("/tasks/{task_id}/{label_name}/")
+def remove_label_from_task(task_id: int, label_name: str, db: Session = Depends(get_db),
+        current_user: User = Depends(require_task_member)):
+    """
+        Takes a label off a task.
+
+        Args:
+            task_id(int): ID of the task.
+            label_name(str): Name of the label.
+            db (Session): Database session.
+
+        Raises:
+            HTTPException: If the task does not exist or does not have the label.
+    """
+    logger.info(f"Removing label {label_name} from task with ID {task_id}")
+    set_activity_actor(db, current_user[0].id)
+    remove_task_label(task_id, label_name, db)
+    return {"message": "Label removed successfully"}
+
+
+@router.post("/filter/", response_model=TaskLabelFilterPage)
+def filter_tasks(task_filter: TaskLabelFilter, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves tasks matching an AND/OR label expression, optionally limited to projects and statuses.
+
+        Args:
+            task_filter(TaskLabelFilter): Label expression, filters and page.
+            db (Session): Database session.
+
+        Returns:
+            Page of tasks ordered by task ID; pass next_after_task_id as
+            after_task_id to get the next page.
+
+        Raises:
+            HTTPException: If the label expression is empty.
+    """
+    logger.info("Filtering tasks by labels")
+    task_filter.project_ids = restrict_project_ids(current_user, task_filter.project_ids, db)
+    page = filter_tasks_by_labels(task_filter, db)
+    return TaskLabelFilterPage(
+        items=[TaskResponse(**row._mapping) for row in page["items"]],
+        next_after_task_id=page["next_after_task_id"]
+    )
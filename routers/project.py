@@ -1,19 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Query
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from utils.templates import templates
 from sqlalchemy.orm import Session
-from models.project import Project, UserProject
 from models.user import User
 from routers.auth import get_scope_user
-from schemas.project import ProjectCreate, ProjectResponse, UserProjectCreate
+from schemas.project import ProjectCreate, UserProjectCreate
 from routers.logger import logger
+from middleware.idempotency import idempotent
+from schemas.job import JobResponse
+from schemas.task import TaskActivityPage
+from schemas.analytics import ThroughputChart, BurndownChart
 from database.session import get_db
+from services.job import enqueue_job
+from services.project import get_project, ensure_project_not_archived, create_new_project, add_user_to_project
+from services.task_stats import get_project_dashboard
+from services.task_activity import get_activity_page
+from services.analytics import get_throughput_chart, get_burndown_chart
+from services.membership import membership_cache, require_project_member
+from services.read_model import list_all_projects, list_projects, list_projects_created_by
 from datetime import datetime
+from typing_extensions import Optional
 
 router = APIRouter(prefix="/projects", tags=['projects'])
 
 
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/project/", response_class=HTMLResponse)
 def render_project_template(request: Request):
@@ -24,9 +34,11 @@ def render_project_template(request: Request):
     return templates.TemplateResponse("project.html", {"request": request})
 
 @router.post("/projects/", response_class=HTMLResponse)
-def create_project(request: Request, project_name: str = Form(...), project_description: str = Form(...),  db: Session = Depends(get_db)):
+@idempotent
+def create_project(request: Request, project_name: str = Form(...), project_description: str = Form(...),  db: Session = Depends(get_db),
+        current_user: User = Depends(get_scope_user)):
     """
-        Creates a new project with the provided details.
+        Creates a new project with the provided details, with the current user as creator and first member.
 
         Args:
             project_name(str): Name of the project to create.
@@ -38,10 +50,7 @@ def create_project(request: Request, project_name: str = Form(...), project_desc
 
     """
     logger.info("Creating a new project")
-    new_project = Project(project_name=project_name, project_description=project_description, created_by_id=1)
-    db.add(new_project)
-    db.commit()
-    db.refresh(new_project)
+    create_new_project(project_name, project_description, current_user[0].id, db)
     logger.info("New project created successfully")
     return templates.TemplateResponse("home.html", context={"request":request, "message":"Project created successfully"})
 
@@ -67,7 +76,7 @@ def get_projects_created_by_user(request: Request, user_id: int, db: Session = D
     if not user:
         logger.error(f"User with ID {user_id} not found")
         raise HTTPException(status_code=404, detail="User not found")
-    projects = db.query(Project).filter(Project.created_by_id == user_id).all()
+    projects = list_projects_created_by(user_id, db)
     logger.info("Projects retrieved successfully")
     return templates.TemplateResponse("list_projects.html", {"request": request, "projects":projects})
 
@@ -90,12 +99,13 @@ def render_assign_project_template(request: Request, user_id: int, db: Session =
     if not user:
         logger.error(f"User with ID {user_id} not found")
         raise HTTPException(status_code=404, detail="User not found")
-    projects = db.query(Project).all()
+    projects = list_all_projects(db)
     logger.info("Rendering assign project template")
     return templates.TemplateResponse("assign_project.html", context={"request":request, "projects":projects, "user_id": user_id})
 
 
 @router.post("/user_projects/{user_id}/", response_class=HTMLResponse)
+@idempotent
 def create_user_project(request: Request, user_id: int, project_id: int = Form(...), db: Session = Depends(get_db)):
     """
     Creates a new user project relationship.
@@ -111,26 +121,8 @@ def create_user_project(request: Request, user_id: int, project_id: int = Form(.
     Raises:
         HTTPException: If user or project not found.
     """
-    # user = db.query(User).filter(User.id == user_id).first()
     logger.info(f"Creating user project relationship for user ID: {user_id} and project ID: {project_id}")
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.error(f"User with ID {user_id} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    project = db.query(Project).filter(Project.project_id == project_id).first()
-    if not project:
-        logger.error(f"Project with ID {user_project.project_id} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-
-    new_user_project = UserProject(
-        user_id=user_id,
-        project_id=project_id,
-        joined_at=datetime.utcnow()
-    )
-    db.add(new_user_project)
-    db.commit()
-    db.refresh(new_user_project)
+    add_user_to_project(user_id, project_id, db)
     logger.info("User project relationship created successfully")
     return templates.TemplateResponse("home.html", context={"request":request, "message":"Project assigned successfully"})
 
@@ -156,21 +148,150 @@ def get_user_projects(request: Request, user_id: int, db: Session = Depends(get_
     if not user:
         logger.error(f"User with ID {user_id} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user_project_ids = db.query(UserProject.project_id).filter(UserProject.user_id == user_id).all()
-    project_ids = [project_id for project_id, in user_project_ids]
-    projects = db.query(Project).filter(Project.project_id.in_(project_ids)).all()
-
-    project_responses = []
-    for project in projects:
-        project_response = ProjectResponse(
-            project_id=project.project_id,
-            project_name=project.project_name,
-            project_description=project.project_description,
-            created_at=project.created_at,
-            updated_at=project.updated_at,
-            created_by_id=1
-        )
-        project_responses.append(project_response)
-
+    projects = list_projects(membership_cache.get_project_ids(user_id, db), db)
     logger.info(f"Projects retrieved successfully for user with ID: {user_id}")
-    return templates.TemplateResponse("list_user_projects.html", context={"request": request, "projects":project_responses, "user_id": user_id})
+    return templates.TemplateResponse("list_user_projects.html", context={"request": request, "projects":projects, "user_id": user_id})
+
+
+@router.post("/projects/{project_id}/archive/", response_model=JobResponse)
+def archive_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Queues a background job that moves the tasks and memberships of a project to the archive tables.
+
+        Archived projects stay readable through the existing detail endpoints but reject new tasks and members.
+
+        Args:
+            project_id(int): ID of the project to archive.
+            db (Session): Database session.
+
+        Returns:
+            Queued archive job.
+
+        Raises:
+            HTTPException: If the project does not exist or is already archived.
+    """
+    logger.info(f"Archiving project with ID {project_id}")
+    ensure_project_not_archived(get_project(project_id, db))
+    return enqueue_job("archive_project", {"project_id": project_id}, db)
+
+
+@router.post("/projects/{project_id}/restore/", response_model=JobResponse)
+def restore_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Queues a background job that moves an archived project back to the hot tables.
+
+        Args:
+            project_id(int): ID of the project to restore.
+            db (Session): Database session.
+
+        Returns:
+            Queued restore job.
+
+        Raises:
+            HTTPException: If the project does not exist or is not archived.
+    """
+    logger.info(f"Restoring project with ID {project_id}")
+    project = get_project(project_id, db)
+    if project.archived_at is None:
+        logger.error(f"Project with ID {project_id} is not archived")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Project is not archived")
+    return enqueue_job("restore_project", {"project_id": project_id}, db)
+
+
+@router.get("/projects/{project_id}/dashboard/")
+def get_project_task_dashboard(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Retrieves the number of tasks of a project per status.
+
+        Reads the incrementally maintained project_task_stats counters, so the
+        cost does not depend on the number of tasks in the project.
+
+        Args:
+            project_id(int): ID of the project.
+            db (Session): Database session.
+
+        Returns:
+            dict: Total number of tasks and the count per status.
+
+        Raises:
+            HTTPException: If the project does not exist.
+    """
+    logger.info(f"Retrieving task dashboard for project with ID {project_id}")
+    get_project(project_id, db)
+    return get_project_dashboard(project_id, db)
+
+
+@router.get("/projects/{project_id}/activity/", response_model=TaskActivityPage)
+def get_project_activity(project_id: int, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+        db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Retrieves the activity of all tasks of a project, newest first.
+
+        Args:
+            project_id(int): ID of the project.
+            limit(int): Maximum number of entries in the page.
+            cursor(str): next_cursor of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of activity entries and the cursor of the next page.
+
+        Raises:
+            HTTPException: If the project does not exist or the cursor is invalid.
+    """
+    logger.info(f"Retrieving task activity for project with ID {project_id}")
+    get_project(project_id, db)
+    return get_activity_page(db, limit, cursor, project_id=project_id)
+
+
+@router.get("/projects/{project_id}/charts/throughput/", response_model=ThroughputChart)
+def get_project_throughput_chart(project_id: int, granularity: str = "day", start: Optional[datetime] = None,
+        end: Optional[datetime] = None, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Retrieves tasks created and completed and the average cycle time of a project per hour or day.
+
+        Reads the precomputed rollups only; recent activity shows up after the
+        next rollup_task_activity run.
+
+        Args:
+            project_id(int): ID of the project.
+            granularity(str): "hour" or "day".
+            start(datetime): First bucket, defaults to 48 hours or 30 days before end.
+            end(datetime): Last bucket, defaults to now.
+            db (Session): Database session.
+
+        Returns:
+            One point per bucket, empty buckets included.
+
+        Raises:
+            HTTPException: If the project does not exist or the range is invalid.
+    """
+    logger.info(f"Retrieving throughput chart for project with ID {project_id}")
+    get_project(project_id, db)
+    points = get_throughput_chart(project_id, granularity, start, end, db)
+    return ThroughputChart(project_id=project_id, granularity=granularity, points=points)
+
+
+@router.get("/projects/{project_id}/charts/burndown/", response_model=BurndownChart)
+def get_project_burndown_chart(project_id: int, granularity: str = "day", start: Optional[datetime] = None,
+        end: Optional[datetime] = None, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
+    """
+        Retrieves the number of open tasks of a project at the end of each hour or day.
+
+        Args:
+            project_id(int): ID of the project.
+            granularity(str): "hour" or "day".
+            start(datetime): First bucket, defaults to 48 hours or 30 days before end.
+            end(datetime): Last bucket, defaults to now.
+            db (Session): Database session.
+
+        Returns:
+            One point per bucket.
+
+        Raises:
+            HTTPException: If the project does not exist or the range is invalid.
+    """
+    logger.info(f"Retrieving burndown chart for project with ID {project_id}")
+    get_project(project_id, db)
+    points = get_burndown_chart(project_id, granularity, start, end, db)
+    return BurndownChart(project_id=project_id, granularity=granularity, points=points)
@@ -1,19 +1,34 @@
-from fastapi import Depends, HTTPException, status, APIRouter, Request, Form
+import os
+from fastapi import Depends, HTTPException, status, APIRouter, Request, Form, Header, Response, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from utils.templates import templates
 from sqlalchemy.orm import Session
 from models.user import User
 from models.task import TaskStatus, Task
 from models.project import Project
 from routers.auth import  get_scope_user
 from routers.logger import logger
+from middleware.idempotency import idempotent
+from middleware.coalescing import coalesced
 from datetime import datetime
-from schemas.task import TaskCreate, TaskStatusCreate, TaskDetail, TaskUpdate
+from typing_extensions import Optional, List
+from schemas.task import TaskCreate, TaskStatusCreate, TaskDetail, TaskUpdate, TaskResponse, SubtaskResponse, \
+    TaskAncestor, TaskStatusCount, TaskMove, TaskActivityPage, TaskQuery, TaskQueryPage
 from database.session import get_db
+from services.task import update_task_fields, parse_if_match, task_etag, get_task_or_archived, get_next_tasks, \
+    create_new_task, delete_task as delete_task_row
+from services.task_tree import move_task, get_subtree, get_ancestors, get_subtree_status_counts
+from services.task_activity import set_activity_actor, get_task_activity_page
+from services.task_query import query_tasks
+from services.membership import membership_cache, require_project_member, require_task_member, restrict_project_ids
+from services.read_model import list_project_tasks, list_tasks_of_projects
+from services.catalog import catalog
 
 router = APIRouter(prefix="/tasks", tags=['tasks'])
 
-templates = Jinja2Templates(directory="templates")
+# Seconds the rendered task detail and project task list pages are served from memory; 0 turns it off.
+TASK_PAGE_CACHE_SECONDS = float(os.getenv("TASK_PAGE_CACHE_SECONDS", "0"))
+
 
 @router.get("/task/status/", response_class=HTMLResponse)
 def render_task_status_template(request: Request):
@@ -56,8 +71,10 @@ def render_task_template(request: Request, user_id: int, project_id: int):
     return templates.TemplateResponse("add_task.html", context={"request": request, "user_id": user_id, "project_id": project_id})
 
 @router.post("/user_projects/{user_id}/projects/task/{project_id}/", response_class=HTMLResponse)
+@idempotent
 def create_task(request: Request, user_id: int, project_id: int, task_name: str = Form(...), task_description: str = Form(...),
-        task_status: str = Form(...), db: Session = Depends(get_db)):
+        task_status: str = Form(...), parent_task_id: Optional[int] = Form(None), due_at: Optional[datetime] = Form(None),
+        priority: int = Form(0), db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
     """
         Creates a new task with the provided details.
 
@@ -66,50 +83,27 @@ def create_task(request: Request, user_id: int, project_id: int, task_name: str
             project_id(int): ID of the project to which task belongs.
             task_name(str): Name of the task.
             task_description(str): Description of the task.
+            parent_task_id(int): Optional ID of the parent task in the same project.
+            due_at(datetime): Optional due date.
+            priority(int): Priority, higher is more urgent.
             db (Session): Database session.
 
         Returns:
             Home page template response with success response.
 
         Raises:
-            HTTPException: If project, user, or status not found.
+            HTTPException: If project, user, status or parent task not found.
 
     """
     logger.info("Creating a new task")
-    project = db.query(Project).filter(Project.project_id == project_id).first()
-    if not project:
-        logger.error(f"Project with ID {project_id} not found")
-        raise HTTPException(
-            status_code=project.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.error(f"User with ID {user_id} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    task_status = TaskStatus(task_status_name=task_status)
-    db.add(task_status)
-    db.commit()
-    db.refresh(task_status)
-    new_task = Task(
-        project_id=project_id,
-        task_name=task_name,
-        task_description=task_description,
-        task_owner_id=user_id,
-        status_id=task_status.task_status_id,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
-    )
-    db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
-
+    create_new_task(project_id, user_id, task_name, task_description, task_status, parent_task_id, due_at, priority, db)
     logger.info("Task created successfully")
     return templates.TemplateResponse("home.html", context={"request": request, "message":"Task created successfully"})
 
 @router.get("/tasks/{task_id}/", response_class=HTMLResponse)
-def get_task_details(request: Request, task_id: int, db: Session = Depends(get_db)):
+@coalesced(cache_seconds=TASK_PAGE_CACHE_SECONDS)
+def get_task_details(request: Request, task_id: int, db: Session = Depends(get_db),
+        current_user: User = Depends(require_task_member)):
     """
         Retrives task details for specific task.
 
@@ -125,11 +119,11 @@ def get_task_details(request: Request, task_id: int, db: Session = Depends(get_d
 
     """
     logger.info(f"Retrieving details for task with ID {task_id}")
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    task = get_task_or_archived(task_id, db)
     if not task:
         logger.error(f"Task with ID {task_id} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    status_name = db.query(TaskStatus.task_status_name).filter(TaskStatus.task_status_id == task.status_id).scalar()
+    status_name = catalog.status_name(task.status_id, db)
     project = db.query(Project.project_name, Project.project_description).filter(Project.project_id == task.project_id).first()
 
     task_detail = TaskDetail(
@@ -145,7 +139,8 @@ def get_task_details(request: Request, task_id: int, db: Session = Depends(get_d
     return templates.TemplateResponse("task_detail.html", context={"request":request, "task_detail":task_detail})
 
 @router.get("/user/projects/{user_id}/projects/tasks/{project_id}/", response_class=HTMLResponse)
-def get_tasks_for_project(request: Request, user_id: int, project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+@coalesced(cache_seconds=TASK_PAGE_CACHE_SECONDS)
+def get_tasks_for_project(request: Request, user_id: int, project_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_project_member)):
     """
         Retrieves all tasks associated with a specific user and project.
 
@@ -169,18 +164,13 @@ def get_tasks_for_project(request: Request, user_id: int, project_id: int, db: S
     if project is None:
         logger.error(f"Project with ID {project_id} not found")
         raise HTTPException(status_code=404, detail="Project not found")
-    tasks = project.tasks
-    for task in tasks:
-        status_name = db.query(TaskStatus.task_status_name).filter(TaskStatus.task_status_id == task.status_id).scalar()
-        if not status_name:
-            logger.error(f"Task status with id {task.status_id} does not exist")
-        task.status_name = status_name
+    tasks = list_project_tasks(project_id, project.archived_at is not None, db)
     logger.info(f"Tasks retrieved successfully for project with ID {project_id}")
     return templates.TemplateResponse("list_tasks.html", context={"request": request, "tasks":tasks})
 
 
 @router.get("/task/{task_id}/owner/")
-def get_task_with_owner_details(task_id: int, db: Session = Depends(get_db),current_user: User = Depends(get_scope_user) ):
+def get_task_with_owner_details(task_id: int, response: Response, db: Session = Depends(get_db),current_user: User = Depends(require_task_member) ):
     """
         Retrieves details of the task identified by the given task ID including the owner's username and email.
 
@@ -192,7 +182,7 @@ def get_task_with_owner_details(task_id: int, db: Session = Depends(get_db),curr
 
     """
     logger.info(f"Retrieving details for task with ID {task_id}")
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    task = get_task_or_archived(task_id, db)
     if not task:
         logger.warning(f"Task with ID {task_id} not found")
         return None
@@ -205,15 +195,17 @@ def get_task_with_owner_details(task_id: int, db: Session = Depends(get_db),curr
         "task_name": task.task_name,
         "task_description": task.task_description,
         "task_owner_username": owner_username,
-        "task_owner_email": owner_email
+        "task_owner_email": owner_email,
+        "version": task.version
     }
+    response.headers["ETag"] = task_etag(task.version)
     logger.info(f"Details retrieved successfully for task with ID {task_id}")
     return task_details
 
 
 
 @router.get("/task/{task_id}/project_detail/", response_class=HTMLResponse)
-def get_task_with_project_details(request: Request, task_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+def get_task_with_project_details(request: Request, task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
     """
         Retrieves details of the task identified by the given task ID.
 
@@ -224,7 +216,7 @@ def get_task_with_project_details(request: Request, task_id: int, db: Session =
             If the task with the specified ID is not found, returns None.
     """
     logger.info(f"Retrieving details for task with ID {task_id} along with project details")
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    task = get_task_or_archived(task_id, db)
     if task:
         project = task.project
         task_project_details = {
@@ -241,59 +233,187 @@ def get_task_with_project_details(request: Request, task_id: int, db: Session =
     return templates.TemplateResponse("task_detail.html", context={"request":request, "task_detail":task_project_details})
 
 @router.get("/user/", response_class=HTMLResponse)
-def get_tasks_for_user(request: Request, current_user: User = Depends(get_scope_user)):
+def get_tasks_for_user(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
     """
-        Retrieves all tasks of user.
+        Retrieves all tasks of the projects of the current user.
+
+        Reads the shards holding the user's projects in parallel.
 
         Returns:
             Task list template response.
     """
-    logger.info(f"Retrieving tasks for user with ID {current_user.id}")
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        logger.error(f"User with ID {user_id} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user_project_ids = db.query(UserProject.project_id).filter(UserProject.user_id == current_user.id).all()
-    project_ids = [project_id for project_id, in user_project_ids]
-    projects = db.query(Project).filter(Project.project_id.in_(project_ids)).all()
-    tasks_list = []
-    for project in projects:
-        tasks = project.tasks
-        tasks_list.append(tasks)
-    for task in tasks_list:
-        status_name = db.query(TaskStatus.task_status_name).filter(TaskStatus.task_status_id == task.status_id).scalar()
-        if not status_name:
-            logger.error(f"Task status with id {task.status_id} does not exist")
-        task.status_name = status_name
-    logger.info(f"Tasks retrieved successfully for project with ID {project_id}")
-    return templates.TemplateResponse("list_tasks.html", context={"request": request, "tasks":tasks})
+    user, _ = current_user
+    logger.info(f"Retrieving tasks for user with ID {user.id}")
+    tasks = list_tasks_of_projects(membership_cache.get_project_ids(user.id, db), db)
+    logger.info(f"Tasks retrieved successfully for user with ID {user.id}")
+    return templates.TemplateResponse("list_tasks.html", context={"request": request, "tasks": tasks})
 
 
-@router.put("update/{task_id}")
-def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
+@router.get("/user/next/", response_model=List[TaskResponse])
+def get_next_tasks_for_user(limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_db),
+        current_user: User = Depends(get_scope_user)):
     """
-    Update task details for the specified task ID.
+        Retrieves the open tasks of the current user that are due next.
+
+        Args:
+            limit(int): Maximum number of tasks to return.
+            db (Session): Database session.
+
+        Returns:
+            Tasks by due date, then priority; tasks without a due date come last.
     """
-    db_task = db.query(Task).filter(Task.task_id == task_id).first()
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
+    user, _ = current_user
+    logger.info(f"Retrieving next tasks for user with ID {user.id}")
+    return [TaskResponse(**row._mapping) for row in get_next_tasks(user.id, limit, db)]
 
-    for attr, value in task_update.dict(exclude_unset=True).items():
-        setattr(db_task, attr, value)
 
-    db.commit()
-    db.refresh(db_task)
-    return db_task
+@router.post("/query/", response_model=TaskQueryPage)
+def query_task_list(task_query: TaskQuery, db: Session = Depends(get_db), current_user: User = Depends(get_scope_user)):
+    """
+        Retrieves tasks matching any combination of project, owner, status,
+        created/updated range and name prefix filters, with status and owner facet counts.
+
+        Args:
+            task_query(TaskQuery): Filters and page.
+            db (Session): Database session.
+
+        Returns:
+            Page of tasks ordered by task ID, the total number of matches and
+            the facets; pass next_after_task_id as after_task_id to get the next page.
+    """
+    logger.info("Querying tasks")
+    task_query.project_ids = restrict_project_ids(current_user, task_query.project_ids, db)
+    page = query_tasks(task_query, db)
+    page["items"] = [TaskResponse(**row._mapping) for row in page["items"]]
+    return page
+
+
+@router.put("/update/{task_id}", response_model=TaskResponse)
+def update_task(task_id: int, task_update: TaskUpdate, response: Response, if_match: Optional[str] = Header(None),
+        db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+    Update task details for the specified task ID.
+
+    Send the ETag of the task as If-Match to only update the version you
+    read; the new ETag is returned in the response headers.
+
+    Raises:
+        HTTPException: 404 if the task does not exist, 412 if it was changed since the If-Match version.
+    """
+    expected_version = parse_if_match(if_match)
+    set_activity_actor(db, current_user[0].id)
+    task = update_task_fields(task_id, task_update.dict(exclude_unset=True), expected_version, db)
+    response.headers["ETag"] = task_etag(task.version)
+    return TaskResponse(**task._mapping)
 
 
 @router.delete("delete/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
+def delete_task(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
     """
     Delete the task with the specified task ID.
     """
-    db_task = db.query(Task).filter(Task.task_id == task_id).first()
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    db.delete(db_task)
-    db.commit()
-    return {"message": "Task deleted successfully"}
\ No newline at end of file
+    set_activity_actor(db, current_user[0].id)
+    delete_task_row(task_id, db)
+    return {"message": "Task deleted successfully"}
+
+
+@router.get("/tasks/{task_id}/subtree/", response_model=List[SubtaskResponse])
+def get_task_subtree(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves a task with all of its subtasks at any depth, in one query.
+
+        Args:
+            task_id(int): ID of the root task.
+            db (Session): Database session.
+
+        Returns:
+            Tasks of the subtree ordered by depth, the root first.
+
+        Raises:
+            HTTPException: If task with the specified id does not exist.
+    """
+    logger.info(f"Retrieving subtree of task with ID {task_id}")
+    return [SubtaskResponse(**row._mapping) for row in get_subtree(task_id, db)]
+
+
+@router.get("/tasks/{task_id}/ancestors/", response_model=List[TaskAncestor])
+def get_task_ancestors(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves the breadcrumb of a task, from the root task down to its parent.
+
+        Args:
+            task_id(int): ID of the task.
+            db (Session): Database session.
+
+        Returns:
+            Ancestor tasks with their distance to the task.
+
+        Raises:
+            HTTPException: If task with the specified id does not exist.
+    """
+    logger.info(f"Retrieving ancestors of task with ID {task_id}")
+    return [TaskAncestor(**row._mapping) for row in get_ancestors(task_id, db)]
+
+
+@router.get("/tasks/{task_id}/subtree/status/", response_model=List[TaskStatusCount])
+def get_task_subtree_status(task_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves the number of tasks per status in the subtree of a task, including the task itself.
+
+        Args:
+            task_id(int): ID of the root task.
+            db (Session): Database session.
+
+        Returns:
+            Task count per status.
+
+        Raises:
+            HTTPException: If task with the specified id does not exist.
+    """
+    logger.info(f"Retrieving subtree status counts of task with ID {task_id}")
+    return [TaskStatusCount(**row._mapping) for row in get_subtree_status_counts(task_id, db)]
+
+
+@router.put("/tasks/{task_id}/parent/", response_model=TaskResponse)
+def move_task_subtree(task_id: int, task_move: TaskMove, db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Moves a task and its whole subtree below another task, or to the top level when parent_task_id is null.
+
+        Args:
+            task_id(int): ID of the task to move.
+            task_move(TaskMove): New parent task.
+            db (Session): Database session.
+
+        Returns:
+            Moved task.
+
+        Raises:
+            HTTPException: If the task or parent does not exist, the parent belongs to another project
+            or lies inside the subtree of the task.
+    """
+    logger.info(f"Moving task with ID {task_id} below task with ID {task_move.parent_task_id}")
+    set_activity_actor(db, current_user[0].id)
+    task = move_task(task_id, task_move.parent_task_id, db)
+    return TaskResponse(**{column.name: getattr(task, column.name) for column in Task.__table__.columns})
+
+
+@router.get("/tasks/{task_id}/activity/", response_model=TaskActivityPage)
+def get_task_activity(task_id: int, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+        db: Session = Depends(get_db), current_user: User = Depends(require_task_member)):
+    """
+        Retrieves the change history of a task, newest first.
+
+        Args:
+            task_id(int): ID of the task.
+            limit(int): Maximum number of entries in the page.
+            cursor(str): next_cursor of the previous page.
+            db (Session): Database session.
+
+        Returns:
+            Page of activity entries and the cursor of the next page.
+
+        Raises:
+            HTTPException: If the cursor is invalid.
+    """
+    logger.info(f"Retrieving activity of task with ID {task_id}")
+    return get_task_activity_page(task_id, db, limit, cursor)
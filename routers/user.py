@@ -1,11 +1,12 @@
-from fastapi import Depends, HTTPException, status, APIRouter, Form, Request
+from fastapi import Depends, HTTPException, status, APIRouter, Form, Request, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from utils.templates import templates
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from models.user import UserDetail, UserRole, UserTechnology, User
 from database.session import get_db
 from routers.logger import logger
+from middleware.idempotency import idempotent
 from routers.auth import get_scope_user
 from schemas.user import UserCreate, GetUser
 from schemas.user_role import UserRoleCreate
@@ -13,11 +14,14 @@ from schemas.user_detail import UserDetailResponse, UserDetailsCreate
 from schemas.user_technology import UserTechnologyCreate
 from utils.hash_pwd import hash_password
 from utils.verify_pwd import verify_password
+from utils.streaming import stream_template
+from typing_extensions import Optional
+from services.read_model import iter_users
+from services.catalog import catalog
 from services.user import get_details_of_user, create_user, create_user_technology_data, create_user_role_data, create_details_of_user
 
 router = APIRouter(prefix="/users", tags=['users'])
 
-templates = Jinja2Templates(directory="templates")
 
 
 def get_user_by_email_and_password(email: str, password: str, db: Session):
@@ -65,11 +69,15 @@ def render_register_template(request: Request):
 
 
 @router.post("/register/", response_class=HTMLResponse)
-def register_user(request: Request, username: str = Form(...), password: str = Form(...), email: str = Form(...), is_admin_user: bool= Form(False),
+@idempotent
+def register_user(request: Request, username: str = Form(...), password: str = Form(...), email: str = Form(...),
     db: Session = Depends(get_db)):
     """
     Creates a new user with the provided user details in the database.
 
+    Self-registered users are never admins: admins bypass every project
+    membership check, so the flag is only set on existing users.
+
     Args:
         username(str): Username of current user.
         password(str): Password of current user.
@@ -97,7 +105,7 @@ def register_user(request: Request, username: str = Form(...), password: str = F
         logger.error(f"User with the provided details already exists {username} {email}")
         return RedirectResponse(url='/users/register/')
     logger.info("Creating a new user with username: %s and email: %s", username, email)
-    user = create_user(username, password, email, is_admin_user, db)
+    user = create_user(username, password, email, db=db)
     return templates.TemplateResponse("login.html", context={"request":request})
 
 @router.get("/login/", response_class=HTMLResponse)
@@ -129,16 +137,24 @@ def login_user(request: Request, email: str =  Form(...),password: str = Form(..
     return templates.TemplateResponse("home.html", {"request": request, "username": user.username, "message": "User Logged in successfully"})
 
 @router.get("/users/", response_class=HTMLResponse)
-def get_users(request: Request, db: Session = Depends(get_db)):
+def get_users(request: Request, q: Optional[str] = None, field: str = Query("username", pattern="^(username|email)$")):
     """
-    Retrieves list of all users.
+    Retrieves the user directory, optionally only users whose username or email starts with a prefix.
+
+    The page is rendered while users are read in bounded chunks, so memory
+    does not grow with the number of users.
+
+    Args:
+        q(str): Prefix to search for.
+        field(str): "username" or "email", the field searched and sorted by.
 
     Returns:
-        Users lists tenplate response.
+        Streamed users list template response.
     """
-    users = db.query(User).all()
     logger.info("Rendering user list template response")
-    return templates.TemplateResponse("list_users.html", {"request": request, "users":users})
+    return stream_template(templates, "list_users.html", {
+        "request": request, "users": iter_users(q, field), "q": q or "", "field": field
+    })
 
 @router.post("/user/details/{user_id}/", response_class=HTMLResponse)
 def create_user_details(request: Request, user_id: int, user_role_id: str = Form(...), user_technology_id: str = Form(...), db: Session = Depends(get_db)):
@@ -162,8 +178,8 @@ def create_user_details(request: Request, user_id: int, user_role_id: str = Form
     user, user_detail  = create_details_of_user(user_id, user_role_id, user_technology_id, db)
     return templates.TemplateResponse("user_details.html", {"request": request, "user": user, "user_role":user_detail[1],
     "user_technology": user_detail[2],
-    "roles": db.query(UserRole).order_by(UserRole.role_name).all(),
-    "technologies": db.query(UserTechnology).order_by(UserTechnology.technology_name).all()})
+    "roles": catalog.roles(db),
+    "technologies": catalog.technologies(db)})
 
 
 
@@ -173,16 +189,18 @@ def get_user_details(request: Request, user_id: int, db: Session = Depends(get_d
     Retrieves user details for the specified user ID.
     """
     # logger.info("Retrieving user details for user ID: %d", user_id)
-    user, user_detail = get_details_of_user(user_id, db)
-    if not user_detail:
-        return templates.TemplateResponse("user_details.html", {"request": request, "user": user,
-        "roles": db.query(UserRole).order_by(UserRole.role_name).all(),
-        "technologies": db.query(UserTechnology).order_by(UserTechnology.technology_name).all()})
+    profile = get_details_of_user(user_id, db)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    if profile.role_name is None:
+        return templates.TemplateResponse("user_details.html", {"request": request, "user": profile,
+        "roles": catalog.roles(db),
+        "technologies": catalog.technologies(db)})
     else:
-        return templates.TemplateResponse("user_details.html", {"request": request, "user": user, "user_role":user_detail[1],
-        "user_technology": user_detail[2],
-        "roles": db.query(UserRole).order_by(UserRole.role_name).all(),
-        "technologies": db.query(UserTechnology).order_by(UserTechnology.technology_name).all()})
+        return templates.TemplateResponse("user_details.html", {"request": request, "user": profile, "user_role":profile.role_name,
+        "user_technology": profile.technology_name,
+        "roles": catalog.roles(db),
+        "technologies": catalog.technologies(db)})
 
 
 @router.get("/roles/", response_class=HTMLResponse)
@@ -0,0 +1,40 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing_extensions import Optional, List
+
+
+class ThroughputPoint(BaseModel):
+    """
+    Response model for the task throughput of one hour or day.
+    """
+    bucket_start: datetime
+    created: int
+    completed: int
+    reopened: int
+    avg_cycle_time_seconds: Optional[float] = None
+
+
+class ThroughputChart(BaseModel):
+    """
+    Response model for the task throughput of a project over time.
+    """
+    project_id: int
+    granularity: str
+    points: List[ThroughputPoint]
+
+
+class BurndownPoint(BaseModel):
+    """
+    Response model for the number of open tasks at the end of one hour or day.
+    """
+    bucket_start: datetime
+    open: int
+
+
+class BurndownChart(BaseModel):
+    """
+    Response model for the open tasks of a project over time.
+    """
+    project_id: int
+    granularity: str
+    points: List[BurndownPoint]
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field
+from typing_extensions import Optional, List, Dict, Any
+
+
+class BatchSubRequest(BaseModel):
+    """
+    Model for one request of a batch.
+
+    The path may carry a query string. body is sent as JSON and form as a
+    urlencoded form, for the HTML form routes.
+    """
+    method: str = Field("GET", pattern="^(GET|POST|PUT|PATCH|DELETE)$")
+    path: str = Field(..., pattern="^/")
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+    form: Optional[Dict[str, str]] = None
+
+
+class BatchRequest(BaseModel):
+    """
+    Model for a batch of requests.
+
+    With concurrency 1 the requests run in order over one database session,
+    otherwise up to concurrency of them run at a time, each with its own session.
+    """
+    requests: List[BatchSubRequest] = Field(..., min_length=1)
+    concurrency: int = Field(1, ge=1)
+
+
+class BatchSubResponse(BaseModel):
+    """
+    Response model for one request of a batch.
+    """
+    status: int
+    headers: Dict[str, str]
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    """
+    Response model for a batch, with the responses in request order.
+    """
+    responses: List[BatchSubResponse]
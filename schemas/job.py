@@ -0,0 +1,31 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing_extensions import Optional, Any
+
+
+class JobCreate(BaseModel):
+    """
+    Model for enqueuing a new background Job.
+    """
+    payload: dict = {}
+    max_attempts: Optional[int] = None
+
+
+class JobResponse(BaseModel):
+    """
+    Response model for Job status and progress.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    job_id: int
+    job_type: str
+    status: str
+    progress: int
+    attempts: int
+    max_attempts: int
+    run_after: Optional[datetime] = None
+    result: Optional[Any] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime
+from typing_extensions import Optional, List, Union
+
+from schemas.task import TaskResponse
+
+
+class LabelCreate(BaseModel):
+    """
+    Model for creating a new Label.
+    """
+    label_name: str = Field(min_length=1, max_length=100)
+
+
+class LabelResponse(BaseModel):
+    """
+    Response model for Label.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    label_id: int
+    label_name: str
+    created_at: Optional[datetime] = None
+
+
+class TaskLabels(BaseModel):
+    """
+    Model for the names of labels to put on a Task.
+    """
+    labels: List[str] = Field(min_length=1)
+
+
+class LabelExpression(BaseModel):
+    """
+    Model for a label filter.
+
+    Each item is a label name or a nested expression; "all" matches tasks
+    with every item (AND), "any" tasks with at least one (OR). When both are
+    given, a task has to match both.
+    """
+    all: Optional[List[Union[str, LabelExpression]]] = None
+    any: Optional[List[Union[str, LabelExpression]]] = None
+
+
+class TaskLabelFilter(BaseModel):
+    """
+    Model for filtering tasks by labels, projects and statuses.
+    """
+    labels: LabelExpression
+    project_ids: Optional[List[int]] = None
+    status_ids: Optional[List[int]] = None
+    limit: int = Field(50, ge=1, le=500)
+    after_task_id: Optional[int] = None
+
+
+class TaskLabelFilterPage(BaseModel):
+    """
+    Response model for a page of filtered tasks, ordered by task ID.
+    """
+    items: List[TaskResponse]
+    next_after_task_id: Optional[int] = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing_extensions import Optional, List
 
 
 class ProjectCreate(BaseModel):
@@ -8,7 +9,8 @@ class ProjectCreate(BaseModel):
     """
     project_name: str
     project_description: str
-    created_by_id: int
+    # Admins only; defaults to the current user.
+    created_by_id: Optional[int] = None
 
 
 class ProjectResponse(BaseModel):
@@ -29,3 +31,28 @@ class UserProjectCreate(BaseModel):
     """
     user_id: int
     project_id: int
+
+
+class ProjectPage(BaseModel):
+    """
+    Response model for a page of projects ordered by project ID.
+    """
+    items: List[ProjectResponse]
+    next_after_project_id: Optional[int] = None
+
+
+class ProjectMemberCreate(BaseModel):
+    """
+    Model for adding a member to a Project.
+    """
+    user_id: int
+
+
+class UserProjectResponse(BaseModel):
+    """
+    Response model for UserProject.
+    """
+    user_project_id: int
+    user_id: int
+    project_id: int
+    joined_at: Optional[datetime] = None
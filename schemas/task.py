@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing_extensions import Optional
+from typing_extensions import Optional, List
 
 
 class TaskStatusCreate(BaseModel):
@@ -34,6 +34,152 @@ class TaskDetail(BaseModel):
 
 
 class TaskUpdate(BaseModel):
-    task_name: Optional[str]
-    task_description: Optional[str]
-    status_id: Optional[int]
+    """
+    Model for partially updating a Task.
+    """
+    task_name: Optional[str] = None
+    task_description: Optional[str] = None
+    status_id: Optional[int] = None
+    due_at: Optional[datetime] = None
+    priority: Optional[int] = None
+
+
+class TaskResponse(BaseModel):
+    """
+    Response model for Task.
+    """
+    task_id: int
+    project_id: Optional[int] = None
+    task_name: Optional[str] = None
+    task_description: Optional[str] = None
+    status_id: Optional[int] = None
+    task_owner_id: Optional[int] = None
+    parent_task_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    version: int
+    due_at: Optional[datetime] = None
+    priority: int = 0
+    is_overdue: bool = False
+
+
+class TaskCreateRequest(BaseModel):
+    """
+    Model for creating a Task through the JSON API.
+    """
+    task_name: str
+    task_description: str
+    task_status: str
+    task_owner_id: Optional[int] = None
+    parent_task_id: Optional[int] = None
+    due_at: Optional[datetime] = None
+    priority: int = 0
+
+
+class TaskDetailResponse(TaskResponse):
+    """
+    Response model for a Task with its project and status names.
+    """
+    project_name: Optional[str] = None
+    project_description: Optional[str] = None
+    status_name: Optional[str] = None
+
+
+class TaskPage(BaseModel):
+    """
+    Response model for a page of tasks ordered by task ID.
+    """
+    items: List[TaskResponse]
+    next_after_task_id: Optional[int] = None
+
+
+class SubtaskResponse(TaskResponse):
+    """
+    Response model for a Task within a subtree.
+    """
+    depth: int
+
+
+class TaskAncestor(BaseModel):
+    """
+    Response model for one breadcrumb entry above a Task.
+    """
+    task_id: int
+    task_name: Optional[str] = None
+    depth: int
+
+
+class TaskStatusCount(BaseModel):
+    """
+    Response model for the number of tasks in one status.
+    """
+    status_id: Optional[int] = None
+    status_name: Optional[str] = None
+    task_count: int
+
+
+class TaskMove(BaseModel):
+    """
+    Model for moving a Task below another Task.
+    """
+    parent_task_id: Optional[int] = None
+
+
+class TaskActivity(BaseModel):
+    """
+    Response model for one entry of the task activity log.
+    """
+    activity_id: int
+    task_id: int
+    project_id: Optional[int] = None
+    actor_id: Optional[int] = None
+    action: str
+    changes: dict
+    created_at: datetime
+
+
+class TaskActivityPage(BaseModel):
+    """
+    Response model for a page of task activity, newest first.
+    """
+    items: List[TaskActivity]
+    next_cursor: Optional[str] = None
+
+
+class TaskQuery(BaseModel):
+    """
+    Model for querying tasks by any combination of filters.
+    """
+    project_ids: Optional[List[int]] = None
+    owner_ids: Optional[List[int]] = None
+    status_ids: Optional[List[int]] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+    name_prefix: Optional[str] = Field(None, min_length=1)
+    limit: int = Field(50, ge=1, le=500)
+    after_task_id: Optional[int] = None
+
+
+class FacetValue(BaseModel):
+    """
+    Response model for the number of matching tasks with one facet value.
+    """
+    value: Optional[int] = None
+    label: Optional[str] = None
+    count: int
+
+
+class TaskQueryPage(BaseModel):
+    """
+    Response model for a page of queried tasks with status and owner facets.
+
+    total and the facets count every task matching the query, not just the page.
+    """
+    items: List[TaskResponse]
+    next_after_task_id: Optional[int] = None
+    total: int
+    status_facet: List[FacetValue]
+    owner_facet: List[FacetValue]
+    plan: str
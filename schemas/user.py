@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing_extensions import Union, List
+from typing_extensions import Union, List, Optional
 
 from models.user import User
 
@@ -42,3 +42,32 @@ class GetUser(BaseModel):
     """
     email: str
     password: str
+
+
+class UserResponse(BaseModel):
+    """
+    Response model for User.
+    """
+    id: int
+    username: Optional[str] = None
+    email: Optional[str] = None
+    is_admin_user: Optional[bool] = None
+
+
+class UserPage(BaseModel):
+    """
+    Response model for a page of the user directory.
+    """
+    items: List[UserResponse]
+    next_after: Optional[str] = None
+
+
+class UserProfileResponse(BaseModel):
+    """
+    Response model for a User with the role and technology of their latest details.
+    """
+    id: int
+    username: Optional[str] = None
+    email: Optional[str] = None
+    role_name: Optional[str] = None
+    technology_name: Optional[str] = None
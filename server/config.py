@@ -0,0 +1,59 @@
+import os
+from configparser import ConfigParser
+from pydantic import BaseModel, ConfigDict
+
+# Config file read when none is given on the command line.
+SERVER_CONFIG_FILE = os.getenv("SERVER_CONFIG_FILE", "server.ini")
+
+
+class ServerConfig(BaseModel):
+    """
+    Settings of the production server, read from the [server] section of the config file.
+
+    Attributes:
+        app: Import path of the ASGI application.
+        host, port, backlog: Listening socket shared by all workers.
+        workers: Number of worker processes.
+        preload: Import the application once in the supervisor before forking.
+            Workers then share its memory pages, but a reload does not pick
+            up code changes.
+        loop, http: Event loop and HTTP parser, "auto" picks uvloop and
+            httptools when they are installed.
+        max_requests: Requests after which a worker is replaced, 0 for never.
+        max_requests_jitter: Up to this many requests are added to
+            max_requests per worker, so workers are not all replaced at once.
+        keepalive_timeout: Seconds an idle keep-alive connection stays open.
+        graceful_timeout: Seconds a stopping worker gets to finish its
+            requests before it is killed.
+        limit_concurrency: Connections per worker above which 503 is
+            returned, none by default.
+    """
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+    app: str = "app:app"
+    host: str = "127.0.0.1"
+    port: int = 8000
+    backlog: int = 2048
+    workers: int = 1
+    preload: bool = True
+    loop: str = "auto"
+    http: str = "auto"
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    keepalive_timeout: int = 5
+    graceful_timeout: int = 30
+    limit_concurrency: int = 0
+
+
+def load_server_config(path: str = SERVER_CONFIG_FILE, **overrides) -> ServerConfig:
+    """
+    Reads the server config file, if it exists, and applies overrides that are not None.
+
+    Raises:
+        ValidationError: If the file holds an unknown or malformed setting.
+    """
+    parser = ConfigParser(inline_comment_prefixes=("#",))
+    parser.read(path)
+    settings = dict(parser["server"]) if parser.has_section("server") else {}
+    settings.update({name: value for name, value in overrides.items() if value is not None})
+    return ServerConfig(**settings)
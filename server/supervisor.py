@@ -0,0 +1,213 @@
+import os
+import random
+import select
+import signal
+import socket
+import time
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+from routers.logger import logger
+from server.config import ServerConfig, load_server_config
+
+# Seconds a new worker must live for its exit not to count as a failed boot.
+WORKER_BOOT_SECONDS = 2
+# Pause before replacing workers after a failed boot, so a broken app does not fork in a loop.
+WORKER_RESPAWN_BACKOFF_SECONDS = 5
+_TICK_SECONDS = 1.0
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+_HANDLED_SIGNALS = _STOP_SIGNALS + (signal.SIGHUP, signal.SIGCHLD)
+
+
+def bind_socket(config: ServerConfig) -> socket.socket:
+    """
+    Opens the listening socket the workers accept connections on.
+    """
+    family = socket.AF_INET6 if ":" in config.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((config.host, config.port))
+    sock.listen(config.backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """
+    Pre-forking process manager: binds one socket, optionally imports the
+    application once, and forks uvicorn workers that share both.
+
+    Exited workers are replaced, so workers recycled after max_requests
+    come back fresh. SIGHUP re-reads the config file, starts a new set of
+    workers and stops the old ones gracefully; SIGTERM and SIGINT stop all
+    workers gracefully and exit.
+    """
+
+    def __init__(self, config_path: str, **overrides):
+        self.config_path = config_path
+        self.overrides = overrides
+        self.config = load_server_config(config_path, **overrides)
+        self.app = None
+        self.socket = None
+        # pid -> (generation, start time) of running workers
+        self.workers = {}
+        # pid -> time after which a stopping worker is killed
+        self.stopping = {}
+        self.generation = 0
+        self.respawn_after = 0.0
+        self.pending_signals = []
+
+    def run(self) -> int:
+        """
+        Serves until stopped by a signal.
+
+        Returns:
+            int: Exit code of the supervisor.
+        """
+        self.socket = bind_socket(self.config)
+        if self.config.preload:
+            self.app = import_from_string(self.config.app)
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        signal.set_wakeup_fd(self._wakeup_write)
+        for signum in _HANDLED_SIGNALS:
+            signal.signal(signum, self._on_signal)
+        logger.info(f"Supervisor {os.getpid()} listening on {self.config.host}:{self.config.port} "
+                    f"with {self.config.workers} workers, preload={self.config.preload}")
+
+        while True:
+            self._reap_workers()
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum in _STOP_SIGNALS:
+                    self._stop_all()
+                    return 0
+                if signum == signal.SIGHUP:
+                    self._reload()
+            self._kill_overdue_workers()
+            self._spawn_missing_workers()
+            select.select([self._wakeup_read], [], [], _TICK_SECONDS)
+            try:
+                while os.read(self._wakeup_read, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _on_signal(self, signum, frame):
+        if signum != signal.SIGCHLD:
+            self.pending_signals.append(signum)
+
+    def _spawn_missing_workers(self):
+        if time.monotonic() < self.respawn_after:
+            return
+        current = sum(1 for generation, _ in self.workers.values() if generation == self.generation)
+        for _ in range(self.config.workers - current):
+            self._spawn_worker()
+
+    def _spawn_worker(self):
+        max_requests = None
+        if self.config.max_requests:
+            max_requests = self.config.max_requests + random.randint(0, self.config.max_requests_jitter)
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                self._serve(max_requests)
+                exit_code = 0
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} failed")
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = (self.generation, time.monotonic())
+        logger.info(f"Started worker {pid}, max requests {max_requests or 'unlimited'}")
+
+    def _serve(self, max_requests):
+        # A Ctrl-C in the terminal reaches the supervisor only, which then stops the workers once.
+        os.setpgid(0, 0)
+        signal.set_wakeup_fd(-1)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+        for signum in _HANDLED_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        if self.app is not None:
+            # Connections opened by the supervisor must not be shared with its children.
+            from database.session import shard_engines
+            for shard_engine in shard_engines:
+                shard_engine.dispose(close=False)
+        config = uvicorn.Config(
+            self.app if self.app is not None else self.config.app,
+            loop=self.config.loop,
+            http=self.config.http,
+            timeout_keep_alive=self.config.keepalive_timeout,
+            timeout_graceful_shutdown=self.config.graceful_timeout,
+            limit_max_requests=max_requests,
+            limit_concurrency=self.config.limit_concurrency or None,
+            backlog=self.config.backlog,
+        )
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, wait_status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            exit_code = os.waitstatus_to_exitcode(wait_status)
+            self.stopping.pop(pid, None)
+            generation, started_at = self.workers.pop(pid, (None, 0.0))
+            if generation == self.generation and exit_code != 0 and time.monotonic() - started_at < WORKER_BOOT_SECONDS:
+                logger.error(f"Worker {pid} failed to boot with exit code {exit_code}")
+                self.respawn_after = time.monotonic() + WORKER_RESPAWN_BACKOFF_SECONDS
+            else:
+                logger.info(f"Worker {pid} exited with code {exit_code}")
+
+    def _stop_worker(self, pid: int):
+        if pid in self.stopping:
+            return
+        self.stopping[pid] = time.monotonic() + self.config.graceful_timeout
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _kill_overdue_workers(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.stopping.items()):
+            if now >= deadline:
+                logger.warning(f"Killing worker {pid} after graceful timeout")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.stopping[pid] = float("inf")
+
+    def _reload(self):
+        config = load_server_config(self.config_path, **self.overrides)
+        if (config.host, config.port) != (self.config.host, self.config.port):
+            logger.warning("Changing the listening address needs a restart, keeping the current socket")
+            config = config.model_copy(update={"host": self.config.host, "port": self.config.port})
+        if self.app is not None and config.app != self.config.app:
+            logger.warning("The application is preloaded, keeping the current one")
+        self.config = config
+        old_workers = list(self.workers)
+        self.generation += 1
+        self.respawn_after = 0.0
+        logger.info(f"Reloading: replacing {len(old_workers)} workers with {config.workers}")
+        self._spawn_missing_workers()
+        for pid in old_workers:
+            self._stop_worker(pid)
+
+    def _stop_all(self):
+        logger.info(f"Stopping {len(self.workers)} workers")
+        for pid in list(self.workers):
+            self._stop_worker(pid)
+        while self.workers:
+            self._reap_workers()
+            self._kill_overdue_workers()
+            time.sleep(0.1)
+        self.socket.close()
+        logger.info("Supervisor stopped")
@@ -0,0 +1,393 @@
+import os
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database.session import SHARD_ID_BITS, shard_engines, shard_for_id, use_shard
+from models.analytics import ProjectTaskRollup, RollupCheckpoint
+from models.task import Task, TaskArchive, TaskStatus
+from models.task_activity import task_activity_table
+from services.job import job_handler, report_progress
+from services.task import TASK_CLOSED_STATUSES
+from services.task_activity import list_partition_months
+from routers.logger import logger
+from utils.sql import increment_counters
+
+TASK_ROLLUP_SECONDS = float(os.getenv("TASK_ROLLUP_SECONDS", "300"))
+TASK_ROLLUP_BATCH_SIZE = int(os.getenv("TASK_ROLLUP_BATCH_SIZE", "5000"))
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Default chart length in buckets per granularity.
+DEFAULT_CHART_BUCKETS = {"hour": 48, "day": 30}
+MAX_CHART_BUCKETS = 2000
+
+_ACTIVITY_CHECKPOINT = "task_activity"
+_BACKFILL_CHECKPOINT = "task_backfill"
+
+_rollups = ProjectTaskRollup.__table__
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """
+    Start of the hour or day bucket containing moment.
+    """
+    if granularity == "day":
+        return datetime(moment.year, moment.month, moment.day)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupDeltas:
+    """
+    Collects rollup counter changes per project and bucket, written with
+    one upsert per touched row.
+    """
+
+    def __init__(self):
+        self._rows = defaultdict(Counter)
+
+    def add(self, project_id: Optional[int], moment: Optional[datetime], **counts):
+        if project_id is None or moment is None:
+            return
+        for granularity in GRANULARITIES:
+            self._rows[(project_id, granularity, bucket_start(moment, granularity))].update(counts)
+
+    def add_completion(self, project_id: Optional[int], moment: datetime, created_at: Optional[datetime]):
+        counts = {"completed_count": 1, "open_delta": -1}
+        if created_at is not None and moment >= created_at:
+            counts["cycle_time_seconds"] = int((moment - created_at).total_seconds())
+            counts["cycle_time_count"] = 1
+        self.add(project_id, moment, **counts)
+
+    def apply(self, db: Session):
+        for (project_id, granularity, start), counts in self._rows.items():
+            counts = {column: delta for column, delta in counts.items() if delta}
+            if counts:
+                increment_counters(
+                    db, _rollups, {"project_id": project_id, "granularity": granularity, "bucket_start": start}, counts
+                )
+
+
+def _get_checkpoint(db: Session, name: str) -> RollupCheckpoint:
+    checkpoint = db.get(RollupCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = RollupCheckpoint(name=name, last_id=0)
+        db.add(checkpoint)
+    return checkpoint
+
+
+def _closed_status_ids(db: Session, status_ids: Iterable[Optional[int]]) -> set:
+    status_ids = {status_id for status_id in status_ids if status_id is not None}
+    if not status_ids:
+        return set()
+    return set(db.execute(select(TaskStatus.task_status_id).where(
+        TaskStatus.task_status_id.in_(status_ids),
+        func.lower(TaskStatus.task_status_name).in_(TASK_CLOSED_STATUSES)
+    )).scalars())
+
+
+def _task_created_at(db: Session, task_ids) -> dict:
+    created_at = {}
+    for model in (Task, TaskArchive):
+        missing = [task_id for task_id in task_ids if task_id not in created_at]
+        if not missing:
+            break
+        created_at.update(db.query(model.task_id, model.created_at).filter(model.task_id.in_(missing)).all())
+    return created_at
+
+
+def _roll_up_activity(rows, db: Session) -> RollupDeltas:
+    """
+    Turns a batch of activity log entries into rollup deltas.
+
+    Status IDs are local to each shard, so statuses and task creation times
+    are looked up on the shard of each entry's project. Status changes
+    without a known previous status are skipped, they cannot be told apart
+    from changes between two open statuses.
+    """
+    shard_entries = defaultdict(list)
+    for row in rows:
+        shard_id = shard_for_id(row.project_id) if row.project_id is not None else None
+        if shard_id is not None:
+            shard_entries[shard_id].append((row, json.loads(row.changes or "{}").get("status_id") or {}))
+    deltas = RollupDeltas()
+    for shard_id, entries in sorted(shard_entries.items()):
+        use_shard(db, shard_id)
+        closed = _closed_status_ids(db, [value for _, change in entries for value in (change.get("old"), change.get("new"))])
+        completions = []
+        for row, change in entries:
+            if row.action == "created":
+                deltas.add(row.project_id, row.created_at, created_count=1, open_delta=1)
+                if change.get("new") in closed:
+                    deltas.add_completion(row.project_id, row.created_at, row.created_at)
+            elif row.action == "deleted":
+                if change.get("old") not in closed:
+                    deltas.add(row.project_id, row.created_at, open_delta=-1)
+            elif "old" in change and "new" in change:
+                was_closed, is_closed = change["old"] in closed, change["new"] in closed
+                if is_closed and not was_closed:
+                    completions.append(row)
+                elif was_closed and not is_closed:
+                    deltas.add(row.project_id, row.created_at, reopened_count=1, open_delta=1)
+        created_at = _task_created_at(db, {row.task_id for row in completions})
+        for row in completions:
+            deltas.add_completion(row.project_id, row.created_at, created_at.get(row.task_id))
+    use_shard(db, None)
+    return deltas
+
+
+def _activity_checkpoint_name(month: str) -> str:
+    return f"{_ACTIVITY_CHECKPOINT}_{month}"
+
+
+def _activity_checkpoints(db: Session, months) -> dict:
+    """
+    Returns the checkpoint of every activity partition, creating missing ones.
+
+    Checkpoints used to be kept for the newest partition only; the older
+    partitions it implies are taken as rolled up to their current end.
+    """
+    checkpoints = {month: _get_checkpoint(db, _activity_checkpoint_name(month)) for month in months}
+    # Checkpoints of dropped partitions.
+    db.query(RollupCheckpoint).filter(
+        RollupCheckpoint.name.like(f"{_ACTIVITY_CHECKPOINT}\\_%", escape="\\"),
+        RollupCheckpoint.name.notin_([checkpoint.name for checkpoint in checkpoints.values()])
+    ).delete(synchronize_session=False)
+    legacy = db.get(RollupCheckpoint, _ACTIVITY_CHECKPOINT)
+    if legacy is not None:
+        for month, checkpoint in checkpoints.items():
+            if legacy.last_month is None or month > legacy.last_month or checkpoint.last_id:
+                continue
+            if month == legacy.last_month:
+                checkpoint.last_id = legacy.last_id
+            else:
+                table = task_activity_table(month)
+                checkpoint.last_id = db.execute(select(func.coalesce(func.max(table.c.activity_id), 0))).scalar()
+        db.delete(legacy)
+        db.commit()
+    return checkpoints
+
+
+@job_handler("rollup_task_activity", concurrency=1, every_seconds=TASK_ROLLUP_SECONDS)
+def rollup_task_activity(job_id: int, payload: dict, db: Session):
+    """
+    Adds the task activity logged since the last run to the rollups.
+
+    Every activity partition has its own checkpoint, committed together
+    with each batch of rollups, and every partition is read from its
+    checkpoint on each run, so activity written into a past month late,
+    such as by a buffer flushed after the month turned, is still counted.
+    """
+    months = sorted(list_partition_months())
+    checkpoints = _activity_checkpoints(db, months)
+    processed = 0
+    for month in months:
+        checkpoint = checkpoints[month]
+        table = task_activity_table(month)
+        while True:
+            rows = db.execute(
+                select(table).where(table.c.activity_id > checkpoint.last_id).order_by(table.c.activity_id)
+                .limit(TASK_ROLLUP_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            _roll_up_activity(rows, db).apply(db)
+            checkpoint.last_month = month
+            checkpoint.last_id = rows[-1].activity_id
+            db.commit()
+            processed += len(rows)
+    db.commit()
+    if processed:
+        logger.info(f"Rolled up {processed} task activity entries")
+    return {"processed": processed}
+
+
+def _shard_task_ids(shard_id: int):
+    """
+    First and last task ID a shard can hold.
+    """
+    return shard_id << SHARD_ID_BITS, ((shard_id + 1) << SHARD_ID_BITS) - 1
+
+
+def _backfill_checkpoint_name(shard_id: int) -> str:
+    # Shard 0 keeps the checkpoint name from before the tasks were sharded.
+    return _BACKFILL_CHECKPOINT if shard_id == 0 else f"{_BACKFILL_CHECKPOINT}_{shard_id}"
+
+
+def _activity_log_start(db: Session, shard_id: int):
+    """
+    When the activity log starts and the ID of the first task of a shard it saw created.
+
+    Returns:
+        tuple: Start time and first logged task ID, (now, None) without a log.
+    """
+    months = sorted(list_partition_months())
+    if not months:
+        return datetime.utcnow(), None
+    first = task_activity_table(months[0])
+    started_at = db.execute(select(func.min(first.c.created_at))).scalar()
+    first_id, last_id = _shard_task_ids(shard_id)
+    for month in months:
+        table = task_activity_table(month)
+        first_task_id = db.execute(select(func.min(table.c.task_id)).where(
+            table.c.action == "created", table.c.task_id.between(first_id, last_id)
+        )).scalar()
+        if first_task_id is not None:
+            return started_at, first_task_id
+    return started_at, None
+
+
+def _backfill_shard(job_id: int, shard_id: int, batch_size: int, db: Session) -> int:
+    """
+    Rolls up the tasks of one shard created before the activity log started.
+
+    Returns:
+        int: Number of tasks rolled up.
+    """
+    checkpoint = _get_checkpoint(db, _backfill_checkpoint_name(shard_id))
+    if checkpoint.finished_at is not None:
+        return 0
+    use_shard(db, shard_id)
+    first_id, _ = _shard_task_ids(shard_id)
+    if checkpoint.cutoff_at is None:
+        # Fixed on the first run, tasks from first_task_id on are in the log.
+        checkpoint.cutoff_at, first_task_id = _activity_log_start(db, shard_id)
+        if first_task_id is None:
+            first_task_id = max(db.query(func.max(model.task_id)).scalar() or first_id for model in (Task, TaskArchive)) + 1
+        checkpoint.last_id = max(checkpoint.last_id, first_id)
+        checkpoint.end_id = first_task_id - 1
+        db.commit()
+    processed = 0
+    shard_count = len(shard_engines)
+    while checkpoint.last_id < checkpoint.end_id:
+        first, last = checkpoint.last_id + 1, min(checkpoint.last_id + batch_size, checkpoint.end_id)
+        tasks = {}
+        for model in (Task, TaskArchive):
+            tasks.update((row.task_id, row) for row in db.query(
+                model.task_id, model.project_id, model.status_id, model.created_at, model.updated_at
+            ).filter(model.task_id.between(first, last)))
+        closed = _closed_status_ids(db, [task.status_id for task in tasks.values()])
+        deltas = RollupDeltas()
+        for task in tasks.values():
+            deltas.add(task.project_id, task.created_at, created_count=1, open_delta=1)
+            if task.status_id in closed and task.updated_at is not None and task.updated_at < checkpoint.cutoff_at:
+                deltas.add_completion(task.project_id, task.updated_at, task.created_at)
+        deltas.apply(db)
+        checkpoint.last_id = last
+        db.commit()
+        processed += len(tasks)
+        done = (last - first_id) / max(checkpoint.end_id - first_id, 1)
+        report_progress(job_id, (shard_id + done) * 100 // shard_count)
+    checkpoint.finished_at = datetime.utcnow()
+    db.commit()
+    use_shard(db, None)
+    logger.info(f"Backfilled task rollups from {processed} tasks of shard {shard_id} created before {checkpoint.cutoff_at}")
+    return processed
+
+
+@job_handler("backfill_task_rollups", concurrency=1)
+def backfill_task_rollups(job_id: int, payload: dict, db: Session):
+    """
+    Rolls up the tasks created before the activity log started.
+
+    Creation is taken from created_at; tasks in a closed status count as
+    completed at updated_at if that is before the log started, later
+    changes are in the log. Every shard is visited in turn; its tasks and
+    archived tasks are read together in task_id ranges, and its checkpoint
+    is committed with every range, so the job can be stopped and run again
+    at any time.
+
+    Payload:
+        batch_size (int): Task IDs per range, defaults to TASK_ROLLUP_BATCH_SIZE.
+    """
+    batch_size = payload.get("batch_size", TASK_ROLLUP_BATCH_SIZE)
+    processed = 0
+    for shard_id in range(len(shard_engines)):
+        processed += _backfill_shard(job_id, shard_id, batch_size, db)
+    return {"processed": processed}
+
+
+def _chart_buckets(granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Granularity must be hour or day")
+    step = GRANULARITIES[granularity]
+    end = bucket_start(end or datetime.utcnow(), granularity) + step
+    start = bucket_start(start, granularity) if start else end - step * DEFAULT_CHART_BUCKETS[granularity]
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    if (end - start) / step > MAX_CHART_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_CHART_BUCKETS} buckets")
+    buckets = []
+    while start < end:
+        buckets.append(start)
+        start += step
+    return buckets
+
+
+def _read_rollups(project_id: int, granularity: str, buckets, db: Session) -> dict:
+    rows = db.execute(select(_rollups).where(
+        _rollups.c.project_id == project_id,
+        _rollups.c.granularity == granularity,
+        _rollups.c.bucket_start >= buckets[0],
+        _rollups.c.bucket_start <= buckets[-1]
+    )).all()
+    return {row.bucket_start: row for row in rows}
+
+
+def get_throughput_chart(project_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime],
+        db: Session):
+    """
+    Tasks created and completed, reopened tasks and average cycle time per
+    bucket, read from the rollups only.
+
+    Returns:
+        list: One dict per bucket from start to end, empty buckets included.
+    """
+    buckets = _chart_buckets(granularity, start, end)
+    rows = _read_rollups(project_id, granularity, buckets, db)
+    points = []
+    for moment in buckets:
+        row = rows.get(moment)
+        points.append({
+            "bucket_start": moment,
+            "created": row.created_count if row else 0,
+            "completed": row.completed_count if row else 0,
+            "reopened": row.reopened_count if row else 0,
+            "avg_cycle_time_seconds": row.cycle_time_seconds / row.cycle_time_count if row and row.cycle_time_count else None,
+        })
+    return points
+
+
+def get_burndown_chart(project_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime],
+        db: Session):
+    """
+    Number of open tasks at the end of each bucket, read from the rollups only.
+
+    The count before the first bucket is the sum of the day rollups before
+    its day plus, for hourly charts, the hour rollups of that day so far.
+
+    Returns:
+        list: One dict per bucket from start to end.
+    """
+    buckets = _chart_buckets(granularity, start, end)
+    first_day = bucket_start(buckets[0], "day")
+    open_count = db.execute(select(func.coalesce(func.sum(_rollups.c.open_delta), 0)).where(
+        _rollups.c.project_id == project_id, _rollups.c.granularity == "day", _rollups.c.bucket_start < first_day
+    )).scalar()
+    if granularity == "hour":
+        open_count += db.execute(select(func.coalesce(func.sum(_rollups.c.open_delta), 0)).where(
+            _rollups.c.project_id == project_id, _rollups.c.granularity == "hour",
+            _rollups.c.bucket_start >= first_day, _rollups.c.bucket_start < buckets[0]
+        )).scalar()
+    rows = _read_rollups(project_id, granularity, buckets, db)
+    points = []
+    for moment in buckets:
+        row = rows.get(moment)
+        if row:
+            open_count += row.open_delta
+        points.append({"bucket_start": moment, "open": open_count})
+    return points
@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database.session import current_shard, fan_out, shard_engines
+from models.task import TaskStatus
+from models.user import UserRole, UserTechnology
+
+# Bounds how long another process's catalog changes can go unnoticed.
+CATALOG_CACHE_SECONDS = float(os.getenv("CATALOG_CACHE_SECONDS", "300"))
+# Task status names kept in memory; every task gets its own status row.
+TASK_STATUS_CACHE_SIZE = int(os.getenv("TASK_STATUS_CACHE_SIZE", "10000"))
+
+_SESSION_KEY = "catalog_changes"
+
+
+class Role(NamedTuple):
+    user_role_id: int
+    role_name: str
+
+
+class Technology(NamedTuple):
+    user_technology_id: int
+    technology_name: str
+
+
+class ReferenceCatalog:
+    """
+    In-memory copy of the user roles, user technologies and task status names.
+
+    Roles and technologies are kept whole, sorted by name. Status names are
+    kept per shard in a bounded LRU cache. Changes committed through this
+    process invalidate the catalog right away; entries also expire after
+    CATALOG_CACHE_SECONDS.
+    """
+
+    def __init__(self, status_cache_size: int = TASK_STATUS_CACHE_SIZE, ttl: float = CATALOG_CACHE_SECONDS):
+        self.status_cache_size = status_cache_size
+        self.ttl = ttl
+        self._roles = None
+        self._technologies = None
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so data read before it is not cached.
+        self._generation = 0
+
+    def roles(self, db: Session) -> List[Role]:
+        """
+        Returns all user roles sorted by name.
+        """
+        with self._lock:
+            if self._roles is not None and time.monotonic() - self._roles[0] < self.ttl:
+                return self._roles[1]
+            generation = self._generation
+        roles = [Role(*row) for row in db.execute(
+            select(UserRole.user_role_id, UserRole.role_name).order_by(UserRole.role_name)
+        )]
+        with self._lock:
+            if generation == self._generation:
+                self._roles = (time.monotonic(), roles)
+        return roles
+
+    def technologies(self, db: Session) -> List[Technology]:
+        """
+        Returns all user technologies sorted by name.
+        """
+        with self._lock:
+            if self._technologies is not None and time.monotonic() - self._technologies[0] < self.ttl:
+                return self._technologies[1]
+            generation = self._generation
+        technologies = [Technology(*row) for row in db.execute(
+            select(UserTechnology.user_technology_id, UserTechnology.technology_name).order_by(UserTechnology.technology_name)
+        )]
+        with self._lock:
+            if generation == self._generation:
+                self._technologies = (time.monotonic(), technologies)
+        return technologies
+
+    def status_name(self, status_id: Optional[int], db: Session) -> Optional[str]:
+        """
+        Returns the name of a task status on the shard the session is routed to.
+        """
+        if status_id is None:
+            return None
+        key = (current_shard(db), status_id)
+        with self._lock:
+            entry = self._statuses.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._statuses.move_to_end(key)
+                return entry[1]
+            generation = self._generation
+        name = db.execute(select(TaskStatus.task_status_name).where(TaskStatus.task_status_id == status_id)).scalar()
+        with self._lock:
+            if name is not None and generation == self._generation:
+                self._put_status(key, name)
+        return name
+
+    def load(self, db: Session):
+        """
+        Reads the roles, the technologies and the newest task status names of every shard.
+        """
+        self.roles(db)
+        self.technologies(db)
+        with self._lock:
+            generation = self._generation
+        limit = self.status_cache_size // len(shard_engines)
+        rows = fan_out(lambda shard_id, session: (shard_id, session.execute(
+            select(TaskStatus.task_status_id, TaskStatus.task_status_name).order_by(TaskStatus.task_status_id.desc()).limit(limit)
+        ).all()), db=db)
+        with self._lock:
+            if generation != self._generation:
+                return
+            for shard_id, statuses in rows:
+                # Oldest first, so the newest statuses are the last to be evicted.
+                for status_id, name in reversed(statuses):
+                    self._put_status((shard_id, status_id), name)
+
+    def _put_status(self, key: tuple, name: Optional[str]):
+        self._statuses[key] = (time.monotonic(), name)
+        self._statuses.move_to_end(key)
+        while len(self._statuses) > self.status_cache_size:
+            self._statuses.popitem(last=False)
+
+    def invalidate(self, roles: bool = False, technologies: bool = False, status_ids=()):
+        with self._lock:
+            self._generation += 1
+            if roles:
+                self._roles = None
+            if technologies:
+                self._technologies = None
+            for status_id in status_ids:
+                for shard_id in range(len(shard_engines)):
+                    self._statuses.pop((shard_id, status_id), None)
+
+
+catalog = ReferenceCatalog()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_changes(session, flush_context):
+    for instances in (session.new, session.dirty, session.deleted):
+        for obj in instances:
+            if isinstance(obj, (UserRole, UserTechnology, TaskStatus)):
+                changes = session.info.setdefault(_SESSION_KEY, {"roles": False, "technologies": False, "status_ids": set()})
+                if isinstance(obj, UserRole):
+                    changes["roles"] = True
+                elif isinstance(obj, UserTechnology):
+                    changes["technologies"] = True
+                else:
+                    changes["status_ids"].add(obj.task_status_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog(session):
+    changes = session.info.pop(_SESSION_KEY, None)
+    if changes:
+        catalog.invalidate(**changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    session.info.pop(_SESSION_KEY, None)
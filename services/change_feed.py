@@ -0,0 +1,325 @@
+import os
+import json
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from database.session import fan_out, shard_engines, use_shard
+from models.change_feed import ChangeEvent
+from models.task import Task
+from models.project import UserProject
+from routers.logger import logger
+from services.job import job_handler
+
+CHANGE_FEED_COALESCE_SECONDS = float(os.getenv("CHANGE_FEED_COALESCE_SECONDS", "0.25"))
+CHANGE_FEED_MAX_BUFFER = int(os.getenv("CHANGE_FEED_MAX_BUFFER", "500"))
+# How often the change_events table is read for changes committed by other
+# processes; commits of this process are picked up right away.
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0.5"))
+# Change events older than this are deleted by the prune_change_events job.
+CHANGE_FEED_RETENTION_SECONDS = float(os.getenv("CHANGE_FEED_RETENTION_SECONDS", "3600"))
+# Change events read per shard and poll.
+CHANGE_FEED_POLL_BATCH = 1000
+
+# Columns sent along with each change, per tracked model.
+_FEED_ENTITIES = {
+    Task: ("task", "task_id", (
+        "task_name", "task_description", "status_id", "task_owner_id", "parent_task_id", "due_at", "priority", "is_overdue"
+    )),
+    UserProject: ("user_project", "user_project_id", ("user_id",)),
+}
+
+_change_events = ChangeEvent.__table__
+
+# Set on a session that wrote change events, so its commit wakes the broadcaster.
+_SESSION_KEY = "change_feed_written"
+
+
+def _merge(previous: Optional[dict], current: dict) -> Optional[dict]:
+    """
+    Folds two changes of the same row into one; None means nothing is left.
+    """
+    if previous is None:
+        return current
+    if previous["op"] == "insert" and current["op"] == "delete":
+        return None
+    if previous["op"] == "insert":
+        return dict(current, op="insert")
+    return current
+
+
+class Subscription:
+    """
+    Pending changes of one subscriber, keyed by row so bursts coalesce.
+
+    Only touched from the event loop that created it. When more than
+    max_buffer distinct rows are pending the buffer is dropped and the
+    subscriber receives a single "resync" event instead.
+    """
+
+    def __init__(self, project_id: int, loop: asyncio.AbstractEventLoop, max_buffer: int = CHANGE_FEED_MAX_BUFFER):
+        self.project_id = project_id
+        self.loop = loop
+        self.max_buffer = max_buffer
+        self.overflowed = False
+        self._pending = OrderedDict()
+        self._wakeup = asyncio.Event()
+
+    def push(self, change: dict):
+        if change["op"] == "resync":
+            self._pending.clear()
+            self.overflowed = True
+        if not self.overflowed:
+            key = (change["entity"], change["id"])
+            merged = _merge(self._pending.pop(key, None), change)
+            if merged is not None:
+                self._pending[key] = merged
+            if len(self._pending) > self.max_buffer:
+                self._pending.clear()
+                self.overflowed = True
+        self._wakeup.set()
+
+    async def next_batch(self, timeout: float, coalesce_seconds: float = CHANGE_FEED_COALESCE_SECONDS) -> Optional[List[dict]]:
+        """
+        Waits for changes and returns them after the coalescing window.
+
+        Returns:
+            list: Pending changes, or None if nothing arrived within timeout.
+        """
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        await asyncio.sleep(coalesce_seconds)
+        self._wakeup.clear()
+        if self.overflowed:
+            self.overflowed = False
+            self._pending.clear()
+            return [{"op": "resync", "project_id": self.project_id}]
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class ChangeBroadcaster:
+    """
+    Fans committed changes out to the subscribers of each project.
+
+    Changes are written to the change_events table of the project's shard in
+    the transaction that makes them, so every process sees the changes of
+    every other process, job workers included. While anyone is subscribed,
+    a thread tails the table of each shard and delivers what it reads.
+    """
+
+    def __init__(self, poll_seconds: float = CHANGE_FEED_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, project_id: int) -> Subscription:
+        subscription = Subscription(project_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[project_id].add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._tail, name="change-feed", daemon=True)
+                self._thread.start()
+        logger.info(f"Change feed subscriber added for project with ID {project_id}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.project_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.project_id]
+
+    def notify(self):
+        """
+        Reads the change events right away instead of at the next poll.
+        """
+        self._wakeup.set()
+
+    def publish(self, changes: List[dict]):
+        """
+        Delivers changes to subscribers; safe to call from any thread.
+        """
+        with self._lock:
+            targets = [
+                (change, list(self._subscriptions.get(change["project_id"], ())))
+                for change in changes
+            ]
+        for change, subscribers in targets:
+            for subscription in subscribers:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.push, change)
+                except RuntimeError:
+                    # The subscriber's loop has been closed.
+                    self.unsubscribe(subscription)
+
+    def _tail(self):
+        # Last change id read per shard; None while nobody is subscribed, so
+        # a new subscriber only gets changes committed after it subscribed.
+        positions = None
+        while True:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            with self._lock:
+                subscribed = bool(self._subscriptions)
+            if not subscribed:
+                positions = None
+                continue
+            try:
+                if positions is None:
+                    positions = fan_out(lambda shard_id, session: session.execute(
+                        select(func.coalesce(func.max(_change_events.c.change_id), 0))
+                    ).scalar())
+                    continue
+                batches = fan_out(lambda shard_id, session: session.execute(
+                    select(_change_events).where(_change_events.c.change_id > positions[shard_id])
+                    .order_by(_change_events.c.change_id).limit(CHANGE_FEED_POLL_BATCH)
+                ).all())
+            except Exception as exc:
+                logger.error(f"Reading change events failed: {exc!r}")
+                continue
+            for shard_id, rows in enumerate(batches):
+                if not rows:
+                    continue
+                positions[shard_id] = rows[-1].change_id
+                if len(rows) == CHANGE_FEED_POLL_BATCH:
+                    self._wakeup.set()
+                self.publish([_change_from_row(row) for row in rows])
+
+
+change_broadcaster = ChangeBroadcaster()
+
+
+def _feed_value(value):
+    # Changes are sent as JSON.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _describe(instance, op: str) -> Optional[List[dict]]:
+    entity = _FEED_ENTITIES.get(type(instance))
+    if entity is None:
+        return None
+    name, pk, columns = entity
+    project_id = instance.project_id
+    if op == "update":
+        # Moving a row to another project is a delete there and an insert here.
+        history = inspect(instance).attrs.project_id.history
+        if history.deleted and history.deleted[0] != project_id:
+            return [
+                {"entity": name, "op": "delete", "id": getattr(instance, pk), "project_id": history.deleted[0], "data": {}},
+                {"entity": name, "op": "insert", "id": getattr(instance, pk), "project_id": project_id,
+                 "data": {column: _feed_value(getattr(instance, column)) for column in columns}},
+            ]
+    return [{
+        "entity": name,
+        "op": op,
+        "id": getattr(instance, pk),
+        "project_id": project_id,
+        "data": {} if op == "delete" else {column: _feed_value(getattr(instance, column)) for column in columns},
+    }]
+
+
+def _change_from_row(row) -> dict:
+    if row.op == "resync":
+        return {"op": "resync", "project_id": row.project_id}
+    return {
+        "entity": row.entity,
+        "op": row.op,
+        "id": row.entity_id,
+        "project_id": row.project_id,
+        "data": json.loads(row.data or "{}"),
+    }
+
+
+def _write_changes(session: Session, changes: List[dict]):
+    session.execute(insert(_change_events), [{
+        "project_id": change["project_id"],
+        "entity": change.get("entity", "project"),
+        "op": change["op"],
+        "entity_id": change.get("id"),
+        "data": json.dumps(change.get("data") or {}),
+        "created_at": datetime.utcnow(),
+    } for change in changes])
+    session.info[_SESSION_KEY] = True
+
+
+def record_change(session: Session, model, op: str, values: dict):
+    """
+    Records a change made outside the unit of work (e.g. a Core UPDATE) in
+    the session's transaction, so it is published when the session commits.
+
+    Args:
+        model: Tracked model class the change belongs to.
+        op(str): "insert", "update" or "delete".
+        values(dict): Primary key and project_id of the changed row, and the
+            values of the changed columns; columns left out are not sent.
+    """
+    name, pk, columns = _FEED_ENTITIES[model]
+    _write_changes(session, [{
+        "entity": name,
+        "op": op,
+        "id": values[pk],
+        "project_id": values["project_id"],
+        "data": {} if op == "delete" else {column: _feed_value(values[column]) for column in columns if column in values},
+    }])
+
+
+def record_resync(session: Session, project_id: int):
+    """
+    Tells the subscribers of a project to reload it once the session commits,
+    for changes too large to send row by row, such as archiving it.
+    """
+    _write_changes(session, [{"op": "resync", "project_id": project_id}])
+
+
+@job_handler("prune_change_events", concurrency=1, every_seconds=CHANGE_FEED_RETENTION_SECONDS / 4)
+def prune_change_events(job_id: int, payload: dict, db: Session):
+    """
+    Deletes change events older than CHANGE_FEED_RETENTION_SECONDS on every shard.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=CHANGE_FEED_RETENTION_SECONDS)
+    deleted = 0
+    for shard_id in range(len(shard_engines)):
+        use_shard(db, shard_id)
+        deleted += db.execute(delete(_change_events).where(_change_events.c.created_at < cutoff)).rowcount
+        db.commit()
+    logger.info(f"Pruned {deleted} change events")
+    return {"deleted": deleted}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = []
+    for op, instances in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for instance in instances:
+            if op == "update" and not session.is_modified(instance, include_collections=False):
+                continue
+            described = _describe(instance, op)
+            if described:
+                changes.extend(described)
+    if changes:
+        _write_changes(session, changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    if session.info.pop(_SESSION_KEY, None):
+        change_broadcaster.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_SESSION_KEY, None)
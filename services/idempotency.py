@@ -0,0 +1,193 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.idempotency import IdempotencyKey
+from services.job import job_handler
+from routers.logger import logger
+
+# How long a stored response is replayed for the same key.
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+# How long an in_progress key stays claimed without being renewed; the
+# request holding it renews it every third of this, so an expired lease
+# means its process died and another request may take the key over.
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+# Completed responses kept in memory in front of the idempotency_keys table.
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+
+KEY_IN_PROGRESS = "in_progress"
+KEY_COMPLETED = "completed"
+
+
+class StoredResponse(NamedTuple):
+    """
+    Response stored for an idempotency key; status_code is None while the
+    first request with the key is still running.
+    """
+    request_hash: str
+    status_code: Optional[int]
+    headers: List[Tuple[str, str]]
+    body: bytes
+    expires_at: datetime
+
+
+class StoredResponseCache:
+    """
+    Bounded LRU cache of completed responses per key hash.
+
+    Completed responses never change, so entries only leave the cache when
+    they expire or are evicted.
+    """
+
+    def __init__(self, max_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key_hash: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._entries.get(key_hash)
+            if stored is None:
+                return None
+            if stored.expires_at <= datetime.utcnow():
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return stored
+
+    def put(self, key_hash: str, stored: StoredResponse):
+        with self._lock:
+            self._entries[key_hash] = stored
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+stored_response_cache = StoredResponseCache()
+
+
+def _stored_response(row: IdempotencyKey) -> StoredResponse:
+    if row.status != KEY_COMPLETED:
+        return StoredResponse(row.request_hash, None, [], b"", row.expires_at)
+    return StoredResponse(
+        row.request_hash, row.response_status, [tuple(header) for header in json.loads(row.response_headers)],
+        row.response_body, row.expires_at
+    )
+
+
+def _lease_expired(row: IdempotencyKey, now: datetime) -> bool:
+    return row.status == KEY_IN_PROGRESS and (row.lease_expires_at is None or row.lease_expires_at <= now)
+
+
+def claim_key(key_hash: str, request_hash: str, db: Session) -> Optional[StoredResponse]:
+    """
+    Claims an idempotency key for a new request.
+
+    An in_progress key whose lease expired is taken over, in a conditional
+    UPDATE so only one of several waiting requests gets it.
+
+    Returns:
+        None if the caller claimed the key and must run the request,
+        otherwise what is stored for the key, possibly still in progress.
+    """
+    now = datetime.utcnow()
+    row = db.get(IdempotencyKey, key_hash)
+    if row is not None and row.expires_at > now and not _lease_expired(row, now):
+        return _stored_response(row)
+    if row is not None and row.expires_at > now:
+        lease_expired_at = row.lease_expires_at
+        taken_over = db.execute(update(IdempotencyKey.__table__).where(
+            IdempotencyKey.key_hash == key_hash, IdempotencyKey.status == KEY_IN_PROGRESS,
+            or_(IdempotencyKey.lease_expires_at.is_(None), IdempotencyKey.lease_expires_at <= now)
+        ).values(
+            request_hash=request_hash, lease_expires_at=now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+        )).rowcount
+        db.commit()
+        if taken_over:
+            logger.warning(f"Took over Idempotency-Key whose request stopped renewing its lease at {lease_expired_at}")
+            return None
+        row = db.get(IdempotencyKey, key_hash)
+        return _stored_response(row) if row is not None else StoredResponse(request_hash, None, [], b"", now)
+    if row is not None:
+        db.delete(row)
+        db.flush()
+    db.add(IdempotencyKey(
+        key_hash=key_hash, request_hash=request_hash, status=KEY_IN_PROGRESS,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS),
+        lease_expires_at=now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    ))
+    try:
+        db.commit()
+        return None
+    except IntegrityError:
+        # Claimed by a concurrent request in another process.
+        db.rollback()
+        row = db.get(IdempotencyKey, key_hash)
+        return _stored_response(row) if row is not None else StoredResponse(request_hash, None, [], b"", now)
+
+
+def get_key(key_hash: str, db: Session) -> Optional[StoredResponse]:
+    """
+    Returns what is stored for an idempotency key, or None if it is unknown
+    or expired, or its request stopped renewing its lease.
+    """
+    now = datetime.utcnow()
+    row = db.get(IdempotencyKey, key_hash)
+    if row is None or row.expires_at <= now or _lease_expired(row, now):
+        return None
+    return _stored_response(row)
+
+
+def renew_key(key_hash: str, db: Session):
+    """
+    Extends the lease of a claimed key while its request is still running.
+    """
+    db.execute(update(IdempotencyKey.__table__).where(
+        IdempotencyKey.key_hash == key_hash, IdempotencyKey.status == KEY_IN_PROGRESS
+    ).values(lease_expires_at=datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)))
+    db.commit()
+
+
+def complete_key(key_hash: str, status_code: int, headers: List[Tuple[str, str]], body: bytes, db: Session) -> Optional[StoredResponse]:
+    """
+    Stores the response of a claimed key and caches it.
+    """
+    row = db.get(IdempotencyKey, key_hash)
+    if row is None:
+        return None
+    row.status = KEY_COMPLETED
+    row.response_status = status_code
+    row.response_headers = json.dumps(headers)
+    row.response_body = body
+    row.lease_expires_at = None
+    stored = StoredResponse(row.request_hash, status_code, headers, body, row.expires_at)
+    db.commit()
+    stored_response_cache.put(key_hash, stored)
+    return stored
+
+
+def release_key(key_hash: str, db: Session):
+    """
+    Forgets a claimed key whose request failed, so it can be retried.
+    """
+    db.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.key_hash == key_hash, IdempotencyKey.status == KEY_IN_PROGRESS
+    ))
+    db.commit()
+
+
+@job_handler("purge_idempotency_keys", concurrency=1, every_seconds=3600)
+def purge_idempotency_keys(job_id: int, payload: dict, db: Session):
+    """
+    Deletes expired idempotency keys.
+    """
+    deleted = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())).rowcount
+    db.commit()
+    return {"deleted": deleted}
@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import random
+import socket
+import importlib
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+
+from database.session import SessionLocal, shard_engines
+from models.job import Job
+from routers.logger import logger
+
+# "inprocess" starts a runner thread inside the web app, "external" expects
+# `python -m services.job` to be running next to it, "off" disables both.
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inprocess")
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+# The runner refreshes updated_at of its running jobs this often, so a long
+# handler that never reports progress is not mistaken for a stale one.
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_STALE_SECONDS / 4)))
+JOB_SCHEDULE_CHECK_SECONDS = float(os.getenv("JOB_SCHEDULE_CHECK_SECONDS", "30"))
+
+# Modules that register job handlers; imported by the runner so that a
+# separate worker process knows about every job type.
+JOB_HANDLER_MODULES = [
+    "services.job", "services.task", "services.project", "services.task_stats", "services.task_activity",
+    "services.analytics", "services.idempotency", "services.change_feed",
+]
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobHandler(NamedTuple):
+    func: Callable
+    concurrency: int
+    max_attempts: int
+    every_seconds: Optional[float]
+
+
+_job_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str, concurrency: int = 1, max_attempts: int = 3, every_seconds: Optional[float] = None):
+    """
+    Registers a function as the handler for a job type.
+
+    The handler is called as ``func(job_id, payload, db)`` inside a worker
+    process and may return a JSON serializable result. With every_seconds
+    the runner also enqueues the job periodically with an empty payload.
+    """
+    def decorator(func):
+        _job_handlers[job_type] = JobHandler(func, concurrency, max_attempts, every_seconds)
+        return func
+    return decorator
+
+
+def load_job_handlers():
+    """
+    Imports every module listed in JOB_HANDLER_MODULES.
+    """
+    for module in JOB_HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def enqueue_job(job_type: str, payload: dict, db: Session, max_attempts: Optional[int] = None):
+    """
+    Stores a new queued job for the given job type.
+
+    Raises:
+        HTTPException: If no handler is registered for the job type.
+    """
+    handler = _job_handlers.get(job_type)
+    if handler is None:
+        logger.error(f"Unknown job type {job_type}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown job type")
+    job = Job(
+        job_type=job_type,
+        payload=json.dumps(payload or {}),
+        status=JOB_QUEUED,
+        max_attempts=max_attempts or handler.max_attempts,
+        run_after=datetime.utcnow()
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info(f"Job {job.job_id} of type {job_type} queued")
+    return job
+
+
+def get_job(job_id: int, db: Session):
+    """
+    Retrieves the job with the given ID.
+
+    Raises:
+        HTTPException: If the job does not exist.
+    """
+    job = db.query(Job).filter(Job.job_id == job_id).first()
+    if not job:
+        logger.error(f"Job with ID {job_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+def report_progress(job_id: int, progress: int):
+    """
+    Records the progress (0-100) of a running job.
+
+    Uses its own session so that progress is visible before the handler
+    commits its own work. Also acts as the heartbeat for stale job detection.
+    """
+    with SessionLocal() as db:
+        db.query(Job).filter(Job.job_id == job_id, Job.status == JOB_RUNNING).update(
+            {Job.progress: max(0, min(100, int(progress))), Job.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.commit()
+
+
+def _init_worker_process():
+    # Connections inherited from the parent must not be shared with it.
+    for shard_engine in shard_engines:
+        shard_engine.dispose(close=False)
+
+
+def _execute_job(func: Callable, job_id: int, payload: dict):
+    db = SessionLocal()
+    try:
+        return func(job_id, payload, db)
+    finally:
+        db.close()
+
+
+def _retry_delay(attempts: int) -> float:
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobRunner:
+    """
+    Polls the jobs table and executes claimed jobs in a process pool.
+
+    Concurrency limits are applied per job type within a runner; several
+    runners may share one database since claiming is a conditional UPDATE.
+    """
+
+    def __init__(self, processes: int = JOB_WORKER_PROCESSES, poll_interval: float = JOB_POLL_INTERVAL):
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = Counter()
+        # job_id -> attempt number of the jobs this runner has in flight.
+        self._in_flight: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        """
+        Runs the poll loop in a daemon thread of the current process.
+        """
+        self._thread = threading.Thread(target=self.run_forever, name="job-runner", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+
+    def run_forever(self):
+        load_job_handlers()
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker_process)
+        logger.info(f"Job runner {self.worker_id} started with {self.processes} processes")
+        last_stale_check = 0.0
+        last_schedule_check = 0.0
+        last_heartbeat = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() - last_heartbeat > JOB_HEARTBEAT_SECONDS:
+                    self.heartbeat()
+                    last_heartbeat = time.monotonic()
+                if time.monotonic() - last_stale_check > JOB_STALE_SECONDS / 4:
+                    self.requeue_stale_jobs()
+                    last_stale_check = time.monotonic()
+                if time.monotonic() - last_schedule_check > JOB_SCHEDULE_CHECK_SECONDS:
+                    self.enqueue_periodic_jobs()
+                    last_schedule_check = time.monotonic()
+                claimed = self.run_once()
+                if not claimed:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self._executor.shutdown(wait=True)
+            logger.info(f"Job runner {self.worker_id} stopped")
+
+    def run_once(self) -> int:
+        """
+        Claims as many due jobs as the free slots allow and submits them.
+
+        Returns:
+            int: Number of jobs submitted.
+        """
+        with self._lock:
+            free = self.processes - sum(self._running.values())
+            limits = {
+                job_type: handler.concurrency - self._running[job_type]
+                for job_type, handler in _job_handlers.items()
+            }
+        if free <= 0:
+            return 0
+        submitted = 0
+        with SessionLocal() as db:
+            for job_type, limit in limits.items():
+                limit = min(limit, free - submitted)
+                if limit <= 0:
+                    continue
+                for job in self._claim(db, job_type, limit):
+                    self._submit(job)
+                    submitted += 1
+        return submitted
+
+    def _claim(self, db: Session, job_type: str, limit: int):
+        now = datetime.utcnow()
+        candidate_ids = [job_id for job_id, in db.query(Job.job_id).filter(
+            Job.job_type == job_type,
+            Job.status == JOB_QUEUED,
+            Job.run_after <= now
+        ).order_by(Job.run_after, Job.job_id).limit(limit).all()]
+        claimed = []
+        for job_id in candidate_ids:
+            rowcount = db.query(Job).filter(Job.job_id == job_id, Job.status == JOB_QUEUED).update({
+                Job.status: JOB_RUNNING,
+                Job.locked_by: self.worker_id,
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now,
+                Job.updated_at: now
+            }, synchronize_session=False)
+            db.commit()
+            if rowcount == 1:
+                claimed.append(db.query(Job).filter(Job.job_id == job_id).first())
+        return claimed
+
+    def _submit(self, job: Job):
+        handler = _job_handlers[job.job_type]
+        with self._lock:
+            self._running[job.job_type] += 1
+            self._in_flight[job.job_id] = job.attempts
+        logger.info(f"Running job {job.job_id} of type {job.job_type} (attempt {job.attempts})")
+        future = self._executor.submit(_execute_job, handler.func, job.job_id, json.loads(job.payload or "{}"))
+        future.add_done_callback(
+            lambda done, job_id=job.job_id, job_type=job.job_type, attempts=job.attempts, max_attempts=job.max_attempts:
+            self._finish(done, job_id, job_type, attempts, max_attempts)
+        )
+
+    def _finish(self, future, job_id: int, job_type: str, attempts: int, max_attempts: int):
+        with self._lock:
+            self._running[job_type] -= 1
+            self._in_flight.pop(job_id, None)
+        now = datetime.utcnow()
+        try:
+            values = {
+                Job.status: JOB_SUCCEEDED,
+                Job.progress: 100,
+                Job.result: json.dumps(future.result()),
+                Job.finished_at: now
+            }
+            logger.info(f"Job {job_id} succeeded")
+        except Exception as exc:
+            if attempts < max_attempts:
+                delay = _retry_delay(attempts)
+                values = {Job.status: JOB_QUEUED, Job.run_after: now + timedelta(seconds=delay)}
+                logger.warning(f"Job {job_id} failed ({exc!r}), retrying in {delay:.0f}s")
+            else:
+                values = {Job.status: JOB_FAILED, Job.finished_at: now}
+                logger.error(f"Job {job_id} failed after {attempts} attempts: {exc!r}")
+            values[Job.last_error] = repr(exc)
+        values[Job.locked_by] = None
+        values[Job.updated_at] = now
+        with SessionLocal() as db:
+            # Only the run that still owns the claim may record its outcome.
+            rowcount = db.query(Job).filter(
+                Job.job_id == job_id,
+                Job.status == JOB_RUNNING,
+                Job.locked_by == self.worker_id,
+                Job.attempts == attempts
+            ).update(values, synchronize_session=False)
+            db.commit()
+        if rowcount == 0:
+            logger.warning(f"Discarded the outcome of job {job_id} attempt {attempts}, its claim was taken over")
+
+    def heartbeat(self):
+        """
+        Refreshes updated_at of the jobs this runner is still executing.
+        """
+        with self._lock:
+            in_flight = dict(self._in_flight)
+        if not in_flight:
+            return
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            for job_id, attempts in in_flight.items():
+                db.query(Job).filter(
+                    Job.job_id == job_id,
+                    Job.status == JOB_RUNNING,
+                    Job.locked_by == self.worker_id,
+                    Job.attempts == attempts
+                ).update({Job.updated_at: now}, synchronize_session=False)
+            db.commit()
+
+    def enqueue_periodic_jobs(self):
+        """
+        Enqueues periodic job types whose last run is older than their interval.
+        """
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            for job_type, handler in _job_handlers.items():
+                if handler.every_seconds is None:
+                    continue
+                pending = db.query(Job.job_id).filter(
+                    Job.job_type == job_type, Job.status.in_([JOB_QUEUED, JOB_RUNNING])
+                ).first()
+                if pending:
+                    continue
+                last_created_at = db.query(func.max(Job.created_at)).filter(Job.job_type == job_type).scalar()
+                if last_created_at is None or last_created_at <= now - timedelta(seconds=handler.every_seconds):
+                    enqueue_job(job_type, {}, db)
+
+    def requeue_stale_jobs(self):
+        """
+        Puts back jobs whose runner stopped sending heartbeats.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        with SessionLocal() as db:
+            count = db.query(Job).filter(Job.status == JOB_RUNNING, Job.updated_at < cutoff).update(
+                {Job.status: JOB_QUEUED, Job.locked_by: None, Job.run_after: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        if count:
+            logger.warning(f"Requeued {count} stale jobs")
+
+
+_runner: Optional[JobRunner] = None
+
+
+def start_job_runner():
+    """
+    Starts the in-process job runner when JOB_WORKER_MODE is "inprocess".
+    """
+    global _runner
+    if JOB_WORKER_MODE != "inprocess" or _runner is not None:
+        return _runner
+    _runner = JobRunner().start()
+    return _runner
+
+
+def stop_job_runner():
+    global _runner
+    if _runner is not None:
+        _runner.stop()
+        _runner = None
+
+
+@job_handler("reindex", concurrency=1, max_attempts=2)
+def reindex_database(job_id: int, payload: dict, db: Session):
+    """
+    Rebuilds indexes and refreshes planner statistics.
+
+    Payload:
+        tables (list[str]): Optional tables to reindex, defaults to all.
+    """
+    tables = payload.get("tables") or []
+    unknown = set(tables) - set(inspect(db.get_bind()).get_table_names())
+    if unknown:
+        raise ValueError(f"Unknown tables: {sorted(unknown)}")
+    statements = [f'REINDEX "{table}"' for table in tables] or ["REINDEX"]
+    statements.append("ANALYZE")
+    for index, statement in enumerate(statements, start=1):
+        db.execute(text(statement))
+        report_progress(job_id, index * 100 // len(statements))
+    db.commit()
+    return {"statements": len(statements)}
+
+
+if __name__ == "__main__":
+    # Use the importable module so handlers registered by JOB_HANDLER_MODULES
+    # land in the same registry the runner reads from.
+    runner = importlib.import_module("services.job").JobRunner()
+    try:
+        runner.run_forever()
+    except KeyboardInterrupt:
+        runner.stop(wait=False)
@@ -0,0 +1,305 @@
+import os
+import heapq
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database.session import current_shard, fan_out, group_by_shard
+from models.label import Label, TaskLabel
+from models.task import Task, TaskArchive
+from schemas.label import LabelExpression, TaskLabelFilter
+from services.task import TASK_COLUMNS
+from services.task_activity import record_activity
+from routers.logger import logger
+
+# Bytes of task id postings kept in memory, 8 bytes per labelled task.
+LABEL_POSTINGS_CACHE_BYTES = int(os.getenv("LABEL_POSTINGS_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Task ids looked up per query while filling a page of filtered tasks.
+LABEL_FILTER_CHUNK_SIZE = 500
+
+_labels = Label.__table__
+_task_labels = TaskLabel.__table__
+_tasks = Task.__table__
+
+
+def to_postings(task_ids: Iterable[int]) -> array:
+    """
+    Packs ascending task ids into a compact array, 8 bytes per id.
+
+    Unlike a bitmap its size follows the number of tasks with the label,
+    not the largest task id, which starts at n << SHARD_ID_BITS on shard n.
+    """
+    return array("q", task_ids)
+
+
+def postings_size(postings: array) -> int:
+    """
+    Returns the number of bytes held by a postings array.
+    """
+    return postings.itemsize * len(postings)
+
+
+class LabelPostingCache:
+    """
+    LRU cache of the sorted task id postings of each label, bounded by bytes.
+
+    Postings are kept per shard, as task_labels lives on the shard of its
+    tasks while labels and their versions live on the catalog. Entries are tagged with the postings_version of the label they were
+    read at; callers pass the current versions, so changes committed by any
+    process are picked up on the next lookup. Postings larger than the
+    whole cache are read every time instead of being cached.
+    """
+
+    def __init__(self, max_bytes: int = LABEL_POSTINGS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, label_versions: Dict[int, int]) -> Dict[int, array]:
+        """
+        Returns the postings of the given labels on the shard the session is
+        routed to, reading stale or missing ones.
+
+        Args:
+            label_versions(dict): Current postings_version per label_id.
+        """
+        shard_id = current_shard(db)
+        postings = {}
+        missing = []
+        with self._lock:
+            for label_id, version in label_versions.items():
+                entry = self._entries.get((shard_id, label_id))
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end((shard_id, label_id))
+                    postings[label_id] = entry[1]
+                else:
+                    missing.append(label_id)
+        for label_id in missing:
+            # Served by the (label_id, task_id) primary key, already in order.
+            postings[label_id] = to_postings(db.execute(
+                select(_task_labels.c.task_id).where(_task_labels.c.label_id == label_id)
+            ).scalars())
+            self._put((shard_id, label_id), label_versions[label_id], postings[label_id])
+        return postings
+
+    def _put(self, key, version: int, postings: array):
+        size = postings_size(postings)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= postings_size(previous[1])
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (version, postings)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= postings_size(evicted)
+
+
+posting_cache = LabelPostingCache()
+
+
+def _bump_postings_version(db: Session, label_ids):
+    db.execute(_labels.update().where(_labels.c.label_id.in_(label_ids)).values(
+        postings_version=_labels.c.postings_version + 1
+    ))
+
+
+@event.listens_for(Session, "after_flush")
+def _drop_deleted_task_labels(session, flush_context):
+    task_ids = [obj.task_id for obj in session.deleted if isinstance(obj, Task)]
+    if not task_ids:
+        return
+    # Labels live on the catalog and task labels on the shard of the tasks.
+    task_label_connection = session.connection(bind_arguments={"mapper": TaskLabel})
+    label_ids = task_label_connection.execute(
+        select(_task_labels.c.label_id).where(_task_labels.c.task_id.in_(task_ids)).distinct()
+    ).scalars().all()
+    if not label_ids:
+        return
+    session.connection(bind_arguments={"mapper": Label}).execute(
+        _labels.update().where(_labels.c.label_id.in_(label_ids)).values(postings_version=_labels.c.postings_version + 1)
+    )
+    task_label_connection.execute(_task_labels.delete().where(_task_labels.c.task_id.in_(task_ids)))
+
+
+def create_label(label_name: str, db: Session):
+    """
+    Creates a new label.
+
+    Raises:
+        HTTPException: If a label with the same name exists.
+    """
+    if db.query(Label.label_id).filter(Label.label_name == label_name).scalar() is not None:
+        logger.error(f"Label {label_name} already exists")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Label already exists")
+    label = Label(label_name=label_name)
+    db.add(label)
+    db.commit()
+    db.refresh(label)
+    logger.info(f"Label {label_name} created with ID {label.label_id}")
+    return label
+
+
+def _get_labelled_task(task_id: int, db: Session):
+    task = db.query(Task.task_id, Task.project_id).filter(Task.task_id == task_id).first()
+    if task is None:
+        if db.query(TaskArchive.task_id).filter(TaskArchive.task_id == task_id).scalar() is not None:
+            logger.error(f"Task with ID {task_id} is archived")
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task is archived")
+        logger.error(f"Task with ID {task_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return task
+
+
+def get_task_labels(task_id: int, db: Session) -> List[Label]:
+    """
+    Retrieves the labels of a task, ordered by name.
+
+    The label ids are read from the task's shard and the labels from the
+    catalog, which only share a database on shard 0.
+    """
+    label_ids = db.execute(select(_task_labels.c.label_id).where(_task_labels.c.task_id == task_id)).scalars().all()
+    if not label_ids:
+        return []
+    return db.query(Label).filter(Label.label_id.in_(label_ids)).order_by(Label.label_name).all()
+
+
+def add_task_labels(task_id: int, label_names: List[str], db: Session) -> List[Label]:
+    """
+    Puts labels on a task, creating labels that do not exist yet.
+
+    Returns:
+        list: All labels of the task.
+
+    Raises:
+        HTTPException: If the task does not exist or is archived.
+    """
+    task = _get_labelled_task(task_id, db)
+    label_names = sorted(set(label_names))
+    labels = {label.label_name: label for label in db.query(Label).filter(Label.label_name.in_(label_names))}
+    for label_name in label_names:
+        if label_name not in labels:
+            labels[label_name] = Label(label_name=label_name)
+            db.add(labels[label_name])
+    db.flush()
+    current = set(db.execute(select(_task_labels.c.label_id).where(_task_labels.c.task_id == task_id)).scalars())
+    added = [label for label in labels.values() if label.label_id not in current]
+    if added:
+        db.execute(_task_labels.insert(), [{"label_id": label.label_id, "task_id": task_id} for label in added])
+        _bump_postings_version(db, [label.label_id for label in added])
+        record_activity(db, task_id, task.project_id, "updated", {
+            "labels": {"added": [label.label_name for label in added]}
+        })
+    db.commit()
+    logger.info(f"Added {len(added)} labels to task with ID {task_id}")
+    return get_task_labels(task_id, db)
+
+
+def remove_task_label(task_id: int, label_name: str, db: Session):
+    """
+    Takes a label off a task.
+
+    Raises:
+        HTTPException: If the task does not exist or does not have the label.
+    """
+    task = _get_labelled_task(task_id, db)
+    label_id = db.query(Label.label_id).filter(Label.label_name == label_name).scalar()
+    deleted = 0
+    if label_id is not None:
+        deleted = db.execute(_task_labels.delete().where(
+            _task_labels.c.label_id == label_id, _task_labels.c.task_id == task_id
+        )).rowcount
+    if not deleted:
+        db.rollback()
+        logger.error(f"Task with ID {task_id} has no label {label_name}")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Label not found on task")
+    _bump_postings_version(db, [label_id])
+    record_activity(db, task_id, task.project_id, "updated", {"labels": {"removed": [label_name]}})
+    db.commit()
+    logger.info(f"Removed label {label_name} from task with ID {task_id}")
+
+
+def _expression_label_names(expression: LabelExpression) -> set:
+    names = set()
+    for item in (expression.all or []) + (expression.any or []):
+        names |= {item} if isinstance(item, str) else _expression_label_names(item)
+    return names
+
+
+def _evaluate(expression: LabelExpression, postings: Dict[str, array]) -> set:
+    def value(item):
+        return postings.get(item, ()) if isinstance(item, str) else _evaluate(item, postings)
+
+    # Intersections start from the smallest operand, so their cost follows it.
+    operands = sorted((value(item) for item in expression.all or []), key=len)
+    result = set(operands[0]).intersection(*operands[1:]) if operands else None
+    if expression.any:
+        matches_any = set().union(*(value(item) for item in expression.any))
+        result = matches_any if result is None else result & matches_any
+    return result or set()
+
+
+def filter_tasks_by_labels(task_filter: TaskLabelFilter, db: Session):
+    """
+    Retrieves one page of the tasks matching a label expression and the
+    optional project and status filters, ordered by task ID.
+
+    The label expression is evaluated on cached task id postings, one per
+    label, instead of joining task_labels once per label; only the matching
+    task ids are then looked up, in chunks, with the other filters. The
+    shards holding the requested projects, or every shard without a project
+    filter, are read in parallel and their pages merged.
+
+    Returns:
+        dict: items and next_after_task_id (None on the last page).
+
+    Raises:
+        HTTPException: If the expression does not name any label.
+    """
+    label_names = _expression_label_names(task_filter.labels)
+    if not label_names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Label expression is empty")
+    labels = db.execute(
+        select(_labels.c.label_id, _labels.c.label_name, _labels.c.postings_version).where(
+            _labels.c.label_name.in_(label_names)
+        )
+    ).all()
+    label_versions = {label.label_id: label.postings_version for label in labels}
+    after_task_id = task_filter.after_task_id or 0
+    shard_project_ids = None
+    if task_filter.project_ids is not None:
+        shard_project_ids = group_by_shard(task_filter.project_ids)
+
+    def read_shard(shard_id, session):
+        postings = posting_cache.get(session, label_versions)
+        matching = _evaluate(task_filter.labels, {label.label_name: postings[label.label_id] for label in labels})
+        query = select(*TASK_COLUMNS)
+        if shard_project_ids is not None:
+            query = query.where(_tasks.c.project_id.in_(shard_project_ids[shard_id]))
+        if task_filter.status_ids:
+            query = query.where(_tasks.c.status_id.in_(task_filter.status_ids))
+        task_ids = iter(sorted(task_id for task_id in matching if task_id > after_task_id))
+        items = []
+        while len(items) < task_filter.limit:
+            chunk = list(islice(task_ids, LABEL_FILTER_CHUNK_SIZE))
+            if not chunk:
+                break
+            items += session.execute(
+                query.where(_tasks.c.task_id.in_(chunk)).order_by(_tasks.c.task_id).limit(task_filter.limit - len(items))
+            ).all()
+        return items
+
+    shard_ids = sorted(shard_project_ids) if shard_project_ids is not None else None
+    pages = fan_out(read_shard, shard_ids, db=db) if shard_ids != [] else []
+    items = list(islice(heapq.merge(*pages, key=lambda row: row.task_id), task_filter.limit))
+    next_after_task_id = items[-1].task_id if len(items) == task_filter.limit else None
+    return {"items": items, "next_after_task_id": next_after_task_id}
@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import FrozenSet, Iterable, List, Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, inspect, select, union
+from sqlalchemy.orm import Session
+
+from database.session import fan_out, get_db
+from models.project import UserProject, UserProjectArchive
+from models.task import Task, TaskArchive
+from routers.auth import get_scope_user
+from routers.logger import logger
+
+PROJECT_MEMBERSHIP_CACHE_SIZE = int(os.getenv("PROJECT_MEMBERSHIP_CACHE_SIZE", "10000"))
+# Bounds how long another process's membership changes can go unnoticed.
+PROJECT_MEMBERSHIP_CACHE_SECONDS = float(os.getenv("PROJECT_MEMBERSHIP_CACHE_SECONDS", "60"))
+
+_SESSION_KEY = "membership_changed_user_ids"
+# Set when a bulk delete removed memberships of unknown users.
+_SESSION_CLEAR_KEY = "membership_bulk_deleted"
+
+
+class MembershipCache:
+    """
+    Bounded LRU cache of the project IDs each user belongs to.
+
+    Memberships of archived projects count, so their members keep read
+    access. Changes committed through this process invalidate the affected
+    users right away; entries also expire after PROJECT_MEMBERSHIP_CACHE_SECONDS.
+    """
+
+    def __init__(self, max_size: int = PROJECT_MEMBERSHIP_CACHE_SIZE, ttl: float = PROJECT_MEMBERSHIP_CACHE_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a set read before it is not cached.
+        self._generation = 0
+
+    def get_project_ids(self, user_id: int, db: Session) -> FrozenSet[int]:
+        """
+        Returns the project IDs of a user, reading them from every shard on a cache miss.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+        project_ids = frozenset(chain.from_iterable(fan_out(
+            lambda shard_id, session: session.execute(union(
+                select(UserProject.project_id).where(UserProject.user_id == user_id),
+                select(UserProjectArchive.project_id).where(UserProjectArchive.user_id == user_id)
+            )).scalars().all(),
+            db=db
+        )))
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (time.monotonic(), project_ids)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return project_ids
+
+    def invalidate(self, user_ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+membership_cache = MembershipCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_membership_changes(session, flush_context):
+    for instances in (session.new, session.dirty, session.deleted):
+        for obj in instances:
+            if isinstance(obj, UserProject):
+                user_ids = session.info.setdefault(_SESSION_KEY, set())
+                user_ids.add(obj.user_id)
+                user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+
+
+@event.listens_for(Session, "after_bulk_delete")
+def _collect_bulk_membership_deletes(delete_context):
+    if delete_context.mapper.class_ is UserProject:
+        delete_context.session.info[_SESSION_CLEAR_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_memberships(session):
+    user_ids = session.info.pop(_SESSION_KEY, None)
+    if session.info.pop(_SESSION_CLEAR_KEY, False):
+        membership_cache.clear()
+    elif user_ids:
+        membership_cache.invalidate(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_membership_changes(session):
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_SESSION_CLEAR_KEY, None)
+
+
+def is_admin(current_user) -> bool:
+    _, scopes = current_user
+    return "admin" in scopes
+
+
+def ensure_project_member(current_user, project_id: int, db: Session):
+    """
+    Checks that the caller belongs to a project; admins belong to every project.
+
+    Raises:
+        HTTPException: If the caller is not a member of the project.
+    """
+    if is_admin(current_user):
+        return
+    user, _ = current_user
+    if project_id not in membership_cache.get_project_ids(user.id, db):
+        logger.warning(f"User with ID {user.id} is not a member of project with ID {project_id}")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this project")
+
+
+def require_project_member(project_id: int, current_user=Depends(get_scope_user), db: Session = Depends(get_db)):
+    """
+    Dependency for routes with a project_id path parameter that only
+    members of the project (or admins) may use.
+
+    Returns:
+        tuple: The (user, scopes) of get_scope_user.
+    """
+    ensure_project_member(current_user, project_id, db)
+    return current_user
+
+
+def require_task_member(task_id: int, current_user=Depends(get_scope_user), db: Session = Depends(get_db)):
+    """
+    Dependency for routes with a task_id path parameter that only members
+    of the task's project (or admins) may use. Archived tasks count under
+    their project; a task that does not exist is left to the route.
+
+    Returns:
+        tuple: The (user, scopes) of get_scope_user.
+    """
+    if is_admin(current_user):
+        return current_user
+    for model in (Task, TaskArchive):
+        project_id = db.query(model.project_id).filter(model.task_id == task_id).first()
+        if project_id is not None:
+            ensure_project_member(current_user, project_id[0], db)
+            break
+    return current_user
+
+
+def restrict_project_ids(current_user, project_ids: Optional[List[int]], db: Session) -> Optional[List[int]]:
+    """
+    Limits a project filter to the projects of the caller.
+
+    Returns:
+        list: The requested project IDs, or all projects of the caller when
+        none were requested. None for admins without a project filter.
+
+    Raises:
+        HTTPException: If a requested project is not one of the caller's.
+    """
+    if is_admin(current_user):
+        return project_ids
+    user, _ = current_user
+    member_of = membership_cache.get_project_ids(user.id, db)
+    if project_ids is None:
+        return sorted(member_of)
+    for project_id in project_ids:
+        ensure_project_member(current_user, project_id, db)
+    return project_ids
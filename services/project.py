@@ -0,0 +1,172 @@
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database.session import choose_project_shard, shard_for_id, use_shard
+from models.project import Project, UserProject, UserProjectArchive
+from models.task import Task, TaskArchive
+from models.user import User
+from services.change_feed import record_resync
+from services.job import job_handler, report_progress
+from routers.logger import logger
+
+ARCHIVE_BATCH_SIZE = 1000
+
+# (hot table, archive table, primary key column name)
+_ARCHIVED_TABLES = (
+    (Task.__table__, TaskArchive.__table__, "task_id"),
+    (UserProject.__table__, UserProjectArchive.__table__, "user_project_id"),
+)
+
+
+def get_project(project_id: int, db: Session):
+    """
+    Retrieves the project with the given ID.
+
+    Raises:
+        HTTPException: If the project does not exist.
+    """
+    project = db.query(Project).filter(Project.project_id == project_id).first()
+    if not project:
+        logger.error(f"Project with ID {project_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
+
+
+def ensure_project_not_archived(project: Project):
+    """
+    Rejects writes to archived projects.
+
+    Raises:
+        HTTPException: If the project is archived.
+    """
+    if project.archived_at is not None:
+        logger.error(f"Project with ID {project.project_id} is archived")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Project is archived")
+
+
+def create_new_project(project_name: str, project_description: str, created_by_id: int, db: Session) -> Project:
+    """
+    Creates a new project on the next shard, with its creator as the first member.
+    """
+    use_shard(db, choose_project_shard())
+    new_project = Project(project_name=project_name, project_description=project_description, created_by_id=created_by_id)
+    db.add(new_project)
+    db.flush()
+    db.add(UserProject(user_id=created_by_id, project_id=new_project.project_id, joined_at=datetime.utcnow()))
+    db.commit()
+    db.refresh(new_project)
+    logger.info(f"New project created with ID {new_project.project_id}")
+    return new_project
+
+
+def add_user_to_project(user_id: int, project_id: int, db: Session) -> UserProject:
+    """
+    Makes a user a member of a project.
+
+    Raises:
+        HTTPException: If the user or project does not exist, or the project is archived.
+    """
+    use_shard(db, shard_for_id(project_id))
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        logger.error(f"User with ID {user_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    ensure_project_not_archived(get_project(project_id, db))
+    user_project = UserProject(user_id=user_id, project_id=project_id, joined_at=datetime.utcnow())
+    db.add(user_project)
+    db.commit()
+    db.refresh(user_project)
+    logger.info(f"User with ID {user_id} added to project with ID {project_id}")
+    return user_project
+
+
+def _move_rows(db: Session, source, target, key: str, project_id: int):
+    """
+    Moves the rows of a project from source to target in primary key ordered batches.
+
+    Each batch is copied and deleted in its own transaction so locks are
+    held briefly and an interrupted move can simply be run again.
+
+    Yields:
+        int: Number of rows moved so far, after every batch.
+    """
+    columns = [column.name for column in target.columns if column.name in source.columns]
+    selected = [source.c[name] for name in columns]
+    if "archived_at" in target.columns and "archived_at" not in source.columns:
+        columns.append("archived_at")
+        selected.append(literal(datetime.utcnow()))
+    moved = 0
+    while True:
+        batch = [row[0] for row in db.execute(
+            select(source.c[key]).where(source.c.project_id == project_id).order_by(source.c[key]).limit(ARCHIVE_BATCH_SIZE)
+        )]
+        if not batch:
+            break
+        db.execute(insert(target).from_select(columns, select(*selected).where(source.c[key].in_(batch))))
+        db.execute(delete(source).where(source.c[key].in_(batch)))
+        db.commit()
+        moved += len(batch)
+        yield moved
+
+
+def _move_project(job_id: int, project_id: int, db: Session, restore: bool):
+    tables = [(target, source, key) if restore else (source, target, key) for source, target, key in _ARCHIVED_TABLES]
+    total = sum(
+        db.execute(select(func.count()).select_from(source).where(source.c.project_id == project_id)).scalar()
+        for source, _, _ in tables
+    ) or 1
+    counts = {}
+    done = 0
+    for source, target, key in tables:
+        counts[source.name] = 0
+        for moved in _move_rows(db, source, target, key, project_id):
+            report_progress(job_id, (done + moved) * 100 // total)
+            counts[source.name] = moved
+        done += counts[source.name]
+    return counts
+
+
+@job_handler("archive_project", concurrency=1)
+def archive_project(job_id: int, payload: dict, db: Session):
+    """
+    Moves the tasks and memberships of a project into the archive tables.
+
+    The project is flagged as archived first so no new rows are added while
+    batches are being moved.
+
+    Payload:
+        project_id (int): ID of the project to archive.
+    """
+    project_id = payload["project_id"]
+    use_shard(db, shard_for_id(project_id))
+    db.query(Project).filter(Project.project_id == project_id).update(
+        {Project.archived_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    counts = _move_project(job_id, project_id, db, restore=False)
+    record_resync(db, project_id)
+    db.commit()
+    logger.info(f"Project with ID {project_id} archived: {counts}")
+    return counts
+
+
+@job_handler("restore_project", concurrency=1)
+def restore_project(job_id: int, payload: dict, db: Session):
+    """
+    Moves the tasks and memberships of an archived project back.
+
+    Payload:
+        project_id (int): ID of the project to restore.
+    """
+    project_id = payload["project_id"]
+    use_shard(db, shard_for_id(project_id))
+    counts = _move_project(job_id, project_id, db, restore=True)
+    db.query(Project).filter(Project.project_id == project_id).update(
+        {Project.archived_at: None}, synchronize_session=False
+    )
+    record_resync(db, project_id)
+    db.commit()
+    logger.info(f"Project with ID {project_id} restored: {counts}")
+    return counts
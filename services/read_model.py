@@ -0,0 +1,214 @@
+import os
+import heapq
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from database.session import SessionLocal, fan_out, group_by_shard
+from models.project import Project
+from models.task import Task, TaskArchive, TaskStatus
+from models.user import User, UserDetail, UserRole, UserTechnology
+from utils.sql import prefix_conditions
+
+# Users read per query while streaming the user directory.
+USER_DIRECTORY_CHUNK_SIZE = int(os.getenv("USER_DIRECTORY_CHUNK_SIZE", "500"))
+
+_projects = Project.__table__
+_task_status = TaskStatus.__table__
+_users = User.__table__
+_user_details = UserDetail.__table__
+_user_roles = UserRole.__table__
+_user_technologies = UserTechnology.__table__
+
+
+class TaskListRow(NamedTuple):
+    """
+    Task as shown in task lists.
+    """
+    task_id: int
+    task_name: Optional[str]
+    task_description: Optional[str]
+    status_name: Optional[str]
+
+
+class ProjectListRow(NamedTuple):
+    """
+    Project as shown in project lists.
+    """
+    project_id: int
+    project_name: Optional[str]
+    project_description: Optional[str]
+
+
+class UserListRow(NamedTuple):
+    """
+    User as shown in user lists.
+    """
+    id: int
+    username: Optional[str]
+    email: Optional[str]
+
+
+class UserProfile(NamedTuple):
+    """
+    User with the role and technology of their latest details, both None
+    if they have no details.
+    """
+    id: int
+    username: Optional[str]
+    email: Optional[str]
+    role_name: Optional[str]
+    technology_name: Optional[str]
+
+
+def _task_list_statement(tasks):
+    return select(
+        tasks.c.task_id, tasks.c.task_name, tasks.c.task_description, _task_status.c.task_status_name
+    ).select_from(
+        tasks.outerjoin(_task_status, _task_status.c.task_status_id == tasks.c.status_id)
+    )
+
+
+def list_project_tasks(project_id: int, archived: bool, db: Session) -> List[TaskListRow]:
+    """
+    Retrieves the tasks of a project with their status names, ordered by task ID.
+
+    Args:
+        archived(bool): Whether to read the archive tables.
+    """
+    tasks = (TaskArchive if archived else Task).__table__
+    statement = _task_list_statement(tasks).where(tasks.c.project_id == project_id).order_by(tasks.c.task_id)
+    return [TaskListRow._make(row) for row in db.execute(statement)]
+
+
+def list_tasks_of_projects(project_ids: Iterable[int], db: Session) -> List[TaskListRow]:
+    """
+    Retrieves the tasks of several projects with their status names, ordered by task ID.
+
+    The projects are grouped by shard; only shards holding one of them are
+    read, in parallel.
+    """
+    shard_projects = group_by_shard(project_ids)
+    tasks = Task.__table__
+
+    def read_shard(shard_id, session):
+        statement = _task_list_statement(tasks).where(
+            tasks.c.project_id.in_(shard_projects[shard_id])
+        ).order_by(tasks.c.task_id)
+        return [TaskListRow._make(row) for row in session.execute(statement)]
+
+    return list(heapq.merge(*fan_out(read_shard, sorted(shard_projects), db), key=lambda row: row.task_id))
+
+
+def _project_list_statement():
+    return select(_projects.c.project_id, _projects.c.project_name, _projects.c.project_description)
+
+
+def list_projects(project_ids: Iterable[int], db: Session) -> List[ProjectListRow]:
+    """
+    Retrieves projects by ID from the shards holding them, ordered by project ID.
+    """
+    shard_projects = group_by_shard(project_ids)
+
+    def read_shard(shard_id, session):
+        statement = _project_list_statement().where(
+            _projects.c.project_id.in_(shard_projects[shard_id])
+        ).order_by(_projects.c.project_id)
+        return [ProjectListRow._make(row) for row in session.execute(statement)]
+
+    return list(heapq.merge(*fan_out(read_shard, sorted(shard_projects), db), key=lambda row: row.project_id))
+
+
+def list_all_projects(db: Session) -> List[ProjectListRow]:
+    """
+    Retrieves the projects of every shard, ordered by project ID.
+    """
+    def read_shard(shard_id, session):
+        statement = _project_list_statement().order_by(_projects.c.project_id)
+        return [ProjectListRow._make(row) for row in session.execute(statement)]
+
+    return list(heapq.merge(*fan_out(read_shard, db=db), key=lambda row: row.project_id))
+
+
+def list_projects_created_by(user_id: int, db: Session) -> List[ProjectListRow]:
+    """
+    Retrieves the projects created by a user from every shard, ordered by project ID.
+    """
+    def read_shard(shard_id, session):
+        statement = _project_list_statement().where(_projects.c.created_by_id == user_id).order_by(_projects.c.project_id)
+        return [ProjectListRow._make(row) for row in session.execute(statement)]
+
+    return list(heapq.merge(*fan_out(read_shard, db=db), key=lambda row: row.project_id))
+
+
+def iter_users(prefix: Optional[str] = None, field: str = "username",
+        chunk_size: int = USER_DIRECTORY_CHUNK_SIZE) -> Iterator[UserListRow]:
+    """
+    Yields users ordered by username or email, optionally only those whose
+    username or email starts with prefix.
+
+    Users are read in keyset pages of chunk_size along the unique index of
+    the field, each page in its own short session. Memory stays bounded
+    however many users there are, no read transaction stays open while the
+    caller consumes the rows, and pages may be read from different threads.
+
+    Args:
+        prefix(str): Prefix of the field to match.
+        field(str): "username" or "email".
+    """
+    column = _users.c[field]
+    statement = select(_users.c.id, _users.c.username, _users.c.email).where(column.isnot(None))
+    if prefix:
+        statement = statement.where(*prefix_conditions(column, prefix))
+    statement = statement.order_by(column).limit(chunk_size)
+    last = None
+    while True:
+        page = statement if last is None else statement.where(column > last)
+        with SessionLocal() as db:
+            rows = [UserListRow._make(row) for row in db.execute(page)]
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = getattr(rows[-1], field)
+
+
+def _user_profile_statement():
+    details = _user_details.alias("latest_details")
+    latest_detail_id = select(func.max(details.c.id)).where(details.c.user_id == _users.c.id).scalar_subquery()
+    return select(
+        _users.c.id, _users.c.username, _users.c.email, _user_roles.c.role_name, _user_technologies.c.technology_name
+    ).select_from(
+        _users.outerjoin(_user_details, and_(
+            _user_details.c.user_id == _users.c.id, _user_details.c.id == latest_detail_id
+        )).outerjoin(
+            _user_roles, _user_roles.c.user_role_id == _user_details.c.user_role_id
+        ).outerjoin(
+            _user_technologies, _user_technologies.c.user_technology_id == _user_details.c.user_technology_id
+        )
+    )
+
+
+def get_user_profile(user_id: int, db: Session) -> Optional[UserProfile]:
+    """
+    Retrieves a user with the role and technology of their latest details in one query.
+
+    The latest details are found on the user_details (user_id, id DESC) index.
+
+    Returns:
+        UserProfile, or None if the user does not exist.
+    """
+    row = db.execute(_user_profile_statement().where(_users.c.id == user_id)).first()
+    return UserProfile._make(row) if row is not None else None
+
+
+def get_user_profiles(user_ids: Iterable[int], db: Session) -> List[UserProfile]:
+    """
+    Retrieves the profiles of several users in one query, ordered by user ID.
+    Users that do not exist are left out.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return []
+    statement = _user_profile_statement().where(_users.c.id.in_(user_ids)).order_by(_users.c.id)
+    return [UserProfile._make(row) for row in db.execute(statement)]
@@ -0,0 +1,352 @@
+import os
+import heapq
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import false, func, or_, select, true, update
+from sqlalchemy.orm import Session
+from database.session import fan_out, group_by_shard, shard_engines, use_shard
+from models.task import Task, TaskArchive, TaskStatus
+from models.user import User
+from services.change_feed import record_change
+from services.project import get_project, ensure_project_not_archived
+from services.job import job_handler, report_progress
+from services.task_stats import apply_task_count_deltas, decrement_task_count
+from services.task_activity import record_activity
+from services.task_tree import has_subtasks, validate_parent_task
+from routers.logger import logger
+from utils.sql import execute_returning, supports_update_returning
+
+BULK_UPDATE_CHUNK_SIZE = 500
+TASK_OVERDUE_SWEEP_SECONDS = float(os.getenv("TASK_OVERDUE_SWEEP_SECONDS", "300"))
+# Status names (case-insensitive) of tasks that are finished.
+TASK_CLOSED_STATUSES = [
+    name.strip().lower() for name in os.getenv("TASK_CLOSED_STATUSES", "done,completed,closed,cancelled").split(",")
+]
+
+_tasks = Task.__table__
+
+TASK_COLUMNS = (
+    Task.__table__.c.task_id,
+    Task.__table__.c.project_id,
+    Task.__table__.c.task_name,
+    Task.__table__.c.task_description,
+    Task.__table__.c.status_id,
+    Task.__table__.c.task_owner_id,
+    Task.__table__.c.parent_task_id,
+    Task.__table__.c.created_at,
+    Task.__table__.c.updated_at,
+    Task.__table__.c.version,
+    Task.__table__.c.due_at,
+    Task.__table__.c.priority,
+    Task.__table__.c.is_overdue,
+)
+
+
+def task_etag(version: int) -> str:
+    """
+    Builds the ETag header value for a task version.
+    """
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Extracts the expected task version from an If-Match header.
+
+    Returns:
+        int: Expected version, or None when the header is absent or "*".
+
+    Raises:
+        HTTPException: If the header is not a task ETag.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid If-Match header")
+
+
+def to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Converts an aware datetime to naive UTC, the way task timestamps are stored.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def closed_status_ids():
+    """
+    Subquery of the ids of statuses named in TASK_CLOSED_STATUSES.
+    """
+    return select(TaskStatus.task_status_id).where(func.lower(TaskStatus.task_status_name).in_(TASK_CLOSED_STATUSES))
+
+
+def is_open_task(tasks=_tasks):
+    """
+    Condition matching tasks that are not in a closed status.
+    """
+    return or_(tasks.c.status_id.is_(None), tasks.c.status_id.not_in(closed_status_ids()))
+
+
+def get_next_tasks(user_id: int, limit: int, db: Session):
+    """
+    Retrieves the open tasks of a user that are due next.
+
+    Tasks with a due date come first, earliest first and by descending
+    priority on the same due date, then undated tasks by priority. Both
+    parts walk the (task_owner_id, due_at, priority, status_id) index in
+    order and stop after limit open tasks, so the user's other tasks are
+    never sorted.
+
+    Every shard is read in parallel and the sorted results are merged.
+
+    Returns:
+        list: Task rows.
+    """
+    def read_shard(shard_id, session):
+        owned = select(*TASK_COLUMNS).where(_tasks.c.task_owner_id == user_id, is_open_task())
+        rows = session.execute(
+            owned.where(_tasks.c.due_at.isnot(None)).order_by(_tasks.c.due_at, _tasks.c.priority.desc()).limit(limit)
+        ).all()
+        if len(rows) < limit:
+            rows += session.execute(
+                owned.where(_tasks.c.due_at.is_(None)).order_by(_tasks.c.priority.desc()).limit(limit - len(rows))
+            ).all()
+        return rows
+
+    merged = heapq.merge(
+        *fan_out(read_shard, db=db), key=lambda row: (row.due_at is None, row.due_at or datetime.min, -row.priority)
+    )
+    return list(islice(merged, limit))
+
+
+def create_new_task(project_id: int, user_id: int, task_name: str, task_description: str, task_status: str,
+        parent_task_id: Optional[int], due_at: Optional[datetime], priority: int, db: Session) -> Task:
+    """
+    Creates a task owned by a user, with a new status row named task_status.
+
+    Raises:
+        HTTPException: If the project, user or parent task is not found, or
+        the project is archived.
+    """
+    ensure_project_not_archived(get_project(project_id, db))
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        logger.error(f"User with ID {user_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    validate_parent_task(None, project_id, parent_task_id, db)
+
+    new_status = TaskStatus(task_status_name=task_status)
+    db.add(new_status)
+    db.commit()
+    db.refresh(new_status)
+    new_task = Task(
+        project_id=project_id,
+        task_name=task_name,
+        task_description=task_description,
+        task_owner_id=user_id,
+        status_id=new_status.task_status_id,
+        parent_task_id=parent_task_id,
+        due_at=to_utc_naive(due_at),
+        priority=priority,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(new_task)
+    db.commit()
+    db.refresh(new_task)
+    return new_task
+
+
+def get_task_or_archived(task_id: int, db: Session):
+    """
+    Retrieves a task, falling back to the archive for archived projects.
+
+    Archived tasks are returned as read-only TaskArchive rows which share
+    the attribute names of Task.
+
+    Returns:
+        Task or TaskArchive, or None if the task does not exist.
+    """
+    task = db.query(Task).filter(Task.task_id == task_id).first()
+    if task is None:
+        task = db.query(TaskArchive).filter(TaskArchive.task_id == task_id).first()
+    return task
+
+
+def update_task_fields(task_id: int, values: dict, expected_version: Optional[int], db: Session):
+    """
+    Updates a task in one conditional UPDATE and returns the new row.
+
+    The task version is bumped by the same statement; when expected_version
+    is given the UPDATE only matches that version, so concurrent edits
+    cannot overwrite each other. Status changes move the task between the
+    project task counters in the same transaction.
+
+    Raises:
+        HTTPException: 404 if the task does not exist, 409 if it is archived,
+        412 if its version does not match expected_version.
+    """
+    if "due_at" in values:
+        values = dict(values, due_at=to_utc_naive(values["due_at"]))
+        values["is_overdue"] = values["due_at"] is not None and values["due_at"] < datetime.utcnow()
+    # Previous values for the activity log, one primary key lookup.
+    previous = None
+    if values:
+        previous = db.execute(select(*[_tasks.c[field] for field in values]).where(_tasks.c.task_id == task_id)).first()
+    statement = update(Task.__table__).where(Task.__table__.c.task_id == task_id)
+    if expected_version is not None:
+        statement = statement.where(Task.__table__.c.version == expected_version)
+    statement = statement.values(
+        **values,
+        version=Task.__table__.c.version + 1,
+        updated_at=datetime.utcnow()
+    )
+    if "status_id" in values:
+        decrement_task_count(db, task_id, expected_version)
+    if supports_update_returning(db):
+        rows = execute_returning(db, statement, TASK_COLUMNS)
+        row = rows[0] if rows else None
+    else:
+        row = None
+        if db.execute(statement).rowcount == 1:
+            row = db.execute(Task.__table__.select().where(Task.__table__.c.task_id == task_id)).first()
+    if row is None:
+        db.rollback()
+        current_version = db.query(Task.version).filter(Task.task_id == task_id).scalar()
+        if current_version is None:
+            if db.query(TaskArchive.task_id).filter(TaskArchive.task_id == task_id).scalar() is not None:
+                logger.error(f"Task with ID {task_id} is archived")
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task is archived")
+            logger.error(f"Task with ID {task_id} not found")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        logger.warning(f"Task with ID {task_id} is at version {current_version}, expected {expected_version}")
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Task was modified by another request",
+            headers={"ETag": task_etag(current_version)}
+        )
+    if "status_id" in values:
+        apply_task_count_deltas(db, {(row.project_id, row.status_id): 1})
+    record_change(db, Task, "update", dict(row._mapping))
+    changes = {}
+    for field in values:
+        changes[field] = {"new": row._mapping[field]}
+        if previous is not None:
+            changes[field]["old"] = previous._mapping[field]
+    record_activity(db, task_id, row.project_id, "updated", changes)
+    db.commit()
+    logger.info(f"Task with ID {task_id} updated to version {row.version}")
+    return row
+
+
+def delete_task(task_id: int, db: Session):
+    """
+    Deletes a task that has no subtasks.
+
+    Raises:
+        HTTPException: 404 if the task does not exist, 409 if it has subtasks.
+    """
+    db_task = db.query(Task).filter(Task.task_id == task_id).first()
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if has_subtasks(task_id, db):
+        logger.error(f"Task with ID {task_id} has subtasks")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task has subtasks")
+    db.delete(db_task)
+    db.commit()
+    logger.info(f"Task with ID {task_id} deleted")
+
+
+@job_handler("bulk_update_task_status", concurrency=2)
+def bulk_update_task_status(job_id: int, payload: dict, db: Session):
+    """
+    Sets the status of many tasks in chunked set-based updates, shard by shard.
+
+    Status IDs are local to each shard, so the status must exist on every
+    shard holding one of the tasks; otherwise no task is updated.
+
+    Payload:
+        task_ids (list[int]): IDs of the tasks to update.
+        status_id (int): New status ID.
+    """
+    task_ids = payload["task_ids"]
+    status_id = payload["status_id"]
+    shard_tasks = group_by_shard(task_ids)
+    for shard_id in sorted(shard_tasks):
+        use_shard(db, shard_id)
+        if db.query(TaskStatus.task_status_id).filter(TaskStatus.task_status_id == status_id).first() is None:
+            raise ValueError(f"Status with ID {status_id} does not exist on shard {shard_id}")
+    updated = 0
+    processed = 0
+    for shard_id, shard_task_ids in sorted(shard_tasks.items()):
+        use_shard(db, shard_id)
+        for start in range(0, len(shard_task_ids), BULK_UPDATE_CHUNK_SIZE):
+            chunk = shard_task_ids[start:start + BULK_UPDATE_CHUNK_SIZE]
+            deltas = Counter()
+            for task_id, project_id, old_status_id in db.query(Task.task_id, Task.project_id, Task.status_id).filter(
+                Task.task_id.in_(chunk)
+            ):
+                deltas[(project_id, old_status_id)] -= 1
+                deltas[(project_id, status_id)] += 1
+                record_activity(db, task_id, project_id, "updated", {
+                    "status_id": {"old": old_status_id, "new": status_id}
+                })
+                record_change(db, Task, "update", {"task_id": task_id, "project_id": project_id, "status_id": status_id})
+            apply_task_count_deltas(db, deltas)
+            updated += db.query(Task).filter(Task.task_id.in_(chunk)).update(
+                {Task.status_id: status_id, Task.version: Task.version + 1, Task.updated_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+            processed += len(chunk)
+            report_progress(job_id, processed * 100 // len(task_ids))
+    logger.info(f"Bulk status update set status {status_id} on {updated} tasks")
+    return {"updated": updated}
+
+
+@job_handler("sweep_overdue_tasks", concurrency=1, every_seconds=TASK_OVERDUE_SWEEP_SECONDS)
+def sweep_overdue_tasks(job_id: int, payload: dict, db: Session):
+    """
+    Flags open tasks past their due date as overdue and clears the flag of
+    tasks that were closed or rescheduled.
+
+    Two set-based UPDATEs over the (is_overdue, due_at) index, however many
+    tasks there are, run on every shard in turn.
+    """
+    now = datetime.utcnow()
+    changes = (
+        (True, [_tasks.c.is_overdue == false(), _tasks.c.due_at < now, is_open_task()]),
+        (False, [_tasks.c.is_overdue == true(), or_(_tasks.c.due_at.is_(None), _tasks.c.due_at >= now, ~is_open_task())]),
+    )
+    counts = [0, 0]
+    for shard_id in range(len(shard_engines)):
+        use_shard(db, shard_id)
+        for index, (is_overdue, where) in enumerate(changes):
+            # The version is left alone: the flag is maintained by the system,
+            # so it must not invalidate the ETags clients hold.
+            statement = update(_tasks).where(*where).values(is_overdue=is_overdue, updated_at=now)
+            if supports_update_returning(db):
+                rows = execute_returning(db, statement, (_tasks.c.task_id, _tasks.c.project_id))
+                for row in rows:
+                    record_activity(db, row.task_id, row.project_id, "updated", {
+                        "is_overdue": {"old": not is_overdue, "new": is_overdue}
+                    })
+                    record_change(db, Task, "update", {
+                        "task_id": row.task_id, "project_id": row.project_id, "is_overdue": is_overdue
+                    })
+                counts[index] += len(rows)
+            else:
+                counts[index] += db.execute(statement).rowcount
+            db.commit()
+    if any(counts):
+        logger.info(f"Overdue sweep flagged {counts[0]} and cleared {counts[1]} tasks")
+    return {"flagged": counts[0], "cleared": counts[1]}
@@ -0,0 +1,299 @@
+import os
+import json
+import atexit
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from database.session import engine
+from models.task import Task, TaskArchive
+from models.task_activity import TASK_ACTIVITY_PREFIX, task_activity_table
+from services.job import job_handler
+from routers.logger import logger
+
+TASK_ACTIVITY_FLUSH_SECONDS = float(os.getenv("TASK_ACTIVITY_FLUSH_SECONDS", "1.0"))
+TASK_ACTIVITY_BATCH_SIZE = int(os.getenv("TASK_ACTIVITY_BATCH_SIZE", "500"))
+# Months of activity to keep; 0 keeps every partition.
+TASK_ACTIVITY_RETENTION_MONTHS = int(os.getenv("TASK_ACTIVITY_RETENTION_MONTHS", "0"))
+
+# Task columns whose changes are recorded.
+TRACKED_FIELDS = (
+    "project_id", "task_name", "task_description", "status_id", "task_owner_id", "parent_task_id", "due_at", "priority",
+    "is_overdue"
+)
+
+_SESSION_KEY = "task_activity"
+_ACTOR_KEY = "activity_actor_id"
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ActivityBuffer:
+    """
+    Collects activity records in memory and writes them in batches.
+
+    A background thread flushes every TASK_ACTIVITY_FLUSH_SECONDS or as soon
+    as TASK_ACTIVITY_BATCH_SIZE records are waiting, with one executemany
+    INSERT per monthly partition. Records still buffered when the process
+    is killed are lost; a regular shutdown flushes them.
+    """
+
+    def __init__(self, flush_seconds: float = TASK_ACTIVITY_FLUSH_SECONDS, batch_size: int = TASK_ACTIVITY_BATCH_SIZE):
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self._records = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+        self._partitions = set()
+
+    def add(self, records: List[dict]):
+        with self._lock:
+            self._records.extend(records)
+            full = len(self._records) >= self.batch_size
+            # Threads do not survive a fork, so worker processes start their own.
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name="task-activity-writer", daemon=True).start()
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every buffered record to its monthly partition.
+        """
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if not records:
+                return
+            by_month = defaultdict(list)
+            for record in records:
+                by_month[record["created_at"].strftime("%Y%m")].append(record)
+            try:
+                with engine.begin() as connection:
+                    for month, rows in sorted(by_month.items()):
+                        table = task_activity_table(month)
+                        if month not in self._partitions:
+                            table.create(connection, checkfirst=True)
+                            self._partitions.add(month)
+                        connection.execute(table.insert(), rows)
+            except Exception:
+                logger.exception(f"Writing {len(records)} task activity records failed, retrying later")
+                with self._lock:
+                    if len(self._records) < self.batch_size * 100:
+                        self._records[:0] = records
+
+
+activity_buffer = ActivityBuffer()
+atexit.register(activity_buffer.flush)
+
+
+def set_activity_actor(db: Session, user_id: Optional[int]):
+    """
+    Records the user making the changes of this session in the activity log.
+    """
+    db.info[_ACTOR_KEY] = user_id
+
+
+def record_activity(session: Session, task_id: int, project_id: Optional[int], action: str, changes: dict):
+    """
+    Queues an activity record, written once the session commits.
+
+    Used for changes made outside the unit of work (e.g. Core UPDATEs).
+
+    Args:
+        action(str): "created", "updated" or "deleted".
+        changes(dict): Changed fields as {"field": {"old": ..., "new": ...}};
+            "old" is left out when the previous value was not loaded.
+    """
+    session.info.setdefault(_SESSION_KEY, []).append({
+        "task_id": task_id,
+        "project_id": project_id,
+        "actor_id": session.info.get(_ACTOR_KEY),
+        "action": action,
+        "changes": json.dumps(changes, default=_json_default),
+        "created_at": datetime.utcnow(),
+    })
+
+
+def _diff(task) -> dict:
+    changes = {}
+    state = inspect(task)
+    for field in TRACKED_FIELDS:
+        history = state.attrs[field].history
+        if not history.added:
+            continue
+        change = {"new": _json_value(history.added[0])}
+        if history.deleted:
+            change["old"] = _json_value(history.deleted[0])
+        changes[field] = change
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_activity(session, flush_context):
+    for task in session.new:
+        if isinstance(task, Task):
+            record_activity(session, task.task_id, task.project_id, "created", {
+                field: {"new": _json_value(getattr(task, field))} for field in TRACKED_FIELDS
+            })
+    for task in session.dirty:
+        if isinstance(task, Task):
+            changes = _diff(task)
+            if changes:
+                record_activity(session, task.task_id, task.project_id, "updated", changes)
+    for task in session.deleted:
+        if isinstance(task, Task):
+            record_activity(session, task.task_id, task.project_id, "deleted", {
+                field: {"old": _json_value(getattr(task, field))} for field in TRACKED_FIELDS
+            })
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_activity(session):
+    records = session.info.pop(_SESSION_KEY, None)
+    if records:
+        activity_buffer.add(records)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_activity(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def list_partition_months() -> List[str]:
+    """
+    Months ("YYYYMM") that have an activity partition, newest first.
+
+    The partitions of every shard's tasks live on the catalog database,
+    where ActivityBuffer writes them.
+    """
+    return sorted(
+        (name[len(TASK_ACTIVITY_PREFIX):] for name in inspect(engine).get_table_names()
+         if name.startswith(TASK_ACTIVITY_PREFIX)),
+        reverse=True
+    )
+
+
+def _parse_cursor(cursor: str):
+    try:
+        month, activity_id = cursor.split(":")
+        if len(month) != 6 or not month.isdigit():
+            raise ValueError(month)
+        return month, int(activity_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def get_activity_page(db: Session, limit: int, cursor: Optional[str] = None, task_id: Optional[int] = None,
+        project_id: Optional[int] = None, since: Optional[datetime] = None):
+    """
+    Retrieves one page of task activity, newest first.
+
+    Walks the monthly partitions from newest to oldest; within a partition
+    the (task_id|project_id, activity_id) index serves the page directly, so
+    the cost depends on the page size, not on the size of the log.
+
+    Args:
+        cursor(str): next_cursor of the previous page.
+        since(datetime): Skip partitions older than this month.
+
+    Returns:
+        dict: items and next_cursor (None on the last page).
+    """
+    months = list_partition_months()
+    before = None
+    if cursor:
+        before = _parse_cursor(cursor)
+        months = [month for month in months if month <= before[0]]
+    if since is not None:
+        months = [month for month in months if month >= since.strftime("%Y%m")]
+    items = []
+    for month in months:
+        table = task_activity_table(month)
+        query = select(table)
+        if task_id is not None:
+            query = query.where(table.c.task_id == task_id)
+        if project_id is not None:
+            query = query.where(table.c.project_id == project_id)
+        if before and month == before[0]:
+            query = query.where(table.c.activity_id < before[1])
+        rows = db.execute(query.order_by(table.c.activity_id.desc()).limit(limit - len(items))).all()
+        items.extend((month, row) for row in rows)
+        if len(items) >= limit:
+            break
+    next_cursor = None
+    if len(items) >= limit:
+        month, row = items[-1]
+        next_cursor = f"{month}:{row.activity_id}"
+    return {
+        "items": [dict(row._mapping, changes=json.loads(row.changes or "{}")) for _, row in items],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_task_activity_page(task_id: int, db: Session, limit: int, cursor: Optional[str] = None):
+    """
+    Retrieves one page of the history of a task.
+
+    Partitions older than the creation month of the task are skipped.
+    """
+    created_at = None
+    for model in (Task, TaskArchive):
+        created_at = db.query(model.created_at).filter(model.task_id == task_id).scalar()
+        if created_at is not None:
+            break
+    return get_activity_page(db, limit, cursor, task_id=task_id, since=created_at)
+
+
+def _months_ago(months: int) -> str:
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+@job_handler("prune_task_activity", concurrency=1, every_seconds=86400 if TASK_ACTIVITY_RETENTION_MONTHS else None)
+def prune_task_activity(job_id: int, payload: dict, db: Session):
+    """
+    Drops monthly activity partitions older than the retention period.
+
+    Payload:
+        retention_months (int): Overrides TASK_ACTIVITY_RETENTION_MONTHS.
+        vacuum (bool): Reclaim the freed space afterwards (SQLite).
+    """
+    retention_months = payload.get("retention_months", TASK_ACTIVITY_RETENTION_MONTHS)
+    if not retention_months:
+        return {"dropped": []}
+    oldest_kept = _months_ago(retention_months - 1)
+    dropped = [month for month in list_partition_months() if month < oldest_kept]
+    with engine.begin() as connection:
+        for month in dropped:
+            task_activity_table(month).drop(connection, checkfirst=True)
+    if dropped and payload.get("vacuum") and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+    logger.info(f"Dropped task activity partitions {dropped}")
+    return {"dropped": dropped}
@@ -0,0 +1,164 @@
+import os
+import heapq
+from collections import Counter
+from itertools import islice
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database.session import fan_out, group_by_shard
+from models.project import ProjectTaskStat
+from models.task import Task, TaskStatus
+from models.user import User
+from schemas.task import TaskQuery
+from services.task import TASK_COLUMNS
+from utils.sql import no_index, prefix_conditions
+
+# Project sets with at most this many tasks drive the query through the project index.
+TASK_QUERY_SMALL_PROJECT_SET = int(os.getenv("TASK_QUERY_SMALL_PROJECT_SET", "5000"))
+# Facet values returned per facet, the most frequent first.
+TASK_QUERY_FACET_LIMIT = 50
+
+_tasks = Task.__table__
+
+
+class TaskQueryBuilder:
+    """
+    Builds the SQL of a TaskQuery.
+
+    Every filter is written so an index can serve it: IN lists, ranges, and
+    the name prefix as a range instead of LIKE. One filter is then picked
+    to drive the query, preferring the most selective one: a project set
+    known to be small from project_task_stats, then owners, the name
+    prefix, updated and created ranges, and any project set. The other
+    filters are marked with no_index, so SQLite checks them on the rows the
+    driving index returns instead of intersecting indexes. Without a
+    driving filter the tasks are scanned in task_id order, which stops as
+    soon as the page is full.
+    """
+
+    def __init__(self, task_query: TaskQuery, db: Session):
+        self.task_query = task_query
+        self.plan = self._choose_plan(db)
+
+    def _choose_plan(self, db: Session) -> str:
+        task_query = self.task_query
+        if task_query.project_ids is not None:
+            project_tasks = db.execute(select(func.coalesce(func.sum(ProjectTaskStat.task_count), 0)).where(
+                ProjectTaskStat.project_id.in_(task_query.project_ids)
+            )).scalar()
+            if project_tasks <= TASK_QUERY_SMALL_PROJECT_SET:
+                return "project"
+        if task_query.owner_ids:
+            return "owner"
+        if task_query.name_prefix:
+            return "name_prefix"
+        if task_query.updated_after or task_query.updated_before:
+            return "updated_at"
+        if task_query.created_after or task_query.created_before:
+            return "created_at"
+        if task_query.project_ids is not None:
+            return "project"
+        return "scan"
+
+    def _column(self, column, plan: str):
+        return column if plan == self.plan else no_index(column)
+
+    def conditions(self) -> list:
+        """
+        WHERE conditions of the query, without paging.
+        """
+        task_query = self.task_query
+        conditions = []
+        if task_query.project_ids is not None:
+            conditions.append(self._column(_tasks.c.project_id, "project").in_(task_query.project_ids))
+        if task_query.owner_ids:
+            conditions.append(self._column(_tasks.c.task_owner_id, "owner").in_(task_query.owner_ids))
+        if task_query.status_ids:
+            conditions.append(no_index(_tasks.c.status_id).in_(task_query.status_ids))
+        if task_query.name_prefix:
+            conditions += prefix_conditions(self._column(_tasks.c.task_name, "name_prefix"), task_query.name_prefix)
+        for column, after, before in (
+            (_tasks.c.updated_at, task_query.updated_after, task_query.updated_before),
+            (_tasks.c.created_at, task_query.created_after, task_query.created_before),
+        ):
+            if after is not None:
+                conditions.append(self._column(column, column.name) >= after)
+            if before is not None:
+                conditions.append(self._column(column, column.name) < before)
+        return conditions
+
+    def page_statement(self):
+        """
+        SELECT of the next page of tasks, ordered by task_id.
+        """
+        statement = select(*TASK_COLUMNS).where(*self.conditions())
+        if self.task_query.after_task_id is not None:
+            statement = statement.where(self._column(_tasks.c.task_id, "scan") > self.task_query.after_task_id)
+        return statement.order_by(_tasks.c.task_id).limit(self.task_query.limit)
+
+    def facet_statement(self):
+        """
+        SELECT of the number of matching tasks per status and owner pair.
+
+        Owners are users of the catalog, so their names are not joined here.
+        """
+        return select(
+            _tasks.c.status_id, TaskStatus.task_status_name, _tasks.c.task_owner_id, func.count().label("task_count")
+        ).select_from(
+            _tasks.outerjoin(TaskStatus.__table__, TaskStatus.task_status_id == _tasks.c.status_id)
+        ).where(*self.conditions()).group_by(_tasks.c.status_id, TaskStatus.task_status_name, _tasks.c.task_owner_id)
+
+
+def _facet(counts: Counter, labels: dict) -> list:
+    return [
+        {"value": value, "label": labels.get(value), "count": count}
+        for value, count in counts.most_common(TASK_QUERY_FACET_LIMIT)
+    ]
+
+
+def query_tasks(task_query: TaskQuery, db: Session):
+    """
+    Retrieves one page of tasks matching a TaskQuery with status and owner facets.
+
+    The shards holding the requested projects, or every shard without a
+    project filter, are queried in parallel, each with its own plan; the
+    pages are merged by task ID. Both facets and the total come from one
+    query per shard grouped by status and owner, folded into per-facet
+    counts here.
+
+    Returns:
+        dict: items, next_after_task_id, total, status_facet, owner_facet
+        and the names of the chosen plans.
+    """
+    shard_project_ids = None
+    if task_query.project_ids is not None:
+        shard_project_ids = group_by_shard(task_query.project_ids)
+
+    def read_shard(shard_id, session):
+        shard_query = task_query
+        if shard_project_ids is not None:
+            shard_query = task_query.model_copy(update={"project_ids": shard_project_ids[shard_id]})
+        builder = TaskQueryBuilder(shard_query, session)
+        return builder.plan, session.execute(builder.page_statement()).all(), session.execute(builder.facet_statement()).all()
+
+    shard_ids = sorted(shard_project_ids) if shard_project_ids is not None else None
+    results = fan_out(read_shard, shard_ids, db=db) if shard_ids != [] else []
+    items = list(islice(heapq.merge(*(rows for _, rows, _ in results), key=lambda row: row.task_id), task_query.limit))
+    status_counts, owner_counts = Counter(), Counter()
+    status_names = {}
+    for _, _, facets in results:
+        for row in facets:
+            status_counts[row.status_id] += row.task_count
+            owner_counts[row.task_owner_id] += row.task_count
+            status_names[row.status_id] = row.task_status_name
+    owner_ids = [owner_id for owner_id, _ in owner_counts.most_common(TASK_QUERY_FACET_LIMIT) if owner_id is not None]
+    owner_names = dict(db.execute(select(User.id, User.username).where(User.id.in_(owner_ids))).all()) if owner_ids else {}
+    return {
+        "items": items,
+        "next_after_task_id": items[-1].task_id if len(items) == task_query.limit else None,
+        "total": sum(status_counts.values()),
+        "status_facet": _facet(status_counts, status_names),
+        "owner_facet": _facet(owner_counts, owner_names),
+        "plan": ",".join(sorted({plan for plan, _, _ in results})) or "project",
+    }
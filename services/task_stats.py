@@ -0,0 +1,185 @@
+import os
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, event, func, inspect, select, union_all
+from sqlalchemy.orm import Session
+
+from database.session import shard_engines, shard_for_id, use_shard
+from models.project import ProjectTaskStat
+from models.task import Task, TaskArchive, TaskStatus
+from services.job import job_handler, report_progress
+from routers.logger import logger
+from utils.sql import increment_counter, lock_for_write
+
+# Tasks without a status are counted under this status id.
+NO_STATUS = 0
+
+TASK_STATS_RECONCILE_SECONDS = float(os.getenv("TASK_STATS_RECONCILE_SECONDS", "3600"))
+
+_stats = ProjectTaskStat.__table__
+_tasks = Task.__table__
+
+
+def apply_task_count_deltas(db: Session, deltas: Dict[Tuple[int, int], int]):
+    """
+    Adds the given per (project_id, status_id) deltas to the task counters.
+
+    Runs on the session's connection so the counters change in the same
+    transaction as the tasks they describe.
+    """
+    for (project_id, status_id), delta in deltas.items():
+        if project_id is None or not delta:
+            continue
+        increment_counter(
+            db, _stats, {"project_id": project_id, "status_id": status_id or NO_STATUS}, "task_count", delta
+        )
+
+
+def decrement_task_count(db: Session, task_id: int, expected_version: Optional[int] = None):
+    """
+    Decrements the counter of the current project and status of a task.
+
+    Used before Core UPDATEs that change the status, so the old status does
+    not have to be read into Python first.
+    """
+    where = [_tasks.c.task_id == task_id]
+    if expected_version is not None:
+        where.append(_tasks.c.version == expected_version)
+    project_id = select(_tasks.c.project_id).where(*where).scalar_subquery()
+    status_id = select(func.coalesce(_tasks.c.status_id, NO_STATUS)).where(*where).scalar_subquery()
+    db.execute(
+        _stats.update().where(_stats.c.project_id == project_id, _stats.c.status_id == status_id).values(
+            task_count=_stats.c.task_count - 1
+        )
+    )
+
+
+def _committed_value(state, name: str):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), name)
+
+
+@event.listens_for(Task.project_id, "set", active_history=True)
+@event.listens_for(Task.status_id, "set", active_history=True)
+def _load_previous_value(target, value, oldvalue, initiator):
+    # active_history makes the ORM load the old value on assignment, even
+    # for expired instances, so the old counter can be decremented.
+    pass
+
+
+@event.listens_for(Session, "after_flush")
+def _count_task_changes(session, flush_context):
+    deltas = Counter()
+    for task in session.new:
+        if isinstance(task, Task):
+            deltas[(task.project_id, task.status_id)] += 1
+    for task in session.deleted:
+        if isinstance(task, Task):
+            state = inspect(task)
+            deltas[(_committed_value(state, "project_id"), _committed_value(state, "status_id"))] -= 1
+    for task in session.dirty:
+        if not isinstance(task, Task):
+            continue
+        state = inspect(task)
+        if not (state.attrs.project_id.history.has_changes() or state.attrs.status_id.history.has_changes()):
+            continue
+        deltas[(_committed_value(state, "project_id"), _committed_value(state, "status_id"))] -= 1
+        deltas[(task.project_id, task.status_id)] += 1
+    if deltas:
+        apply_task_count_deltas(session, deltas)
+
+
+def get_project_dashboard(project_id: int, db: Session):
+    """
+    Reads the task counters of a project, without touching the tasks table.
+
+    Returns:
+        dict: Total number of tasks and the count per status.
+    """
+    rows = db.query(ProjectTaskStat.status_id, TaskStatus.task_status_name, ProjectTaskStat.task_count).outerjoin(
+        TaskStatus, TaskStatus.task_status_id == ProjectTaskStat.status_id
+    ).filter(ProjectTaskStat.project_id == project_id, ProjectTaskStat.task_count != 0).all()
+    statuses = [
+        {"status_id": status_id, "status_name": status_name, "task_count": task_count}
+        for status_id, status_name, task_count in rows
+    ]
+    return {
+        "project_id": project_id,
+        "total": sum(status["task_count"] for status in statuses),
+        "statuses": statuses,
+    }
+
+
+def _reconcile_shard(project_id: Optional[int], db: Session) -> Tuple[int, int]:
+    # Task writes between the recount and the repair would be counted twice.
+    lock_for_write(db, _stats)
+    counted = []
+    for table in (_tasks, TaskArchive.__table__):
+        query = select(
+            table.c.project_id.label("project_id"),
+            func.coalesce(table.c.status_id, NO_STATUS).label("status_id")
+        ).where(table.c.project_id.isnot(None))
+        if project_id is not None:
+            query = query.where(table.c.project_id == project_id)
+        counted.append(query)
+    tasks = union_all(*counted).subquery()
+    actual = {
+        (row.project_id, row.status_id): row.task_count
+        for row in db.execute(
+            select(tasks.c.project_id, tasks.c.status_id, func.count().label("task_count")).group_by(
+                tasks.c.project_id, tasks.c.status_id
+            )
+        )
+    }
+    stored_query = select(_stats.c.project_id, _stats.c.status_id, _stats.c.task_count)
+    if project_id is not None:
+        stored_query = stored_query.where(_stats.c.project_id == project_id)
+    stored = {(row.project_id, row.status_id): row.task_count for row in db.execute(stored_query)}
+    repaired = 0
+    for key in set(actual) | set(stored):
+        expected = actual.get(key, 0)
+        if stored.get(key, 0) == expected:
+            continue
+        repaired += 1
+        where = and_(_stats.c.project_id == key[0], _stats.c.status_id == key[1])
+        if key not in stored:
+            db.execute(_stats.insert().values(project_id=key[0], status_id=key[1], task_count=expected))
+        elif expected == 0:
+            db.execute(_stats.delete().where(where))
+        else:
+            db.execute(_stats.update().where(where).values(task_count=expected))
+    db.commit()
+    return len(set(actual) | set(stored)), repaired
+
+
+@job_handler("reconcile_task_stats", concurrency=1, every_seconds=TASK_STATS_RECONCILE_SECONDS)
+def reconcile_task_stats(job_id: int, payload: dict, db: Session):
+    """
+    Recounts tasks per project and status and repairs drifted counters.
+
+    Archived tasks keep counting towards their project.
+
+    Payload:
+        project_id (int): Optional project to reconcile, defaults to all
+        projects of every shard.
+    """
+    project_id = payload.get("project_id")
+    if project_id is not None:
+        shard_ids = [shard_for_id(project_id)]
+    else:
+        shard_ids = range(len(shard_engines))
+    checked = repaired = 0
+    for done, shard_id in enumerate(shard_ids):
+        use_shard(db, shard_id)
+        shard_checked, shard_repaired = _reconcile_shard(project_id, db)
+        checked += shard_checked
+        repaired += shard_repaired
+        report_progress(job_id, (done + 1) * 100 // len(shard_ids))
+    if repaired:
+        logger.warning(f"Repaired {repaired} drifted task counters")
+    return {"checked": checked, "repaired": repaired}
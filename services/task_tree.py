@@ -0,0 +1,180 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, func, inspect, literal, select, true
+from sqlalchemy.orm import Session
+
+from models.task import Task, TaskArchive, TaskClosure, TaskStatus
+from routers.logger import logger
+
+_closure = TaskClosure.__table__
+
+
+def _insert_task_paths(connection, task_id: int, parent_task_id: Optional[int]):
+    """
+    Adds the closure rows of a new leaf task: itself plus every ancestor of its parent.
+    """
+    paths = select(literal(task_id), literal(task_id), literal(0))
+    if parent_task_id is not None:
+        paths = paths.union_all(
+            select(_closure.c.ancestor_id, literal(task_id), _closure.c.depth + 1).where(
+                _closure.c.descendant_id == parent_task_id
+            )
+        )
+    connection.execute(_closure.insert().from_select(["ancestor_id", "descendant_id", "depth"], paths))
+
+
+def _move_task_paths(connection, task_id: int, parent_task_id: Optional[int]):
+    """
+    Re-links the subtree of a task below a new parent (or makes it a root).
+
+    Paths inside the subtree are kept; paths from outside ancestors are
+    replaced by the cross product of the new parent's ancestors and the
+    subtree. Two statements regardless of depth or subtree size.
+    """
+    subtree = select(_closure.c.descendant_id).where(_closure.c.ancestor_id == task_id)
+    connection.execute(_closure.delete().where(
+        _closure.c.descendant_id.in_(subtree),
+        _closure.c.ancestor_id.not_in(subtree)
+    ))
+    if parent_task_id is None:
+        return
+    above = _closure.alias("above")
+    below = _closure.alias("below")
+    connection.execute(_closure.insert().from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1).select_from(
+            above.join(below, true())
+        ).where(
+            above.c.descendant_id == parent_task_id,
+            below.c.ancestor_id == task_id
+        )
+    ))
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_task_closure(session, flush_context):
+    new_tasks = [obj for obj in session.new if isinstance(obj, Task)]
+    moved_tasks = [
+        obj for obj in session.dirty
+        if isinstance(obj, Task) and inspect(obj).attrs.parent_task_id.history.has_changes()
+    ]
+    deleted_tasks = [obj for obj in session.deleted if isinstance(obj, Task)]
+    if not (new_tasks or moved_tasks or deleted_tasks):
+        return
+    connection = session.connection()
+    # Parents created in the same flush have lower ids and get their paths first.
+    for task in sorted(new_tasks, key=lambda obj: obj.task_id):
+        _insert_task_paths(connection, task.task_id, task.parent_task_id)
+    for task in moved_tasks:
+        _move_task_paths(connection, task.task_id, task.parent_task_id)
+    for task in deleted_tasks:
+        connection.execute(_closure.delete().where(_closure.c.descendant_id == task.task_id))
+
+
+def validate_parent_task(task_id: Optional[int], project_id: int, parent_task_id: Optional[int], db: Session):
+    """
+    Checks that a task can be placed below the given parent.
+
+    Raises:
+        HTTPException: If the parent does not exist, belongs to another
+        project, or lies inside the subtree of the task itself.
+    """
+    if parent_task_id is None:
+        return
+    parent_project_id = db.query(Task.project_id).filter(Task.task_id == parent_task_id).scalar()
+    if parent_project_id is None:
+        logger.error(f"Parent task with ID {parent_task_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent task not found")
+    if parent_project_id != project_id:
+        logger.error(f"Parent task with ID {parent_task_id} belongs to another project")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parent task belongs to another project")
+    if task_id is not None and db.query(TaskClosure).filter(
+        TaskClosure.ancestor_id == task_id, TaskClosure.descendant_id == parent_task_id
+    ).first():
+        logger.error(f"Task with ID {parent_task_id} is inside the subtree of task with ID {task_id}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A task cannot be moved below its own subtask")
+
+
+def move_task(task_id: int, parent_task_id: Optional[int], db: Session):
+    """
+    Moves a task together with its whole subtree below another task.
+
+    Raises:
+        HTTPException: If the task does not exist or the parent is invalid.
+    """
+    task = db.query(Task).filter(Task.task_id == task_id).first()
+    if not task:
+        logger.error(f"Task with ID {task_id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    validate_parent_task(task_id, task.project_id, parent_task_id, db)
+    task.parent_task_id = parent_task_id
+    db.commit()
+    logger.info(f"Task with ID {task_id} moved below task with ID {parent_task_id}")
+    return task
+
+
+def _query_task_tree(task_id: int, db: Session, build_statement):
+    """
+    Runs a closure query against tasks, then against tasks_archive.
+
+    Every tree query returns at least the depth 0 row of the task itself,
+    so an empty result means the task is not in that table.
+
+    Raises:
+        HTTPException: If the task does not exist.
+    """
+    for model in (Task, TaskArchive):
+        rows = db.execute(build_statement(model.__table__)).all()
+        if rows:
+            return rows
+    logger.error(f"Task with ID {task_id} not found")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+
+def get_subtree(task_id: int, db: Session):
+    """
+    Retrieves a task and all of its descendants, ordered by depth.
+
+    Returns:
+        list: Rows of the subtree tasks with their depth below task_id.
+    """
+    return _query_task_tree(task_id, db, lambda tasks: select(tasks, _closure.c.depth).join(
+        _closure, _closure.c.descendant_id == tasks.c.task_id
+    ).where(_closure.c.ancestor_id == task_id).order_by(_closure.c.depth, tasks.c.task_id))
+
+
+def get_ancestors(task_id: int, db: Session):
+    """
+    Retrieves the ancestors of a task from the root down to its parent.
+
+    Returns:
+        list: Rows with task_id, task_name and depth above task_id.
+    """
+    rows = _query_task_tree(task_id, db, lambda tasks: select(tasks.c.task_id, tasks.c.task_name, _closure.c.depth).join(
+        _closure, _closure.c.ancestor_id == tasks.c.task_id
+    ).where(_closure.c.descendant_id == task_id).order_by(_closure.c.depth.desc()))
+    return rows[:-1]
+
+
+def get_subtree_status_counts(task_id: int, db: Session):
+    """
+    Counts the tasks of a subtree (including its root) per status.
+
+    Returns:
+        list: Rows with status_id, status_name and task_count.
+    """
+    return _query_task_tree(task_id, db, lambda tasks: select(
+        tasks.c.status_id, TaskStatus.task_status_name.label("status_name"), func.count().label("task_count")
+    ).select_from(
+        _closure.join(tasks, _closure.c.descendant_id == tasks.c.task_id).outerjoin(
+            TaskStatus.__table__, TaskStatus.task_status_id == tasks.c.status_id
+        )
+    ).where(_closure.c.ancestor_id == task_id).group_by(tasks.c.status_id, TaskStatus.task_status_name))
+
+
+def has_subtasks(task_id: int, db: Session) -> bool:
+    """
+    Checks whether any task has the given task as its parent.
+    """
+    return db.query(Task.task_id).filter(Task.parent_task_id == task_id).first() is not None
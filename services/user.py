@@ -9,6 +9,8 @@ from schemas.user_technology import UserTechnologyCreate
 from schemas.user_detail import UserDetailsCreate
 from database.session import SessionLocal
 from routers.logger import logger
+from services.read_model import UserProfile, get_user_profile
+from typing import Optional
 
 
 def create_user(username: str, password: str, email: str, is_admin_user: bool = False, db: Session = None):
@@ -46,33 +48,33 @@ def create_details_of_user(user_id: int, user_role_id: int, user_technology_id:
         logger.error("User technology not found with ID: %d", user_technology_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User technology not found")
     new_user_detail = UserDetail(user_id=user_id, user_role_id=user_role_id, user_technology_id=user_technology_id)
+    # The new details are the latest ones, so their names are already known.
+    role_name, technology_name = user_role.role_name, user_technology.technology_name
     db.add(new_user_detail)
     db.commit()
     db.refresh(new_user_detail)
     logger.info("User detail entry created successfully with ID: %d", new_user_detail.id)
-    user_detail = db.query(UserDetail, UserRole.role_name, UserTechnology.technology_name).join(UserRole,
-    UserDetail.user_role_id == UserRole.user_role_id).join(UserTechnology,
-    UserDetail.user_technology_id == UserTechnology.user_technology_id).filter(UserDetail.user_id == user_id).order_by(UserDetail.id.desc()).first()
-    return user, user_detail
+    return user, (new_user_detail, role_name, technology_name)
 
 
-def get_details_of_user(user_id: int, db: Session = None):
+def get_details_of_user(user_id: int, db: Session = None) -> Optional[UserProfile]:
     """
-    Retrieves user details for the specified user ID.
+    Retrieves the user with the role and technology of their latest details.
+
+    Returns:
+        UserProfile, or None if the user does not exist.
     """
     if db is None:
         db = SessionLocal()
 
-    user_detail = db.query(UserDetail).filter(user_id == user_id).first()
-    if not user_detail:
+    profile = get_user_profile(user_id, db)
+    if profile is None:
+        logger.error(f"User with ID {user_id} not found")
+        return None
+    if profile.role_name is None:
         logger.error(f"User detail of given user id {user_id} does not exist")
-
-    user = db.query(User).filter(User.id == user_id).first()
-    user_detail = db.query(UserDetail, UserRole.role_name, UserTechnology.technology_name).join(UserRole,
-    UserDetail.user_role_id == UserRole.user_role_id).join(UserTechnology,
-    UserDetail.user_technology_id == UserTechnology.user_technology_id).filter(UserDetail.user_id == user_id).order_by(UserDetail.id.desc()).first()
     logger.info("User details retrieved successfully for user ID: %d", user_id)
-    return user, user_detail
+    return profile
 
 
 def create_user_role_data(role_name: str, db: Session = None):
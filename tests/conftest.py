@@ -0,0 +1,84 @@
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+# The database URLs are read at import time, so they are set before the app
+# is imported: a catalog database (shard 0) and one additional shard.
+_DATA_DIR = tempfile.mkdtemp(prefix="task-app-tests-")
+os.environ["URL_DATABASE"] = f"sqlite:///{_DATA_DIR}/catalog.db"
+os.environ["URL_DATABASE_SHARDS"] = f"sqlite:///{_DATA_DIR}/shard1.db"
+os.environ["JOB_WORKER_MODE"] = "off"
+# Templates and static files are found relative to the working directory.
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import create_app  # noqa: E402
+from database.session import SessionLocal, use_shard  # noqa: E402
+from models.project import Project, UserProject  # noqa: E402
+from services.user import create_user  # noqa: E402
+
+PASSWORD = "secret"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(create_app()) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(client, db):
+    """
+    Creates users and returns (user id, Authorization header) for each.
+    """
+    def make(is_admin_user: bool = False):
+        name = uuid.uuid4().hex[:12]
+        user = create_user(name, PASSWORD, f"{name}@example.com", is_admin_user, db)
+        response = client.post("/auth/token", data={"username": user.email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return user.id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return make
+
+
+@pytest.fixture
+def make_project(db):
+    """
+    Creates projects on a given shard with their creator as member and returns their IDs.
+    """
+    def make(owner_id: int, shard_id: int = 0):
+        use_shard(db, shard_id)
+        project = Project(project_name=f"project {uuid.uuid4().hex[:8]}", project_description="", created_by_id=owner_id)
+        db.add(project)
+        db.flush()
+        db.add(UserProject(user_id=owner_id, project_id=project.project_id, joined_at=datetime.utcnow()))
+        project_id = project.project_id
+        db.commit()
+        use_shard(db, None)
+        return project_id
+    return make
+
+
+@pytest.fixture
+def make_task(client):
+    """
+    Creates tasks through the API and returns their JSON.
+    """
+    def make(project_id: int, headers: dict, status_name: str = "open", **fields):
+        body = {"task_name": f"task {uuid.uuid4().hex[:8]}", "task_description": "", "task_status": status_name, **fields}
+        response = client.post(f"/api/v1/projects/{project_id}/tasks/", json=body, headers=headers)
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from database.session import use_shard
+from models.analytics import RollupCheckpoint
+from models.task import Task, TaskStatus
+from services import analytics
+from services.task_activity import activity_buffer
+
+
+def _today(client, project_id, headers):
+    response = client.get(f"/projects/projects/{project_id}/charts/throughput/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["points"][-1]
+
+
+def _ensure_open_status(db, shard_id, status_id):
+    use_shard(db, shard_id)
+    if db.query(TaskStatus.task_status_id).filter(TaskStatus.task_status_id == status_id).first() is None:
+        db.add(TaskStatus(task_status_id=status_id, task_status_name="open"))
+        db.commit()
+    use_shard(db, None)
+
+
+def test_rollups_resolve_statuses_on_the_project_shard(client, db, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    project_id = make_project(user_id, shard_id=1)
+    task = make_task(project_id, headers, "open")
+    done = make_task(project_id, headers, "done")
+    # The same status ID names an open status on shard 0.
+    _ensure_open_status(db, 0, done["status_id"])
+    response = client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"status_id": done["status_id"]}, headers=headers)
+    assert response.status_code == 200, response.text
+    activity_buffer.flush()
+
+    analytics.rollup_task_activity(0, {}, db)
+
+    point = _today(client, project_id, headers)
+    assert point["created"] == 2
+    assert point["completed"] == 2
+
+
+def test_backfill_visits_every_shard(client, db, make_user, make_project, monkeypatch):
+    user_id, headers = make_user()
+    project_id = make_project(user_id, shard_id=1)
+    created_at = datetime.utcnow() - timedelta(seconds=1)
+    use_shard(db, 1)
+    status = TaskStatus(task_status_name="done")
+    db.add(status)
+    db.flush()
+    # Tasks written without the ORM are not in the activity log, like tasks
+    # created before it existed.
+    db.execute(insert(Task.__table__), [
+        {"project_id": project_id, "task_name": name, "task_owner_id": user_id, "status_id": status_id,
+         "created_at": created_at, "updated_at": created_at, "version": 1, "priority": 0, "is_overdue": False}
+        for name, status_id in (("open", None), ("done", status.task_status_id))
+    ])
+    db.commit()
+    use_shard(db, None)
+    # Start over as if the activity log did not exist yet.
+    db.query(RollupCheckpoint).filter(RollupCheckpoint.name.like("task_backfill%")).delete(synchronize_session=False)
+    db.commit()
+    monkeypatch.setattr(analytics, "list_partition_months", lambda: [])
+
+    result = analytics.backfill_task_rollups(0, {"batch_size": 1000}, db)
+
+    assert result["processed"] >= 2
+    point = _today(client, project_id, headers)
+    assert point["created"] == 2
+    assert point["completed"] == 1
+    assert db.get(RollupCheckpoint, "task_backfill_1").finished_at is not None
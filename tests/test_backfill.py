@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from database import backfill
+from database.backfill import run_backfill
+from models.backfill import BackfillCheckpoint
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/backfill.db")
+    BackfillCheckpoint.__table__.create(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE items (item_id INTEGER PRIMARY KEY, done INTEGER NOT NULL DEFAULT 0)")
+        connection.exec_driver_sql("INSERT INTO items (item_id) VALUES " + ", ".join(f"({i})" for i in range(1, 26)))
+    yield engine
+    engine.dispose()
+
+
+def test_backfill_resumes_from_its_checkpoint(engine, monkeypatch):
+    # Chunks of 10 rows, however fast they are.
+    monkeypatch.setattr(backfill, "BACKFILL_MAX_CHUNK_SIZE", 10)
+    chunks = []
+    interrupt_after = [2]
+
+    def apply(connection, first, last):
+        if len(chunks) == interrupt_after[0]:
+            raise RuntimeError("interrupted")
+        chunks.append((first, last))
+        return connection.execute(
+            text("UPDATE items SET done = done + 1 WHERE item_id BETWEEN :first AND :last"), {"first": first, "last": last}
+        ).rowcount
+
+    with pytest.raises(RuntimeError):
+        run_backfill(engine, "items_done", "items", "item_id", apply, chunk_size=10, pause=0)
+    with engine.connect() as connection:
+        checkpoint = connection.execute(select(BackfillCheckpoint.__table__)).one()
+    assert (checkpoint.last_key, checkpoint.rows_done, checkpoint.completed_at) == (20, 20, None)
+
+    # The failed chunk was rolled back with its checkpoint, so only the rows after it are applied.
+    interrupt_after[0] = None
+    assert run_backfill(engine, "items_done", "items", "item_id", apply, chunk_size=10, pause=0) == 25
+    assert chunks == [(1, 10), (11, 20), (21, 25)]
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT DISTINCT done FROM items")).scalars().all() == [1]
+        assert connection.execute(select(BackfillCheckpoint.__table__.c.completed_at)).scalar() is not None
+
+    # A completed backfill is not run again.
+    assert run_backfill(engine, "items_done", "items", "item_id", apply, pause=0) == 25
+    assert len(chunks) == 3
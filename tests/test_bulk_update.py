@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from database.session import use_shard
+from models.task import TaskStatus
+from services.task import bulk_update_task_status
+
+
+def _add_status(db, status_id: int, shard_ids):
+    for shard_id in shard_ids:
+        use_shard(db, shard_id)
+        db.add(TaskStatus(task_status_id=status_id, task_status_name="done"))
+        db.commit()
+    use_shard(db, None)
+
+
+def test_bulk_status_update_reaches_every_shard(client, db, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    tasks = [make_task(make_project(user_id, shard_id), headers) for shard_id in (0, 1, 1)]
+    status_id = random.randint(10 ** 6, 10 ** 9)
+    _add_status(db, status_id, (0, 1))
+
+    result = bulk_update_task_status(0, {"task_ids": [task["task_id"] for task in tasks], "status_id": status_id}, db)
+
+    assert result == {"updated": 3}
+    for task in tasks:
+        updated = client.get(f"/api/v1/tasks/{task['task_id']}/", headers=headers).json()
+        assert updated["status_id"] == status_id
+        assert updated["version"] == task["version"] + 1
+
+
+def test_bulk_status_update_needs_the_status_on_every_shard(client, db, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    tasks = [make_task(make_project(user_id, shard_id), headers) for shard_id in (0, 1)]
+    status_id = random.randint(10 ** 6, 10 ** 9)
+    _add_status(db, status_id, (0,))
+
+    with pytest.raises(ValueError):
+        bulk_update_task_status(0, {"task_ids": [task["task_id"] for task in tasks], "status_id": status_id}, db)
+
+    for task in tasks:
+        assert client.get(f"/api/v1/tasks/{task['task_id']}/", headers=headers).json()["version"] == task["version"]
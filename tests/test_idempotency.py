@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from middleware import idempotency as idempotency_middleware
+from middleware.idempotency import IdempotencyMiddleware
+from models.idempotency import IdempotencyKey
+from services.idempotency import KEY_IN_PROGRESS, claim_key
+
+BODY = {"project_name": "p", "project_description": "d"}
+
+
+def _post(client, headers, key, body=BODY):
+    return client.post("/api/v1/projects/", json=body, headers={**headers, "Idempotency-Key": key})
+
+
+def _claim(db, headers, key, lease_expires_at):
+    """
+    Stores an in_progress claim for a key, as left by a request still running or by a dead worker.
+    """
+    key_hash = IdempotencyMiddleware._hash("POST", "/api/v1/projects/", "", headers["Authorization"], key)
+    db.add(IdempotencyKey(
+        key_hash=key_hash, request_hash="", status=KEY_IN_PROGRESS,
+        expires_at=datetime.utcnow() + timedelta(hours=1), lease_expires_at=lease_expires_at
+    ))
+    db.commit()
+    return key_hash
+
+
+def test_retry_replays_the_stored_response(client, make_user):
+    user_id, headers = make_user()
+    key = uuid.uuid4().hex
+
+    first = _post(client, headers, key)
+    retry = _post(client, headers, key)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(client.get(f"/api/v1/users/{user_id}/projects/", headers=headers).json()["items"]) == 1
+
+
+def test_key_reused_for_another_body_is_refused(client, make_user):
+    _, headers = make_user()
+    key = uuid.uuid4().hex
+
+    assert _post(client, headers, key).status_code == 201
+    assert _post(client, headers, key, dict(BODY, project_name="other")).status_code == 422
+
+
+def test_keys_are_scoped_to_the_caller(client, make_user):
+    _, headers = make_user()
+    _, other = make_user()
+    key = uuid.uuid4().hex
+
+    first = _post(client, headers, key)
+    second = _post(client, other, key)
+
+    assert second.status_code == 201
+    assert "idempotent-replayed" not in second.headers
+    assert second.json()["project_id"] != first.json()["project_id"]
+
+
+def test_duplicate_of_a_running_request_gets_409(client, db, make_user, monkeypatch):
+    monkeypatch.setattr(idempotency_middleware, "IDEMPOTENCY_WAIT_SECONDS", 0.3)
+    _, headers = make_user()
+    key = uuid.uuid4().hex
+    _claim(db, headers, key, datetime.utcnow() + timedelta(minutes=1))
+
+    response = _post(client, headers, key)
+
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+
+
+@pytest.mark.parametrize("lease_expires_at", [datetime.utcnow() - timedelta(seconds=1), None])
+def test_claim_of_a_dead_worker_is_taken_over(client, db, make_user, lease_expires_at):
+    _, headers = make_user()
+    key = uuid.uuid4().hex
+    _claim(db, headers, key, lease_expires_at)
+
+    response = _post(client, headers, key)
+
+    assert response.status_code == 201, response.text
+    assert _post(client, headers, key).headers["idempotent-replayed"] == "true"
+
+
+def test_expired_claim_is_taken_over_once(db):
+    key_hash = uuid.uuid4().hex
+    db.add(IdempotencyKey(
+        key_hash=key_hash, request_hash="", status=KEY_IN_PROGRESS,
+        expires_at=datetime.utcnow() + timedelta(hours=1), lease_expires_at=datetime.utcnow() - timedelta(seconds=1)
+    ))
+    db.commit()
+
+    assert claim_key(key_hash, "first", db) is None
+    stored = claim_key(key_hash, "second", db)
+
+    assert stored is not None
+    assert stored.status_code is None
+    assert stored.request_hash == "first"
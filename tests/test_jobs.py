@@ -0,0 +1,35 @@
+from models.job import Job
+
+
+def test_members_cannot_queue_jobs(client, make_user, make_project, db):
+    owner_id, _ = make_user()
+    _, other = make_user()
+    project_id = make_project(owner_id)
+
+    response = client.post("/jobs/archive_project/", json={"payload": {"project_id": project_id}}, headers=other)
+
+    assert response.status_code == 401
+    assert db.query(Job).filter(Job.job_type == "archive_project").count() == 0
+
+
+def test_admins_can_queue_jobs(client, make_user, make_project):
+    owner_id, _ = make_user()
+    _, admin = make_user(is_admin_user=True)
+    project_id = make_project(owner_id, shard_id=1)
+
+    response = client.post("/jobs/archive_project/", json={"payload": {"project_id": project_id}}, headers=admin)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["job_type"] == "archive_project"
+    assert response.json()["status"] == "queued"
+
+
+def test_members_archive_their_projects_through_the_project_endpoint(client, make_user, make_project):
+    owner_id, owner = make_user()
+    _, other = make_user()
+    project_id = make_project(owner_id, shard_id=1)
+
+    assert client.post(f"/projects/projects/{project_id}/archive/", headers=other).status_code == 403
+    response = client.post(f"/projects/projects/{project_id}/archive/", headers=owner)
+    assert response.status_code == 200, response.text
+    assert response.json()["job_type"] == "archive_project"
@@ -0,0 +1,27 @@
+import uuid
+
+from models.user import User
+
+
+def test_self_registration_cannot_grant_admin(client, db):
+    name = uuid.uuid4().hex[:12]
+    response = client.post("/users/register/", data={
+        "username": name, "password": "secret", "email": f"{name}@example.com", "is_admin_user": "true"
+    })
+
+    assert response.status_code == 200, response.text
+    assert db.query(User.is_admin_user).filter(User.username == name).scalar() is False
+    token = client.post("/auth/token", data={"username": f"{name}@example.com", "password": "secret"}).json()
+    assert client.post("/jobs/reindex/", json={}, headers={"Authorization": f"Bearer {token['access_token']}"}).status_code == 401
+
+
+def test_non_members_cannot_read_projects_or_tasks(client, make_user, make_project, make_task):
+    owner_id, owner = make_user()
+    _, other = make_user()
+    project_id = make_project(owner_id, shard_id=1)
+    task = make_task(project_id, owner)
+
+    assert client.get(f"/api/v1/projects/{project_id}/", headers=other).status_code == 403
+    assert client.get(f"/api/v1/tasks/{task['task_id']}/", headers=other).status_code == 403
+    assert client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"task_name": "x"}, headers=other).status_code == 403
+    assert client.get(f"/api/v1/tasks/{task['task_id']}/", headers=owner).status_code == 200
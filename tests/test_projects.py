@@ -0,0 +1,39 @@
+def _project_ids(client, user_id, headers):
+    response = client.get(f"/api/v1/users/{user_id}/projects/", headers=headers)
+    assert response.status_code == 200, response.text
+    return [project["project_id"] for project in response.json()["items"]]
+
+
+def test_creator_is_a_member_of_the_new_project(client, make_user):
+    user_id, headers = make_user()
+
+    response = client.post("/api/v1/projects/", json={"project_name": "p", "project_description": "d"}, headers=headers)
+
+    assert response.status_code == 201, response.text
+    project = response.json()
+    assert project["created_by_id"] == user_id
+    assert client.get(f"/api/v1/projects/{project['project_id']}/", headers=headers).status_code == 200
+
+
+def test_only_admins_create_projects_for_other_users(client, make_user):
+    user_id, headers = make_user()
+    other_id, other = make_user()
+    _, admin = make_user(is_admin_user=True)
+    body = {"project_name": "p", "project_description": "d", "created_by_id": other_id}
+
+    assert client.post("/api/v1/projects/", json=body, headers=headers).status_code == 403
+    assert _project_ids(client, other_id, other) == []
+
+    response = client.post("/api/v1/projects/", json=body, headers=admin)
+    assert response.status_code == 201, response.text
+    assert _project_ids(client, other_id, other) == [response.json()["project_id"]]
+    assert client.post("/api/v1/projects/", json=dict(body, created_by_id=10 ** 9), headers=admin).status_code == 404
+
+
+def test_html_form_creates_projects_for_the_logged_in_user(client, make_user):
+    user_id, headers = make_user()
+
+    response = client.post("/projects/projects/", data={"project_name": "p", "project_description": "d"}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert len(_project_ids(client, user_id, headers)) == 1
@@ -0,0 +1,34 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from database.base import Base
+from database.schema import SchemaOutOfDate, database_revisions, migration_heads, prepare_schema
+
+
+@pytest.fixture
+def shipped_database(tmp_path):
+    path = tmp_path / "sqlite_db.db"
+    shutil.copy("sqlite_db.db", path)
+    return f"sqlite:///{path}"
+
+
+def test_shipped_database_is_migrated_from_the_baseline(shipped_database):
+    engine = create_engine(shipped_database)
+    with pytest.raises(SchemaOutOfDate):
+        prepare_schema(engine, Base.metadata)
+
+    result = subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"], env=dict(os.environ, URL_DATABASE=shipped_database),
+        capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    with engine.connect() as connection:
+        assert database_revisions(connection) == migration_heads()
+        assert inspect(connection).has_table("idempotency_keys")
+    prepare_schema(engine, Base.metadata)
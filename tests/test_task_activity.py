@@ -0,0 +1,21 @@
+import pytest
+
+from services.task_activity import activity_buffer
+
+
+@pytest.mark.parametrize("shard_id", [0, 1])
+def test_task_and_project_activity_on_every_shard(client, make_user, make_project, make_task, shard_id):
+    user_id, headers = make_user()
+    project_id = make_project(user_id, shard_id)
+    task = make_task(project_id, headers)
+    response = client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"task_name": "renamed"}, headers=headers)
+    assert response.status_code == 200, response.text
+    activity_buffer.flush()
+
+    task_activity = client.get(f"/tasks/tasks/{task['task_id']}/activity/", headers=headers)
+    project_activity = client.get(f"/projects/projects/{project_id}/activity/", headers=headers)
+
+    assert task_activity.status_code == 200, task_activity.text
+    assert [item["action"] for item in task_activity.json()["items"]] == ["updated", "created"]
+    assert task_activity.json()["items"][0]["changes"]["task_name"]["new"] == "renamed"
+    assert [item["task_id"] for item in project_activity.json()["items"]] == [task["task_id"], task["task_id"]]
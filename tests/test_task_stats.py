@@ -0,0 +1,54 @@
+import pytest
+
+from database.session import use_shard
+from models.project import ProjectTaskStat
+from services.task_stats import reconcile_task_stats
+
+
+def _dashboard(client, project_id: int, headers: dict):
+    response = client.get(f"/projects/projects/{project_id}/dashboard/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("shard_id", [0, 1])
+def test_reconcile_repairs_drifted_counters(client, db, make_user, make_project, make_task, shard_id):
+    user_id, headers = make_user()
+    project_id = make_project(user_id, shard_id)
+    tasks = [make_task(project_id, headers) for _ in range(2)]
+    expected = _dashboard(client, project_id, headers)
+    assert expected["total"] == 2
+
+    # One counter drifts and another status gets a counter without tasks.
+    use_shard(db, shard_id)
+    db.query(ProjectTaskStat).filter(
+        ProjectTaskStat.project_id == project_id, ProjectTaskStat.status_id == tasks[0]["status_id"]
+    ).update({ProjectTaskStat.task_count: 7}, synchronize_session=False)
+    db.add(ProjectTaskStat(project_id=project_id, status_id=tasks[0]["status_id"] + 1000, task_count=3))
+    db.commit()
+    use_shard(db, None)
+    assert _dashboard(client, project_id, headers)["total"] == expected["total"] - 1 + 7 + 3
+
+    assert reconcile_task_stats(0, {"project_id": project_id}, db) == {
+        "checked": len(expected["statuses"]) + 1, "repaired": 2
+    }
+    assert _dashboard(client, project_id, headers) == expected
+
+    assert reconcile_task_stats(0, {"project_id": project_id}, db)["repaired"] == 0
+
+
+def test_reconcile_visits_every_shard(client, db, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    project_ids = [make_project(user_id, shard_id) for shard_id in (0, 1)]
+    for shard_id, project_id in enumerate(project_ids):
+        make_task(project_id, headers)
+        use_shard(db, shard_id)
+        db.query(ProjectTaskStat).filter(ProjectTaskStat.project_id == project_id).delete(synchronize_session=False)
+        db.commit()
+        use_shard(db, None)
+        assert _dashboard(client, project_id, headers)["total"] == 0
+
+    assert reconcile_task_stats(0, {}, db)["repaired"] >= 2
+
+    for project_id in project_ids:
+        assert _dashboard(client, project_id, headers)["total"] == 1
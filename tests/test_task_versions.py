@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.mark.parametrize("shard_id", [0, 1])
+def test_update_with_stale_if_match_is_rejected(client, make_user, make_project, make_task, shard_id):
+    user_id, headers = make_user()
+    task = make_task(make_project(user_id, shard_id), headers)
+    etag = f'"{task["version"]}"'
+
+    first = client.put(f"/tasks/update/{task['task_id']}", json={"task_name": "first"}, headers={**headers, "If-Match": etag})
+    stale = client.put(f"/tasks/update/{task['task_id']}", json={"task_name": "second"}, headers={**headers, "If-Match": etag})
+
+    assert first.status_code == 200, first.text
+    assert first.headers["etag"] == f'"{task["version"] + 1}"'
+    assert stale.status_code == 412
+    assert stale.headers["etag"] == first.headers["etag"]
+    current = client.get(f"/api/v1/tasks/{task['task_id']}/", headers=headers).json()
+    assert current["task_name"] == "first"
+    assert current["version"] == task["version"] + 1
+
+
+def test_update_with_current_if_match_through_the_api(client, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    task = make_task(make_project(user_id), headers)
+
+    response = client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"priority": 3},
+                            headers={**headers, "If-Match": f'W/"{task["version"]}"'})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["priority"] == 3
+    assert client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"priority": 4},
+                        headers={**headers, "If-Match": f'"{task["version"]}"'}).status_code == 412
+    assert client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"priority": 4},
+                        headers={**headers, "If-Match": "abc"}).status_code == 400
+
+
+def test_update_without_if_match_overwrites(client, make_user, make_project, make_task):
+    user_id, headers = make_user()
+    task = make_task(make_project(user_id), headers)
+
+    response = client.patch(f"/api/v1/tasks/{task['task_id']}/", json={"task_name": "x"}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.headers["etag"] == f'"{task["version"] + 1}"'
@@ -0,0 +1,46 @@
+from typing import Dict, Iterable, List, Optional, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+
+def model_columns(model: Type[BaseModel], table, **columns) -> Dict[str, object]:
+    """
+    Maps each field of a response model to the SQL column that reads it.
+
+    Fields default to the table column of the same name; columns overrides
+    them or adds columns of joined tables.
+    """
+    return {name: columns[name] if name in columns else table.c[name] for name in model.model_fields}
+
+
+class FieldSelection:
+    """
+    Response fields requested with ?fields= and the SQL columns reading them.
+
+    Only the requested columns are selected, plus any required ones the
+    endpoint needs for paging or authorization; those are read but left
+    out of the output unless requested too.
+    """
+
+    def __init__(self, fields: Optional[str], columns: Dict[str, object], required: Iterable[str] = ()):
+        if fields:
+            names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+            unknown = [name for name in names if name not in columns]
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}"
+                )
+        else:
+            names = list(columns)
+        self.names = names
+        selected = list(dict.fromkeys([*names, *required]))
+        self.columns = [columns[name].label(name) for name in selected]
+
+    def to_dict(self, row) -> dict:
+        # The requested names come first in the select list.
+        return dict(zip(self.names, row))
+
+    def to_dicts(self, rows) -> List[dict]:
+        names = self.names
+        return [dict(zip(names, row)) for row in rows]
@@ -0,0 +1,136 @@
+import sys
+import sqlite3
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+
+def supports_update_returning(db: Session) -> bool:
+    """
+    Checks whether UPDATE ... RETURNING can be used on the session's database.
+    """
+    dialect = db.get_bind().dialect
+    if dialect.full_returning:
+        return True
+    return dialect.name == "sqlite" and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def execute_returning(db: Session, statement, columns: Sequence):
+    """
+    Executes an UPDATE or DELETE statement and returns the affected rows.
+
+    SQLAlchemy 1.4 does not compile RETURNING for SQLite even though SQLite
+    supports it since 3.35, so for SQLite the clause is rendered here and
+    the result columns are typed through a textual select.
+
+    Returns:
+        list: Affected rows with the given columns.
+    """
+    dialect = db.get_bind().dialect
+    if dialect.full_returning:
+        return db.execute(statement.returning(*columns)).all()
+    # Expanding IN parameters are rendered up front, text() cannot expand them.
+    compiled = statement.compile(
+        dialect=sqlite.dialect(paramstyle="named"), compile_kwargs={"render_postcompile": True}
+    )
+    returning = ", ".join(column.name for column in columns)
+    textual = text(f"{compiled} RETURNING {returning}").bindparams(**compiled.params).columns(*columns)
+    return db.execute(textual).all()
+
+
+def lock_for_write(db: Session, table):
+    """
+    Starts the session's transaction holding the write lock, so what it
+    reads cannot change before it writes.
+
+    SQLite takes the database write lock with BEGIN IMMEDIATE; PostgreSQL
+    locks the table against concurrent writers.
+    """
+    connection = db.connection()
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        # pysqlite would only begin the transaction at the first write.
+        if not connection.connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif dialect == "postgresql":
+        connection.exec_driver_sql(f'LOCK TABLE "{table.name}" IN SHARE ROW EXCLUSIVE MODE')
+
+
+def increment_counter(db: Session, table, keys: dict, column: str, delta: int):
+    """
+    Adds delta to a counter column, inserting the row if it does not exist.
+
+    Uses INSERT ... ON CONFLICT DO UPDATE where available so the counter is
+    changed in one statement without reading it first.
+    """
+    increment_counters(db, table, keys, {column: delta})
+
+
+def increment_counters(db: Session, table, keys: dict, deltas: dict):
+    """
+    Adds deltas to several counter columns of one row, inserting it if it does not exist.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        where = [table.c[name] == value for name, value in keys.items()]
+        values = {column: table.c[column] + delta for column, delta in deltas.items()}
+        if db.execute(table.update().where(*where).values(values)).rowcount == 0:
+            db.execute(table.insert().values(**keys, **deltas))
+        return
+    statement = insert(table).values(**keys, **deltas).on_conflict_do_update(
+        index_elements=list(keys), set_={column: table.c[column] + delta for column, delta in deltas.items()}
+    )
+    db.execute(statement)
+
+
+class no_index(FunctionElement):
+    """
+    Column reference that the query planner should not use an index for.
+
+    Renders as +column on SQLite, which keeps the term from constraining an
+    index, and as the plain column elsewhere. Used to leave one filter to
+    drive a query when several indexed filters are combined.
+    """
+    inherit_cache = True
+
+    def __init__(self, column):
+        super().__init__(column)
+        self.type = column.type
+
+
+@compiles(no_index)
+def _compile_no_index(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(no_index, "sqlite")
+def _compile_no_index_sqlite(element, compiler, **kw):
+    return f"+{compiler.process(element.clauses, **kw)}"
+
+
+def prefix_conditions(column, prefix: str) -> list:
+    """
+    Conditions matching strings that start with prefix, as a range an index can serve.
+
+    Every string starting with prefix sorts between prefix and prefix with
+    its last character bumped; LIKE would not use the index on SQLite.
+    Trailing U+10FFFF characters cannot be bumped and are dropped first;
+    a prefix of nothing else only gets the lower bound.
+    """
+    conditions = [column >= prefix]
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if stem:
+        code = ord(stem[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            # Surrogates cannot be encoded, the next character is U+E000.
+            code = 0xE000
+        conditions.append(column < stem[:-1] + chr(code))
+    return conditions
@@ -0,0 +1,36 @@
+from typing import Iterator
+
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+# Rendered template output sent per chunk of a streamed response.
+TEMPLATE_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _buffered(fragments: Iterator[str], chunk_size: int) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream_template(templates: Jinja2Templates, name: str, context: dict,
+        chunk_size: int = TEMPLATE_STREAM_CHUNK_SIZE) -> StreamingResponse:
+    """
+    Renders a template incrementally into a streamed HTML response.
+
+    Iterables in the context are consumed while the template renders, so a
+    lazily read list is never held in memory as a whole. Jinja emits many
+    small fragments; they are joined into chunks of about chunk_size
+    characters before being sent.
+
+    Args:
+        context(dict): Template context; must contain the request.
+    """
+    fragments = templates.get_template(name).generate(context)
+    return StreamingResponse(_buffered(fragments, chunk_size), media_type="text/html")
@@ -0,0 +1,17 @@
+from fastapi.templating import Jinja2Templates
+
+# One Jinja2 environment for every router, so each template is compiled once.
+templates = Jinja2Templates(directory="templates")
+
+
+def compile_templates() -> int:
+    """
+    Compiles every template into the environment's cache ahead of the first request.
+
+    Returns:
+        int: Number of templates compiled.
+    """
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    return len(names)